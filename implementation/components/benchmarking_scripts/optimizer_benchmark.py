@@ -0,0 +1,144 @@
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# make the optimizer components importable when run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ga_engine import PopulationEngine
+from island_ga import island_genetic_algorithm, spare_cores
+from solvers import SOLVERS, get_solver
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--revisions", type=int, default=30, help="Number of equivalent revisions")
+    p.add_argument("--max_count", type=int, default=20, help="Replica bound per revision")
+    p.add_argument("--population", type=int, default=100, help="Population size per island")
+    p.add_argument("--generations", type=int, default=100, help="Generations per run")
+    p.add_argument("--islands", type=int, default=spare_cores(), help="Number of GA islands")
+    p.add_argument("--runs", type=int, default=5, help="Repetitions per configuration")
+    p.add_argument("--compare", choices=["islands", "constraints", "strategies"], default="islands",
+                   help="Serial vs island GA, penalty-only vs repair constraint handling, or all solver strategies")
+    p.add_argument("--budget", type=float, default=0.05, help="Wall-clock budget per run in seconds (constraints)")
+    return p.parse_args()
+
+
+def random_problem(revisions, max_count, rng):
+    # synthetic revisions in the same units the observer reports
+    throughput = rng.uniform(0.01, 1.0, revisions)
+    usage = rng.uniform(0, 1, (revisions, 7)) * np.array([500, 300, 5, 5, 10, 10, 20])
+    capacity = np.array([4000, 8000, 2900, 550, 300, 350, 100], dtype=float)
+    upper_bounds = np.full(revisions, max_count)
+    return throughput, usage, capacity, upper_bounds
+
+
+def benchmark_islands(args):
+    rng = np.random.default_rng(0)
+    problem = random_problem(args.revisions, args.max_count, rng)
+    evaluations = args.population * args.generations
+
+    serial_times, serial_scores = [], []
+    island_times, island_scores = [], []
+    for run in range(args.runs):
+        started = time.perf_counter()
+        _, score = PopulationEngine(*problem, seed=run).run(args.population, args.generations)
+        serial_times.append(time.perf_counter() - started)
+        serial_scores.append(score)
+
+        started = time.perf_counter()
+        _, score = island_genetic_algorithm(*problem, islands=args.islands, population_size=args.population,
+                                            generations=args.generations, seed=run)
+        island_times.append(time.perf_counter() - started)
+        island_scores.append(score)
+
+    serial_rate = evaluations / np.mean(serial_times)
+    island_rate = evaluations * args.islands / np.mean(island_times)
+
+    print(f"Problem: {args.revisions} revisions, max {args.max_count} replicas each, "
+          f"{args.islands} islands x {args.population} individuals x {args.generations} generations")
+    print(f"Serial GA: {np.mean(serial_times) * 1000:.1f} ms, best fitness {np.mean(serial_scores):.4f} "
+          f"(min {np.min(serial_scores):.4f}), {serial_rate:.0f} evaluations/s")
+    print(f"Island GA: {np.mean(island_times) * 1000:.1f} ms, best fitness {np.mean(island_scores):.4f} "
+          f"(min {np.min(island_scores):.4f}), {island_rate:.0f} evaluations/s")
+    print(f"Parallel speedup (evaluations/s): {island_rate / serial_rate:.2f}x")
+
+
+def benchmark_constraints(args):
+    """ Same wall-clock budget for penalty-only and repair modes: convergence, feasibility, final fitness """
+    rng = np.random.default_rng(0)
+    problem = random_problem(args.revisions, args.max_count, rng)
+    throughput, usage, capacity, upper_bounds = problem
+    checkpoints = [1, 5, 10, 25, 50, 100, 200, 400]
+
+    print(f"Problem: {args.revisions} revisions, max {args.max_count} replicas each, "
+          f"{args.population} individuals, {args.budget * 1000:.0f} ms budget")
+    for mode in ('penalty', 'repair'):
+        curves, finals, feasible_best, feasible_shares, generations = [], [], 0, [], []
+        for run in range(args.runs):
+            engine = PopulationEngine(*problem, seed=run, constraint_mode=mode)
+            deadline = time.monotonic() + args.budget
+            population = engine.initialize(args.population)
+            scores = engine.fitness(population)
+            curve, generation = {}, 0
+            seen, feasible = len(population), int(((population @ usage) <= capacity + 1e-9).all(axis=1).sum())
+            while time.monotonic() < deadline:
+                population, scores = engine.step(population, scores)
+                generation += 1
+                # share of the surviving population that fits the capacities
+                seen += len(population)
+                feasible += int(((population @ usage) <= capacity + 1e-9).all(axis=1).sum())
+                if generation in checkpoints:
+                    curve[generation] = float(scores.max())
+
+            best = population[int(np.argmax(scores))]
+            curves.append(curve)
+            finals.append(float(scores.max()))
+            feasible_best += int(((best @ usage) <= capacity + 1e-9).all())
+            feasible_shares.append(feasible / seen)
+            generations.append(generation)
+
+        convergence = ", ".join(f"g{g}: {np.mean([c[g] for c in curves if g in c]):.3f}"
+                                for g in checkpoints if any(g in c for c in curves))
+        print(f"{mode:>8}: best fitness {np.mean(finals):.4f} (min {np.min(finals):.4f}), "
+              f"{np.mean(generations):.0f} generations, feasible population share {np.mean(feasible_shares):.1%}, "
+              f"feasible best {feasible_best}/{args.runs}")
+        print(f"{'':>8}  convergence {convergence}")
+
+
+def benchmark_strategies(args):
+    """ Latency and objective value of every registered solver strategy on the same problem """
+    rng = np.random.default_rng(0)
+    throughput, usage, capacity, upper_bounds = random_problem(args.revisions, args.max_count, rng)
+    resource_keys = ['cpu', 'memory', 'disk_read', 'disk_write', 'network_downlink', 'network_uplink', 'gpu']
+    # same shape as optimizer.load_service_problem() returns
+    problem = {'service_name': 'benchmark',
+               'services': [dict(zip(resource_keys, row), normalized_throughput=value, max_count=int(bound))
+                            for row, value, bound in zip(usage.tolist(), throughput.tolist(), upper_bounds)],
+               'capacities': dict(zip(resource_keys, capacity.tolist())),
+               'max_rep_bound': args.max_count}
+
+    print(f"Problem: {args.revisions} revisions, max {args.max_count} replicas each, "
+          f"{args.budget * 1000:.0f} ms budget per strategy")
+    for strategy in sorted(SOLVERS):
+        times, scores = [], []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            _, score = get_solver(strategy)(problem, deadline=time.monotonic() + args.budget)
+            times.append(time.perf_counter() - started)
+            scores.append(score)
+        print(f"{strategy:>20}: {np.mean(times) * 1000:8.1f} ms, objective {np.mean(scores):.4f} "
+              f"(min {np.min(scores):.4f})")
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    if args.compare == "strategies":
+        benchmark_strategies(args)
+    elif args.compare == "constraints":
+        benchmark_constraints(args)
+    else:
+        benchmark_islands(args)
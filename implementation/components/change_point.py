@@ -0,0 +1,155 @@
+# imports
+import math
+
+from timeseries import read_latest
+
+# Sensitivity of the two-sided CUSUM on standardized samples: drift allowance per sample (k) and the
+# decision threshold (h), both in standard deviations. Lower values detect smaller shifts, and sooner.
+CUSUM_SLACK = 0.5
+CUSUM_THRESHOLD = 5
+
+# Standardized samples are clipped to this, so no single outlier can cross CUSUM_THRESHOLD on its own
+Z_CLIP = 4
+
+# Samples used to estimate a series' mean and deviation before detecting (seeded from the Redis series)
+WARMUP_SAMPLES = 5
+
+# Weight of new samples in the mean/variance while no drift is accumulating
+BASELINE_SMOOTHING = 0.1
+
+# Deviation floor relative to the mean, and absolute per field (flat series, e.g. no queued requests on an
+# idle revision, would otherwise flag any change at all)
+MIN_RELATIVE_STD = 0.02
+MIN_ABSOLUTE_STD = {'normalized_throughput': 0.01, 'queued_requests': 0.5}
+
+# Per-revision metrics watched, and which of their shifts lead to a decision (value: decide in panic mode)
+CHANGE_POINT_FIELDS = ['normalized_throughput', 'queued_requests']
+ACTIONABLE_SHIFTS = {('normalized_throughput', 'down'): False, ('queued_requests', 'up'): True}
+
+# Smallest relative change of the mean worth an optimizer run, and smallest absolute change per field
+MIN_ACTIONABLE_SHIFT = 0.05
+MIN_ACTIONABLE_MAGNITUDE = {'normalized_throughput': 0.05, 'queued_requests': 1}
+
+EPS = 1e-9
+
+
+class Cusum:
+    """ Two-sided CUSUM change-point detector of one series, restarting on the new level after a shift """
+
+    def __init__(self, slack=CUSUM_SLACK, threshold=CUSUM_THRESHOLD, clip=Z_CLIP, warmup=WARMUP_SAMPLES,
+                 smoothing=BASELINE_SMOOTHING, min_relative_std=MIN_RELATIVE_STD, min_std=EPS):
+        self.slack = slack
+        self.threshold = threshold
+        self.clip = clip
+        self.warmup = warmup
+        self.smoothing = smoothing
+        self.min_relative_std = min_relative_std
+        self.min_std = min_std
+        self.warmup_samples = []
+        self.mean = None
+        self.variance = 0
+        self.reset_sums()
+
+    def reset_sums(self):
+        # statistic, and sum/count of the samples since it last left zero (to estimate the new level)
+        self.up, self.up_sum, self.up_count = 0, 0, 0
+        self.down, self.down_sum, self.down_count = 0, 0, 0
+
+    def seed(self, values):
+        for value in values:
+            self.update(value)
+
+    def std(self):
+        return max(math.sqrt(self.variance), self.min_relative_std * abs(self.mean), self.min_std, EPS)
+
+    def update(self, value):
+        """ Feeds one sample; returns (direction, new mean, old mean) when a shift is detected """
+        if self.mean is None:
+            self.warmup_samples.append(value)
+            if len(self.warmup_samples) >= self.warmup:
+                self.mean = sum(self.warmup_samples) / len(self.warmup_samples)
+                self.variance = sum((v - self.mean) ** 2 for v in self.warmup_samples) / len(self.warmup_samples)
+                self.warmup_samples = []
+            return None
+
+        z = max(-self.clip, min(self.clip, (value - self.mean) / self.std()))
+        self.up = max(0, self.up + z - self.slack)
+        self.up_sum, self.up_count = (self.up_sum + value, self.up_count + 1) if self.up > 0 else (0, 0)
+        self.down = max(0, self.down - z - self.slack)
+        self.down_sum, self.down_count = (self.down_sum + value, self.down_count + 1) if self.down > 0 else (0, 0)
+
+        shift = None
+        if self.up > self.threshold:
+            shift = ('up', self.up_sum / self.up_count, self.mean)
+        elif self.down > self.threshold:
+            shift = ('down', self.down_sum / self.down_count, self.mean)
+        if shift:
+            self.mean = shift[1]
+            self.reset_sums()
+        elif self.up == 0 and self.down == 0:
+            diff = value - self.mean
+            self.mean += self.smoothing * diff
+            self.variance = (1 - self.smoothing) * (self.variance + self.smoothing * diff ** 2)
+        return shift
+
+
+class ChangePointTrigger:
+    """
+    Trigger of one service for trigger_engine.TriggerEngine: runs a Cusum per revision and field of the
+    metric events and reports every detected shift. Detectors of new revisions are seeded from the
+    revision's stream series (timeseries.py) when a Redis connection is given.
+    """
+
+    def __init__(self, redis_conn=None, fields=CHANGE_POINT_FIELDS, actionable=ACTIONABLE_SHIFTS,
+                 min_actionable_shift=MIN_ACTIONABLE_SHIFT, min_magnitude=MIN_ACTIONABLE_MAGNITUDE,
+                 min_std=MIN_ABSOLUTE_STD, **cusum_params):
+        self.redis_conn = redis_conn
+        self.fields = fields
+        self.actionable = actionable
+        self.min_actionable_shift = min_actionable_shift
+        self.min_magnitude = min_magnitude
+        self.min_std = min_std
+        self.cusum_params = cusum_params
+        self.detectors = {}
+
+    def new_detector(self, field):
+        params = dict(self.cusum_params)
+        params.setdefault('min_std', self.min_std.get(field, EPS))
+        return Cusum(**params)
+
+    def detectors_of(self, revision, before):
+        detectors = self.detectors.get(revision)
+        if detectors is None:
+            detectors = self.detectors[revision] = {field: self.new_detector(field) for field in self.fields}
+            if self.redis_conn is not None:
+                history = read_latest(self.redis_conn, revision, count=detectors[self.fields[0]].warmup,
+                                      end=before)
+                for field, detector in detectors.items():
+                    detector.seed([fields[field] for _, fields in history if field in fields])
+        return detectors
+
+    def update(self, event):
+        shifts = []
+        for revision, metrics in event.get('revisions', {}).items():
+            detectors = self.detectors_of(revision, event['timestamp'])
+            for field, detector in detectors.items():
+                if metrics.get(field) is None:
+                    continue
+                detected = detector.update(metrics[field])
+                if detected is None:
+                    continue
+                direction, new_mean, old_mean = detected
+                magnitude = new_mean - old_mean
+                relative = magnitude / max(abs(old_mean), self.min_std.get(field, EPS), EPS)
+                panic = self.actionable.get((field, direction))
+                actionable = (panic is not None and abs(relative) >= self.min_actionable_shift
+                              and abs(magnitude) >= self.min_magnitude.get(field, 0))
+                shifts.append({'service': event['service'], 'revision': revision, 'field': field,
+                               'direction': direction, 'magnitude': magnitude, 'relative': relative,
+                               'actionable': actionable,
+                               'panic': bool(panic), 'timestamp': event['timestamp']})
+        return shifts
+
+    def decided(self, event):
+        # every detector already restarted on the level it detected
+        pass
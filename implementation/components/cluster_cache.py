@@ -0,0 +1,187 @@
+# imports
+import threading
+import time
+
+import requests
+
+from k8s_client import KNATIVE_SERVING, REVISION_LABEL, SERVICE_LABEL, ClusterClient, node_ready_status
+
+# How long the first user waits for the initial lists before falling back to direct API calls (seconds)
+INFORMER_SYNC_TIMEOUT = 5
+
+# Length of one watch request; the informer re-opens the watch when the server ends it (seconds)
+WATCH_TIMEOUT = 300
+
+# Delay before retrying a failed list/watch, doubled on every consecutive failure (seconds)
+WATCH_RETRY_DELAY = 1
+WATCH_MAX_RETRY_DELAY = 30
+
+
+def object_key(obj):
+    metadata = obj.get('metadata', {})
+    namespace = metadata.get('namespace')
+    return f"{namespace}/{metadata.get('name')}" if namespace else metadata.get('name')
+
+
+class Informer:
+    """
+    In-memory copy of one Kubernetes collection: a single initial list, then kept current by following
+    its watch stream. The list is repeated only when the watch can not resume (410 Gone, lost connection
+    without a resourceVersion).
+    """
+
+    def __init__(self, client, path, label_selector=None):
+        self.client = client
+        self.path = path
+        self.label_selector = label_selector
+        self.objects = {}
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.resource_version = None
+        self.thread = None
+
+    def relist(self):
+        data = self.client.list(self.path, label_selector=self.label_selector)
+        objects = {object_key(obj): obj for obj in data.get('items', [])}
+        with self.lock:
+            self.objects = objects
+        self.resource_version = data.get('metadata', {}).get('resourceVersion')
+        self.synced.set()
+
+    def apply(self, event):
+        obj = event.get('object', {})
+        if event['type'] in ('ADDED', 'MODIFIED'):
+            with self.lock:
+                self.objects[object_key(obj)] = obj
+        elif event['type'] == 'DELETED':
+            with self.lock:
+                self.objects.pop(object_key(obj), None)
+        # BOOKMARK events only move the resourceVersion forward
+        self.resource_version = obj.get('metadata', {}).get('resourceVersion', self.resource_version)
+
+    def run(self):
+        delay = WATCH_RETRY_DELAY
+        while True:
+            try:
+                if self.resource_version is None:
+                    self.relist()
+                for event in self.client.watch(self.path, self.resource_version, label_selector=self.label_selector,
+                                               timeout_seconds=WATCH_TIMEOUT):
+                    if event.get('type') == 'ERROR':
+                        # resourceVersion too old (410 Gone): start over from a fresh list
+                        print(f"Watch on {self.path} expired: {event.get('object', {}).get('message')}")
+                        self.resource_version = None
+                        break
+                    self.apply(event)
+                delay = WATCH_RETRY_DELAY
+            except (requests.RequestException, ValueError) as e:
+                print(f"Watch on {self.path} failed, retrying in {delay}s: {e}")
+                if isinstance(e, requests.HTTPError) and e.response is not None and e.response.status_code == 410:
+                    self.resource_version = None
+                time.sleep(delay)
+                delay = min(delay * 2, WATCH_MAX_RETRY_DELAY)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name=f"informer{self.path}", daemon=True)
+            self.thread.start()
+        return self
+
+    def items(self):
+        with self.lock:
+            return list(self.objects.values())
+
+    def get(self, name, namespace=None):
+        with self.lock:
+            return self.objects.get(f"{namespace}/{name}" if namespace else name)
+
+
+class ClusterCache:
+    """
+    Informers for the objects the control loop reads (Knative services and revisions, the revisions'
+    deployments and pods, nodes) with in-memory lookups for observer.py and optimizer.py.
+    """
+
+    def __init__(self, namespace="default", client=None):
+        # watches hold their connection open, so they get their own session
+        client = client or ClusterClient()
+        self.namespace = namespace
+        self.services = Informer(client, f"{KNATIVE_SERVING}/namespaces/{namespace}/services")
+        self.revisions = Informer(client, f"{KNATIVE_SERVING}/namespaces/{namespace}/revisions")
+        # only deployments and pods that belong to a Knative revision
+        self.deployments = Informer(client, f"/apis/apps/v1/namespaces/{namespace}/deployments",
+                                    label_selector=REVISION_LABEL)
+        self.pods = Informer(client, f"/api/v1/namespaces/{namespace}/pods", label_selector=REVISION_LABEL)
+        self.nodes = Informer(client, "/api/v1/nodes")
+        self.informers = [self.services, self.revisions, self.deployments, self.pods, self.nodes]
+
+    def start(self):
+        for informer in self.informers:
+            informer.start()
+        return self
+
+    def wait_for_sync(self, timeout=INFORMER_SYNC_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        return all(informer.synced.wait(max(deadline - time.monotonic(), 0)) for informer in self.informers)
+
+    def is_synced(self):
+        return all(informer.synced.is_set() for informer in self.informers)
+
+    def knative_services(self):
+        return self.services.items()
+
+    def knative_service(self, name):
+        return self.services.get(name, self.namespace)
+
+    def service_revisions(self, service_name):
+        return [revision for revision in self.revisions.items()
+                if revision['metadata'].get('labels', {}).get(SERVICE_LABEL) == service_name]
+
+    def revision_replicas(self, service_name):
+        # {revision: desired replicas} from the revisions' deployments
+        replicas = {}
+        for deployment in self.deployments.items():
+            labels = deployment['metadata'].get('labels', {})
+            if labels.get(SERVICE_LABEL) == service_name:
+                replicas[labels[REVISION_LABEL]] = deployment.get('spec', {}).get('replicas') or 0
+        return replicas
+
+    def revision_pods(self, revision_name):
+        return [pod for pod in self.pods.items()
+                if pod['metadata'].get('labels', {}).get(REVISION_LABEL) == revision_name]
+
+    def revision_pod_ips(self):
+        # {pod IP: revision} of the running revision pods
+        return {pod['status']['podIP']: pod['metadata']['labels'][REVISION_LABEL] for pod in self.pods.items()
+                if pod.get('status', {}).get('phase') == 'Running' and pod['status'].get('podIP')}
+
+    def node_ready(self, name):
+        node = self.nodes.get(name)
+        return node_ready_status(node) if node else None
+
+
+# One cache per namespace, started on first use and shared by the whole process
+cluster_caches = {}
+cluster_caches_lock = threading.Lock()
+
+
+def get_cluster_cache(namespace="default"):
+    """ The process' ClusterCache for a namespace, or None while its initial lists have not completed """
+    with cluster_caches_lock:
+        cache = cluster_caches.get(namespace)
+        if cache is None:
+            cache = cluster_caches[namespace] = ClusterCache(namespace).start()
+            cache.wait_for_sync()
+    return cache if cache.is_synced() else None
+
+
+if __name__ == "__main__":
+    cache = get_cluster_cache()
+    if cache is None:
+        print("Cluster cache not synced")
+    else:
+        for service in cache.knative_services():
+            name = service['metadata']['name']
+            print(name, cache.revision_replicas(name))
+        for node in cache.nodes.items():
+            print(f"Node: {node['metadata']['name']}, Ready: {node_ready_status(node)}")
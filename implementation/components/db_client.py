@@ -1,39 +1,444 @@
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
 import redis
 import json
+from redis.backoff import ExponentialBackoff
+from redis.retry import Retry
+
+from instrumentation import REDIS_CACHE_LOOKUPS, REDIS_ROUND_TRIP_SECONDS
+
+try:
+    import msgpack
+except ImportError:    # optional: values are stored as JSON text without it
+    msgpack = None
+
+# Encoding used when storing values: 'json' (readable with redis-cli) or 'msgpack' (compact binary, needs the
+# msgpack package). Reads detect the encoding of each value, so keys written either way stay readable.
+VALUE_ENCODING = os.environ.get('SCALEWAVE_REDIS_ENCODING', 'json')
+
+# Binary values start with a NUL byte (never the first byte of JSON text) followed by the format version
+BINARY_MARKER = b'\x00'
+BINARY_VERSION = 1
+
+# Connection pool size and retries (exponential backoff) on connection errors and timeouts
+MAX_CONNECTIONS = 32
+RETRIES = 3
+RETRY_BACKOFF_BASE = 0.05
+RETRY_BACKOFF_CAP = 1
+
+# Raw (bytes) clients sharing the settings of a decoded client, keyed by id of its connection pool
+binary_clients = {}
+
+# Round trips issued through this module since the last take_round_trips() call
+round_trips = 0
+
+# In-process read-through cache of retrieve_cached(): set SCALEWAVE_REDIS_CACHE=0 to read every key from Redis
+READ_CACHE_ENABLED = os.environ.get('SCALEWAVE_REDIS_CACHE', '1') != '0'
 
+# Seconds a cached value is served at most (writes invalidate it earlier through keyspace notifications)
+CACHE_TTLS = {
+    'max_resource_benchmarks': 3600,
+    'service_weights': 300,
+}
+DEFAULT_CACHE_TTL = 60
 
-def connect_to_redis(host='localhost', port=6379, db=0):
+# Keyspace notification classes the cache needs: keyspace events of string and generic commands, expiries
+# and evictions (merged into the server's notify-keyspace-events)
+NOTIFY_KEYSPACE_EVENTS = 'K$gxe'
+
+# How often idle processes drain pending notifications, and seconds before re-subscribing after an error
+CACHE_DRAIN_INTERVAL = 1
+CACHE_RESUBSCRIBE_DELAY = 1
+
+# Read caches, keyed by id of the connection pool of the binary client they read through
+read_caches = {}
+read_caches_lock = threading.Lock()
+
+
+def connect_to_redis(host='localhost', port=6379, db=0, max_connections=MAX_CONNECTIONS):
     try:
-        return redis.Redis(host=host, port=port, db=db, decode_responses=True)
+        pool = redis.ConnectionPool(host=host, port=port, db=db, decode_responses=True,
+                                    max_connections=max_connections, socket_keepalive=True,
+                                    health_check_interval=30,
+                                    retry=Retry(ExponentialBackoff(cap=RETRY_BACKOFF_CAP, base=RETRY_BACKOFF_BASE),
+                                                RETRIES),
+                                    retry_on_error=[redis.ConnectionError, redis.TimeoutError])
+        return redis.Redis(connection_pool=pool)
     except redis.RedisError as e:
         print(f"Redis connection error: {e}")
         return None
 
 
+def binary_client(redis_connection):
+    """ Client on the same server returning raw bytes (decode_responses=False), needed for binary values """
+    pool = redis_connection.connection_pool
+    if not pool.connection_kwargs.get('decode_responses'):
+        return redis_connection
+    client = binary_clients.get(id(pool))
+    if client is None:
+        kwargs = dict(pool.connection_kwargs, decode_responses=False)
+        client = redis.Redis(connection_pool=redis.ConnectionPool(connection_class=pool.connection_class,
+                                                                  max_connections=pool.max_connections, **kwargs))
+        binary_clients[id(pool)] = client
+    return client
+
+
+@contextmanager
+def round_trip(operation):
+    """ Counts and times one round trip to Redis (scalewave_redis_round_trip_seconds) """
+    global round_trips
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        REDIS_ROUND_TRIP_SECONDS.labels(operation).observe(time.perf_counter() - started)
+        round_trips += 1
+
+
+def take_round_trips():
+    """ Round trips counted since the previous call (e.g. per observation cycle) """
+    global round_trips
+    count, round_trips = round_trips, 0
+    return count
+
+
+def encode_value(data, encoding=None):
+    if (encoding or VALUE_ENCODING) == 'msgpack' and msgpack is not None:
+        return BINARY_MARKER + bytes([BINARY_VERSION]) + msgpack.packb(data, use_bin_type=True)
+    return json.dumps(data)
+
+
+def decode_value(raw):
+    if raw is None:
+        return None
+    if isinstance(raw, bytes) and raw[:1] == BINARY_MARKER:
+        version = raw[1] if len(raw) > 1 else None
+        if version != BINARY_VERSION:
+            raise ValueError(f"unknown binary value version {version}")
+        if msgpack is None:
+            raise ValueError("msgpack-encoded value but the msgpack package is not installed")
+        return msgpack.unpackb(raw[2:], raw=False)
+    return json.loads(raw)
+
+
 def store_json_data(redis_connection, key, data):
     try:
-        json_data = json.dumps(data)
-        redis_connection.set(key, json_data)
+        data = encode_value(data)
+        client = binary_client(redis_connection)
+        with cache_writes(client.connection_pool, [(key, data)]), round_trip('set'):
+            client.set(key, data)
     except (TypeError, redis.RedisError) as e:
         print(f"Error storing data in Redis: {e}")
 
 
 def retrieve_json_data(redis_connection, key):
     try:
-        retrieved_json_data = redis_connection.get(key)
+        with round_trip('get'):
+            retrieved_json_data = binary_client(redis_connection).get(key)
         if retrieved_json_data:
-            return json.loads(retrieved_json_data)
+            return decode_value(retrieved_json_data)
         else:
             print("Data not found.")
             return None
     except redis.RedisError as e:
         print(f"Error retrieving data from Redis: {e}")
         return None
-    except json.JSONDecodeError as e:
+    except ValueError as e:
         print(f"Error decoding JSON data: {e}")
         return None
 
 
+def retrieve_many(redis_connection, keys, raw_keys=()):
+    """
+    Reads several keys in one round trip (MGET): {key: decoded value or None}.
+    Keys in `raw_keys` hold plain strings (e.g. counters) and are returned as str instead of being decoded.
+    """
+    keys = list(keys)
+    if not keys:
+        return {}
+    try:
+        with round_trip('mget'):
+            raw_values = binary_client(redis_connection).mget(keys)
+    except redis.RedisError as e:
+        print(f"Error retrieving data from Redis: {e}")
+        return {key: None for key in keys}
+    return decode_values(keys, raw_values, raw_keys)
+
+
+def retrieve_cached(redis_connection, keys, raw_keys=()):
+    """ retrieve_many() through the process's read cache: only keys missing from it are read from Redis """
+    if not READ_CACHE_ENABLED:
+        return retrieve_many(redis_connection, keys, raw_keys)
+    keys = list(keys)
+    if not keys:
+        return {}
+    try:
+        raw_values = read_cache(redis_connection).get_many(keys)
+    except redis.RedisError as e:
+        print(f"Error retrieving data from Redis: {e}")
+        return {key: None for key in keys}
+    return decode_values(keys, [raw_values[key] for key in keys], raw_keys)
+
+
+def decode_values(keys, raw_values, raw_keys=()):
+    values = {key: None for key in keys}
+    for key, raw in zip(keys, raw_values):
+        if raw is None:
+            continue
+        try:
+            values[key] = raw.decode() if key in raw_keys else decode_value(raw)
+        except ValueError as e:
+            print(f"Error decoding data of {key}: {e}")
+    return values
+
+
+def pipeline(redis_connection):
+    """ Non-transactional pipeline: everything queued on it is sent in one round trip by execute_pipeline """
+    return binary_client(redis_connection).pipeline(transaction=False)
+
+
+def queue_json_data(pipe, key, data):
+    try:
+        pipe.set(key, encode_value(data))
+    except TypeError as e:
+        print(f"Error storing data in Redis: {e}")
+
+
+def execute_pipeline(pipe):
+    if not len(pipe):
+        return []
+    # the values of plain SETs go to the read cache, every other key written by the pipeline is invalidated
+    writes = [(args[1], args[2] if args[0] == 'SET' and len(args) == 3 else None)
+              for args, _ in pipe.command_stack if len(args) > 1]
+    try:
+        with cache_writes(pipe.connection_pool, writes), round_trip('pipeline'):
+            return pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error executing Redis pipeline: {e}")
+        return None
+
+
+class ReadCache:
+    """
+    Read-through cache of raw Redis values, kept coherent by keyspace notifications. Every write to a cached
+    key (set, del, expiry, eviction, from any client) invalidates it as soon as its notification is read;
+    pending notifications are drained before every lookup and every CACHE_DRAIN_INTERVAL in the background.
+    Writes through this module (store_json_data, execute_pipeline) update the cache of their own process
+    directly, so a process never reads back an older value than the one it wrote. Nothing is served while
+    the subscription is down, and values read while a notification came in are not kept.
+    """
+
+    def __init__(self, client, ttls=None):
+        self.client = client
+        self.ttls = CACHE_TTLS if ttls is None else ttls
+        self.lock = threading.Lock()
+        self.entries = {}               # key -> (raw value or None, expiry time)
+        self.own_writes = {}            # key -> notifications of this process's writes not read yet
+        self.version = 0                # bumped by every invalidation, stale fills check it
+        self.pubsub = None
+        self.channel_prefix = None
+        self.subscribed = False
+        self.retry_at = 0
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self.thread = None
+
+    def ttl(self, key):
+        return self.ttls.get(key, DEFAULT_CACHE_TTL)
+
+    def enable_notifications(self):
+        current = self.client.config_get('notify-keyspace-events')
+        flags = next(iter(current.values()), b'')
+        flags = flags.decode() if isinstance(flags, bytes) else flags
+        needed = 'K' if 'A' in flags else NOTIFY_KEYSPACE_EVENTS
+        missing = ''.join(flag for flag in needed if flag not in flags)
+        if missing:
+            self.client.config_set('notify-keyspace-events', flags + missing)
+
+    def subscribe(self):
+        try:
+            self.enable_notifications()
+            db = self.client.connection_pool.connection_kwargs.get('db', 0)
+            self.channel_prefix = f"__keyspace@{db}__:"
+            pubsub = self.client.pubsub()
+            pubsub.psubscribe(f"{self.channel_prefix}*")
+            self.pubsub = pubsub
+        except redis.ResponseError as e:
+            # e.g. CONFIG is disabled on the server: without notifications nothing can be cached safely
+            print(f"Keyspace notifications unavailable, Redis reads are not cached: {e}")
+            self.enabled = False
+        except redis.RedisError as e:
+            print(f"Error subscribing to keyspace notifications: {e}")
+            self.retry_at = time.time() + CACHE_RESUBSCRIBE_DELAY
+
+    def reset(self):
+        if self.pubsub is not None:
+            try:
+                self.pubsub.close()
+            except redis.RedisError:
+                pass
+        self.pubsub = None
+        self.subscribed = False
+        self.entries.clear()
+        self.own_writes.clear()
+        self.version += 1
+        self.retry_at = time.time() + CACHE_RESUBSCRIBE_DELAY
+
+    def invalidate(self, key):
+        pending = self.own_writes.get(key, 0)
+        if pending:
+            # our own write, already in the cache
+            if pending > 1:
+                self.own_writes[key] = pending - 1
+            else:
+                del self.own_writes[key]
+            return
+        self.entries.pop(key, None)
+        self.version += 1
+
+    def drain(self):
+        # called with the lock held
+        if not self.enabled:
+            return
+        if self.pubsub is None:
+            if time.time() < self.retry_at:
+                return
+            self.subscribe()
+            if self.pubsub is None:
+                return
+        try:
+            while True:
+                message = self.pubsub.get_message(timeout=0)
+                if message is None:
+                    break
+                if message['type'] == 'psubscribe':
+                    # writes from before the subscription may have raced with reads in flight
+                    self.subscribed = True
+                    self.version += 1
+                elif message['type'] == 'pmessage':
+                    self.invalidate(message['channel'][len(self.channel_prefix):].decode(errors='replace'))
+        except redis.RedisError as e:
+            print(f"Keyspace notification subscription lost: {e}")
+            self.reset()
+
+    def get_many(self, keys):
+        """ {key: raw value or None}; the keys not cached are read in one MGET and cached """
+        now = time.time()
+        values = {}
+        with self.lock:
+            self.drain()
+            if self.subscribed:
+                for key in keys:
+                    entry = self.entries.get(key)
+                    if entry is not None and entry[1] > now:
+                        values[key] = entry[0]
+            version = self.version
+        missing = [key for key in keys if key not in values]
+        self.count(len(keys) - len(missing), len(missing))
+        if not missing:
+            return values
+
+        with round_trip('mget'):
+            raw_values = self.client.mget(missing)
+        with self.lock:
+            self.drain()
+            if self.subscribed and self.version == version:
+                for key, raw in zip(missing, raw_values):
+                    self.entries[key] = (raw, now + self.ttl(key))
+        values.update(zip(missing, raw_values))
+        return values
+
+    def count(self, hits, misses):
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+        if hits:
+            REDIS_CACHE_LOOKUPS.labels('hit').inc(hits)
+        if misses:
+            REDIS_CACHE_LOOKUPS.labels('miss').inc(misses)
+
+    @contextmanager
+    def writing(self, writes):
+        """ Around a write of [(key, raw value, or None when only invalidated)] by this process """
+        with self.lock:
+            self.drain()
+            expected = []
+            for key, raw in writes:
+                self.entries.pop(key, None)
+                if raw is not None and self.subscribed:
+                    self.own_writes[key] = self.own_writes.get(key, 0) + 1
+                    expected.append(key)
+            # reads in flight may have fetched the values from before the write
+            self.version += 1
+            version = self.version
+        try:
+            yield
+        except Exception:
+            with self.lock:
+                # the write may not have happened: the next notification of these keys has to invalidate
+                for key in expected:
+                    if self.own_writes.get(key, 0) > 1:
+                        self.own_writes[key] -= 1
+                    else:
+                        self.own_writes.pop(key, None)
+            raise
+        now = time.time()
+        with self.lock:
+            if self.subscribed and self.version == version:
+                for key, raw in writes:
+                    if raw is not None:
+                        self.entries[key] = (raw.encode() if isinstance(raw, str) else raw, now + self.ttl(key))
+
+    def run(self):
+        while self.enabled:
+            with self.lock:
+                self.drain()
+            time.sleep(CACHE_DRAIN_INTERVAL)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="redis-read-cache", daemon=True)
+            self.thread.start()
+        return self
+
+    def stats(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {'hits': self.hits, 'misses': self.misses, 'keys': len(self.entries),
+                    'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+def read_cache(redis_connection):
+    """ The read cache of the server behind a connection (one per process and connection pool) """
+    client = binary_client(redis_connection)
+    with read_caches_lock:
+        cache = read_caches.get(id(client.connection_pool))
+        if cache is None:
+            cache = read_caches[id(client.connection_pool)] = ReadCache(client).start()
+    return cache
+
+
+def cache_writes(connection_pool, writes):
+    cache = read_caches.get(id(connection_pool))
+    return cache.writing(writes) if cache is not None else nullcontext()
+
+
+def cache_stats():
+    """ Lookups of retrieve_cached() in this process: {'hits': .., 'misses': .., 'keys': .., 'hit_rate': ..} """
+    stats = {'hits': 0, 'misses': 0, 'keys': 0}
+    for cache in list(read_caches.values()):
+        for field, value in cache.stats().items():
+            if field in stats:
+                stats[field] += value
+    lookups = stats['hits'] + stats['misses']
+    stats['hit_rate'] = round(stats['hits'] / lookups, 4) if lookups else 0.0
+    return stats
+
+
 if __name__ == "__main__":
     # Connect to Redis
     r = connect_to_redis()
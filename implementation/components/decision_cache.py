@@ -0,0 +1,94 @@
+# imports
+import hashlib
+import json
+
+import redis
+
+import db_client
+
+# Significant digits kept when quantizing the inputs of a decision (2 -> values within ~1-10% collide)
+FINGERPRINT_DIGITS = 2
+
+# How long a cached decision stays valid (seconds)
+DECISION_TTL = 600
+
+DECISION_KEY_PREFIX = 'optimizer_decision:'
+DECISION_STATS_KEY = 'optimizer_decision_cache_stats'
+
+# Per-revision fields that drive the optimizer's decision
+FINGERPRINT_FIELDS = ['normalized_throughput', 'cpu', 'memory', 'disk_read', 'disk_write',
+                      'network_downlink', 'network_uplink', 'gpu', 'current_replica', 'max_count']
+
+
+def quantize(value, digits=FINGERPRINT_DIGITS):
+    if not value:
+        return 0
+    return float(f"{float(value):.{digits}g}")
+
+
+def fingerprint_problem(problem, strategy, time_budget=None, digits=FINGERPRINT_DIGITS):
+    """
+    Stable hash of the quantized optimizer inputs (service metrics, capacities, request load) and the solver's
+    time budget: a decision cut short by a panic budget is not reused by runs allowed to search longer
+    """
+    requests = problem['concurrent_requests']
+    snapshot = {
+        'strategy': strategy,
+        'time_budget': time_budget,
+        'max_rep_bound': problem['max_rep_bound'],
+        'revisions': {revision: [quantize(service.get(field, 0), digits) for field in FINGERPRINT_FIELDS]
+                      for revision, service in zip(problem['service_index'], problem['services'])},
+        'capacities': {res: quantize(value, digits) for res, value in problem['capacities'].items()},
+        # joint problems carry one request snapshot per service
+        'requests': {name: quantize(value.get('total', 0) if isinstance(value, dict) else value, digits)
+                     for name, value in requests.items()},
+    }
+    encoded = json.dumps(snapshot, sort_keys=True).encode()
+    return hashlib.sha1(encoded).hexdigest()
+
+
+def lookup_decision(redis_conn, service_name, fingerprint, service_index):
+    """
+    Cached decision for an equivalent snapshot as (solution aligned to `service_index`, fitness), or None;
+    counts hits and misses per service
+    """
+    try:
+        decision = redis_conn.get(f"{DECISION_KEY_PREFIX}{service_name}:{fingerprint}")
+        decision = json.loads(decision) if decision else None
+        # the revision order of a snapshot is not stable, decisions are stored by revision name
+        if decision and set(decision.get('replicas', {})) != set(service_index):
+            decision = None
+        outcome = 'hits' if decision else 'misses'
+        redis_conn.hincrby(DECISION_STATS_KEY, f"{service_name}:{outcome}", 1)
+    except redis.RedisError as e:
+        print(f"Error reading decision cache: {e}")
+        return None
+    if not decision:
+        return None
+    return [decision['replicas'][revision] for revision in service_index], decision['fitness']
+
+
+def store_decision(redis_conn, service_name, fingerprint, service_index, solution, fitness, ttl=DECISION_TTL):
+    try:
+        redis_conn.set(f"{DECISION_KEY_PREFIX}{service_name}:{fingerprint}",
+                       json.dumps({'replicas': dict(zip(service_index, solution)), 'fitness': fitness}), ex=ttl)
+    except redis.RedisError as e:
+        print(f"Error storing decision: {e}")
+
+
+def decision_cache_stats(redis_conn):
+    """ {service: {'hits': .., 'misses': .., 'hit_rate': ..}} """
+    raw = redis_conn.hgetall(DECISION_STATS_KEY) or {}
+    stats = {}
+    for field, count in raw.items():
+        service_name, outcome = field.rsplit(':', 1)
+        stats.setdefault(service_name, {'hits': 0, 'misses': 0})[outcome] = int(count)
+    for counts in stats.values():
+        lookups = counts['hits'] + counts['misses']
+        counts['hit_rate'] = round(counts['hits'] / lookups, 4) if lookups else 0.0
+    return stats
+
+
+if __name__ == "__main__":
+    # Connect to Redis
+    print(decision_cache_stats(db_client.connect_to_redis()))
@@ -0,0 +1,144 @@
+# imports
+import time
+
+import numpy as np
+
+# Replica vectors up to this many combinations are scored exhaustively in batches
+EXHAUSTIVE_LIMIT = 200000
+EXHAUSTIVE_CHUNK = 50000
+
+# Node budget for branch-and-bound before handing over to the GA
+MAX_NODES = 20000
+
+
+def search_space_size(upper_bounds):
+    size = 1
+    for bound in upper_bounds:
+        size *= int(bound) + 1
+    return size
+
+
+def penalized_score(population, throughput, usage, capacity, penalty_factor=100):
+    # same objective as the GA: throughput minus penalty for exceeding capacities
+    population = np.atleast_2d(population)
+    penalty = np.clip(population @ usage - capacity, 0, None).sum(axis=1)
+    return population @ throughput - (penalty * penalty_factor)
+
+
+def solve_exhaustive(throughput, usage, capacity, upper_bounds, penalty_factor=100):
+    """ Scores every replica vector in the box [0, upper_bounds]; returns (solution, score) """
+    upper_bounds = np.asarray(upper_bounds, dtype=np.int64)
+    radices = upper_bounds + 1
+    size = search_space_size(upper_bounds)
+
+    best_solution, best_score = None, -np.inf
+    for start in range(0, size, EXHAUSTIVE_CHUNK):
+        # decode flat indices into mixed-radix digits (one digit per revision)
+        flat = np.arange(start, min(start + EXHAUSTIVE_CHUNK, size), dtype=np.int64)
+        chunk = np.empty((len(flat), len(radices)), dtype=np.int64)
+        for i in range(len(radices) - 1, -1, -1):
+            chunk[:, i] = flat % radices[i]
+            flat = flat // radices[i]
+
+        scores = penalized_score(chunk, throughput, usage, capacity, penalty_factor)
+        i = int(np.argmax(scores))
+        if scores[i] > best_score:
+            best_solution, best_score = chunk[i], float(scores[i])
+
+    return [int(count) for count in best_solution], best_score
+
+
+def solve_branch_and_bound(throughput, usage, capacity, upper_bounds, penalty_factor=100, max_nodes=MAX_NODES,
+                           deadline=None):
+    """
+    Depth-first branch-and-bound over replica counts.
+
+    The capacity penalty is convex in the resource load, so the extra penalty of adding several
+    revisions at once is at least the sum of their individual extra penalties. Partial score plus
+    the best standalone gain of every remaining revision is therefore an upper bound for every
+    completion of a partial assignment.
+
+    Returns (solution, score, upper_bound, optimal). When the node budget or the `deadline`
+    (a time.monotonic() value) runs out `optimal` is False and `upper_bound` is the best bound
+    among the unexplored nodes.
+    """
+    throughput = np.asarray(throughput, dtype=float)
+    usage = np.asarray(usage, dtype=float)
+    capacity = np.asarray(capacity, dtype=float)
+    upper_bounds = np.asarray(upper_bounds, dtype=np.int64)
+    n = len(throughput)
+
+    # branch on the most valuable revisions first, largest counts first
+    order = np.argsort(-throughput, kind='stable')
+    values = throughput[order].tolist()
+    bounds = upper_bounds[order].tolist()
+    weights = usage[order]
+    weighted_values = throughput[order]
+    counts_range = np.arange(int(upper_bounds.max(initial=0)) + 1)
+    # steps[i, k, r] -> load of resource r added by k replicas of revision i (k > bound is masked)
+    steps = weights[:, None, :] * counts_range[None, :, None]
+    over_bound = counts_range[None, :] > upper_bounds[order][:, None]
+
+    def penalty(load):
+        return float(np.clip(load - capacity, 0, None).sum()) * penalty_factor
+
+    def remaining_gain(depth, load):
+        # best standalone gain of every revision at `depth` and deeper on top of `load`
+        if depth == n:
+            return 0.0
+        extra = np.clip(load + steps[depth:] - capacity, 0, None).sum(axis=2) * penalty_factor
+        gains = weighted_values[depth:, None] * counts_range[None, :] - (extra - penalty(load))
+        gains[over_bound[depth:]] = -np.inf
+        return float(gains.max(axis=1).sum())
+
+    best_counts = [0] * n
+    best_score = -penalty(np.zeros(len(capacity)))
+    nodes = 0
+    # stack entries: (depth, counts so far, throughput so far, resource load so far)
+    stack = [(0, [], 0.0, np.zeros(len(capacity)))]
+
+    while stack:
+        out_of_time = deadline is not None and nodes % 256 == 0 and time.monotonic() >= deadline
+        if nodes >= max_nodes or out_of_time:
+            open_bound = max(value - penalty(load) + remaining_gain(depth, load) for depth, _, value, load in stack)
+            solution = [0] * n
+            for position, revision in enumerate(order):
+                solution[revision] = best_counts[position]
+            return solution, best_score, max(open_bound, best_score), False
+
+        depth, counts, value, load = stack.pop()
+        nodes += 1
+        current_penalty = penalty(load)
+
+        if depth == n:
+            score = value - current_penalty
+            if score > best_score:
+                best_counts, best_score = counts, score
+            continue
+
+        if value - current_penalty + remaining_gain(depth, load) <= best_score:
+            continue
+
+        # push smaller counts first so the largest count is explored next
+        for count in range(0, bounds[depth] + 1):
+            stack.append((depth + 1, counts + [count], value + values[depth] * count, load + weights[depth] * count))
+
+    solution = [0] * n
+    for position, revision in enumerate(order):
+        solution[revision] = best_counts[position]
+    return solution, best_score, best_score, True
+
+
+def solve_exact(throughput, usage, capacity, upper_bounds, penalty_factor=100, max_nodes=MAX_NODES, deadline=None):
+    """ Returns (solution, score, upper_bound, optimal) using enumeration for small boxes, otherwise B&B """
+    if search_space_size(upper_bounds) <= EXHAUSTIVE_LIMIT:
+        solution, score = solve_exhaustive(throughput, usage, capacity, upper_bounds, penalty_factor)
+        return solution, score, score, True
+    return solve_branch_and_bound(throughput, usage, capacity, upper_bounds, penalty_factor, max_nodes, deadline)
+
+
+def optimality_gap(score, upper_bound):
+    # relative gap between a solution and a proven upper bound
+    if upper_bound <= score:
+        return 0.0
+    return (upper_bound - score) / max(abs(upper_bound), 1e-12)
@@ -0,0 +1,211 @@
+# imports
+import time
+
+import numpy as np
+
+
+def build_problem_matrices(services, capacities, max_rep_bound):
+    """ Converts the optimizer's per-revision dicts into the arrays used by the population engine """
+    resource_keys = [res for res in capacities.keys()]
+
+    throughput = np.array([service['normalized_throughput'] for service in services], dtype=float)
+    # usage[i, r] -> usage of resource r by one replica of revision i
+    usage = np.array([[service[res] for res in resource_keys] for service in services], dtype=float)
+    capacity = np.array([capacities[res] for res in resource_keys], dtype=float)
+    upper_bounds = np.array([min(service['max_count'], max_rep_bound) for service in services], dtype=np.int64)
+
+    return throughput, usage.reshape(len(services), len(resource_keys)), capacity, upper_bounds
+
+
+class PopulationEngine:
+    """
+    Batched genetic algorithm over replica vectors.
+
+    The population is a (population_size, n_revisions) integer array; fitness, capacity
+    penalties, tournament selection, crossover and mutation all operate on the whole array.
+    """
+
+    def __init__(self, throughput, usage, capacity, upper_bounds, penalty_factor=100,
+                 tournament_size=4, mutation_rate=0.02, seed=None, constraint_mode='penalty'):
+        self.throughput = np.asarray(throughput, dtype=float)
+        self.usage = np.asarray(usage, dtype=float)
+        self.capacity = np.asarray(capacity, dtype=float)
+        self.upper_bounds = np.maximum(np.asarray(upper_bounds, dtype=np.int64), 0)
+        self.penalty_factor = penalty_factor
+        self.tournament_size = tournament_size
+        self.mutation_rate = mutation_rate
+        # 'penalty': infeasible individuals are only penalized; 'repair': children are projected
+        # back into the feasible region before they are evaluated
+        self.constraint_mode = constraint_mode
+        self.rng = np.random.default_rng(seed)
+        self.n_genes = len(self.throughput)
+        self.generations_run = 0
+        self.stop_reason = None
+        self.best_solution, self.best_score = None, None
+
+    def initialize(self, size, seeds=None, seed_fraction=0.5):
+        # uniform integers in [0, upper_bound] for every revision
+        population = self.rng.integers(0, self.upper_bounds + 1, size=(size, self.n_genes))
+        if seeds is None or len(seeds) == 0:
+            return self.constrain(population)
+
+        # warm start: the seeds themselves plus perturbations around them fill `seed_fraction` of the population
+        seeds = np.clip(np.atleast_2d(np.asarray(seeds, dtype=np.int64)), 0, self.upper_bounds)[:size]
+        seeded = max(min(int(size * seed_fraction), size), len(seeds))
+        population[:len(seeds)] = seeds
+        if seeded > len(seeds):
+            population[len(seeds):seeded] = self.neighbourhood(seeds, seeded - len(seeds))
+        return self.constrain(population)
+
+    def neighbourhood(self, seeds, count, max_step=2, rate=0.3):
+        # copies of random seeds with a few genes moved by up to `max_step` replicas
+        base = seeds[self.rng.integers(0, len(seeds), size=count)]
+        steps = self.rng.integers(-max_step, max_step + 1, size=base.shape)
+        mask = self.rng.random(base.shape) < rate
+        return np.clip(base + np.where(mask, steps, 0), 0, self.upper_bounds)
+
+    def repair(self, population):
+        """
+        Projects replica vectors into the feasible region: counts are clipped to [0, upper_bound]
+        and, while a row exceeds a capacity, the revision with the least throughput per unit of
+        overloaded resource is reduced by just enough replicas to clear its share of the overload.
+        """
+        population = np.clip(population, 0, self.upper_bounds)
+        scale = np.maximum(np.abs(self.capacity), 1e-9)
+
+        for _ in range(self.n_genes + 1):
+            excess = population @ self.usage - self.capacity
+            overloaded = excess > 1e-9
+            rows = np.flatnonzero(overloaded.any(axis=1))
+            if len(rows) == 0:
+                break
+
+            # pressure[row, gene] -> normalized usage of the row's overloaded resources by one replica
+            pressure = (self.usage / scale) @ overloaded[rows].T
+            pressure = pressure.T
+            candidates = (population[rows] > 0) & (pressure > 0)
+            if not candidates.any():
+                break
+
+            ratio = np.where(candidates, self.throughput / np.maximum(pressure, 1e-12), np.inf)
+            genes = np.argmin(ratio, axis=1)
+            rows, genes = rows[candidates.any(axis=1)], genes[candidates.any(axis=1)]
+
+            # replicas to drop so this revision alone clears every overloaded resource it uses
+            per_replica = self.usage[genes]
+            needed = np.where((per_replica > 0) & overloaded[rows],
+                              np.ceil(np.clip(excess[rows], 0, None) / np.maximum(per_replica, 1e-12)), 0)
+            drop = np.minimum(np.maximum(needed.max(axis=1), 1), population[rows, genes]).astype(np.int64)
+            population[rows, genes] -= drop
+        return population
+
+    def constrain(self, population):
+        if self.constraint_mode == 'repair':
+            return self.repair(population)
+        return population
+
+    def fitness(self, population):
+        # total throughput minus penalty for exceeding capacities
+        population = np.atleast_2d(population)
+        total_throughput = population @ self.throughput
+        resource_usage = population @ self.usage
+        penalty = np.clip(resource_usage - self.capacity, 0, None).sum(axis=1)
+        return total_throughput - (penalty * self.penalty_factor)
+
+    def select(self, population, scores, count):
+        # `count` tournaments at once; argmax keeps the first contestant on ties
+        contestants = self.rng.integers(0, len(population), size=(count, self.tournament_size))
+        winners = contestants[np.arange(count), np.argmax(scores[contestants], axis=1)]
+        return population[winners]
+
+    def crossover(self, parents1, parents2):
+        # single point crossover, point drawn per pair in [1, n_genes - 1]
+        if self.n_genes < 2:
+            return parents1.copy(), parents2.copy()
+        points = self.rng.integers(1, self.n_genes, size=(len(parents1), 1))
+        mask = np.arange(self.n_genes) < points
+        child1 = np.where(mask, parents1, parents2)
+        child2 = np.where(mask, parents2, parents1)
+        return child1, child2
+
+    def mutate(self, population):
+        mask = self.rng.random(population.shape) < self.mutation_rate
+        if mask.any():
+            replacements = self.rng.integers(0, self.upper_bounds + 1, size=population.shape)
+            population = np.where(mask, replacements, population)
+        return population
+
+    def step(self, population, scores):
+        """ Runs one generation and returns the surviving population with its scores """
+        population_size = len(population)
+        pairs = population_size // 2
+
+        parents1 = self.select(population, scores, pairs)
+        parents2 = self.select(population, scores, pairs)
+        child1, child2 = self.crossover(parents1, parents2)
+        # interleave children so the order matches child1, child2, child1, ...
+        children = np.empty((pairs * 2, self.n_genes), dtype=population.dtype)
+        children[0::2] = child1
+        children[1::2] = child2
+        children = self.constrain(self.mutate(children))
+
+        # combine new population with previous to maintain diversity, then keep best
+        combined = np.concatenate([children, population])
+        # survivors keep their scores from the last generation, so only the children are scored
+        # (a per-vector memo measured slower than scoring the batch with two matrix products)
+        combined_scores = np.concatenate([self.fitness(children), scores])
+        order = np.argsort(-combined_scores, kind='stable')[:population_size]
+        return combined[order], combined_scores[order]
+
+    def best_so_far(self):
+        """ Best (solution, fitness) seen by the current run; safe to call at any moment """
+        return self.best_solution, self.best_score
+
+    def record_best(self, population, scores):
+        # keep the best individual seen so far, it survives even if the population moves on
+        best = int(np.argmax(scores))
+        if self.best_solution is None or scores[best] > self.best_score:
+            self.best_solution = [int(count) for count in population[best]]
+            self.best_score = float(scores[best])
+            return True
+        return False
+
+    def run(self, population_size=100, generations=100, seeds=None, patience=None, deadline=None,
+            on_improvement=None):
+        """
+        Evolves the population and returns (best_solution, best_fitness).
+
+        `seeds` warm-starts the population (e.g. the previously applied solution); with `patience`
+        the run stops once the best fitness has not improved for that many generations, and with
+        `deadline` (a time.monotonic() value) once the wall-clock budget is used up.
+        `on_improvement(solution, fitness)` is called with every new best solution while the run goes on.
+        """
+        self.best_solution, self.best_score = None, None
+        self.generations_run = 0
+        self.stop_reason = 'generations'
+
+        population = self.initialize(population_size, seeds)
+        scores = self.fitness(population)
+        if self.record_best(population, scores) and on_improvement is not None:
+            on_improvement(*self.best_so_far())
+
+        stale = 0
+        for _ in range(generations):
+            if deadline is not None and time.monotonic() >= deadline:
+                self.stop_reason = 'deadline'
+                break
+
+            population, scores = self.step(population, scores)
+            self.generations_run += 1
+
+            if self.record_best(population, scores):
+                stale = 0
+                if on_improvement is not None:
+                    on_improvement(*self.best_so_far())
+            else:
+                stale += 1
+            if patience is not None and stale >= patience:
+                self.stop_reason = 'converged'
+                break
+
+        return self.best_so_far()
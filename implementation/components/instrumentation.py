@@ -0,0 +1,36 @@
+# imports
+from prometheus_client import Counter, Histogram, start_http_server
+
+# Ports the resident processes serve /metrics on (scraped by the scalewave jobs of prometheus_stack.values)
+OBSERVER_METRICS_PORT = 9464
+OPTIMIZER_METRICS_PORT = 9465
+
+# Bucket bounds in seconds, from single Redis round trips up to stable-mode optimizer runs
+FAST_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1)
+SLOW_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 1.5, 2.5, 5, 10, 15, 30, 60)
+
+PROMQL_QUERY_SECONDS = Histogram('scalewave_promql_query_seconds', 'Latency of one PromQL query',
+                                 ['query'], buckets=SLOW_BUCKETS)
+OBSERVATION_CYCLE_SECONDS = Histogram('scalewave_observation_cycle_seconds',
+                                      'Time of one observation of a service, without the sleep until its next one',
+                                      buckets=SLOW_BUCKETS)
+REDIS_ROUND_TRIP_SECONDS = Histogram('scalewave_redis_round_trip_seconds', 'Time of one Redis round trip',
+                                     ['operation'], buckets=FAST_BUCKETS)
+OPTIMIZER_PHASE_SECONDS = Histogram('scalewave_optimizer_phase_seconds',
+                                    'Optimizer wall time per phase (load_inputs, solve, traffic_update)',
+                                    ['phase'], buckets=SLOW_BUCKETS)
+GA_GENERATIONS = Histogram('scalewave_ga_generations', 'Generations run by one GA solve',
+                           buckets=(5, 10, 15, 20, 30, 40, 50, 75, 100, 150, 200))
+TRIGGER_TO_TRAFFIC_SECONDS = Histogram('scalewave_trigger_to_traffic_seconds',
+                                       'Time from an optimizer trigger until its traffic split is applied',
+                                       buckets=SLOW_BUCKETS)
+REDIS_CACHE_LOOKUPS = Counter('scalewave_redis_cache_lookups', 'Keys looked up in the in-process Redis read cache',
+                              ['outcome'])
+
+
+def start_metrics_server(port):
+    """ Serves every metric of this process on http://0.0.0.0:<port>/metrics from a background thread """
+    if not port:
+        return
+    start_http_server(port)
+    print(f"Serving ScaleWave metrics on :{port}/metrics")
@@ -0,0 +1,99 @@
+# imports
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ga_engine import PopulationEngine
+from instrumentation import GA_GENERATIONS
+
+# Process pool shared by all island runs of this process (created on first use)
+process_pool = None
+process_pool_size = 0
+
+
+def spare_cores():
+    # leave one core for the observer / worker itself
+    return max((os.cpu_count() or 1) - 1, 1)
+
+
+def get_process_pool(workers):
+    global process_pool, process_pool_size
+    if process_pool is None or process_pool_size < workers:
+        if process_pool is not None:
+            process_pool.shutdown(wait=False)
+        process_pool = ProcessPoolExecutor(max_workers=workers)
+        process_pool_size = workers
+    return process_pool
+
+
+def evolve_island(problem, options, rng, population, scores, generations, deadline=None):
+    """ Runs one island for `generations` generations; executed inside a pool process """
+    # default_rng() hands back the same generator, so the island's random stream continues
+    engine = PopulationEngine(*problem, seed=rng, **options)
+    for _ in range(generations):
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        population, scores = engine.step(population, scores)
+    return population, scores, engine.rng
+
+
+def island_genetic_algorithm(throughput, usage, capacity, upper_bounds, islands=None, population_size=100,
+                             generations=100, migration_interval=10, migrants=2, seeds=None, deadline=None,
+                             seed=None, constraint_mode='penalty', progress=None):
+    """
+    Island-model GA: independent populations evolve in a process pool and, every
+    `migration_interval` generations, each island sends its `migrants` best individuals to the
+    next island in a ring (replacing that island's worst ones). Returns (best_solution, best_fitness).
+    `progress(solution, fitness)` is called after every epoch that improved the best solution.
+    """
+    islands = islands or spare_cores()
+    problem = (np.asarray(throughput, dtype=float), np.asarray(usage, dtype=float),
+               np.asarray(capacity, dtype=float), np.asarray(upper_bounds, dtype=np.int64))
+    options = {'constraint_mode': constraint_mode}
+    pool = get_process_pool(islands)
+
+    # independent random streams per island
+    rngs = [np.random.default_rng(child) for child in np.random.SeedSequence(seed).spawn(islands)]
+    # only the first island is warm-started, the others explore from scratch
+    populations, scores = [], []
+    for i, rng in enumerate(rngs):
+        engine = PopulationEngine(*problem, seed=rng, **options)
+        population = engine.initialize(population_size, seeds if i == 0 else None)
+        populations.append(population)
+        scores.append(engine.fitness(population))
+
+    done = 0
+    incumbent = None
+    while done < generations:
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        epoch = min(migration_interval, generations - done)
+        futures = [pool.submit(evolve_island, problem, options, rngs[i], populations[i], scores[i], epoch, deadline)
+                   for i in range(islands)]
+        results = [future.result() for future in futures]
+        populations = [result[0] for result in results]
+        scores = [result[1] for result in results]
+        rngs = [result[2] for result in results]
+        done += epoch
+        if progress is not None:
+            best_island = int(np.argmax([island_scores[0] for island_scores in scores]))
+            if incumbent is None or scores[best_island][0] > incumbent:
+                incumbent = float(scores[best_island][0])
+                progress([int(count) for count in populations[best_island][0]], incumbent)
+
+        # ring migration; populations come back sorted best first
+        if islands > 1 and migrants > 0:
+            outgoing = [(populations[i][:migrants].copy(), scores[i][:migrants].copy()) for i in range(islands)]
+            for i in range(islands):
+                migrant_population, migrant_scores = outgoing[i - 1]
+                populations[i][-migrants:] = migrant_population
+                scores[i][-migrants:] = migrant_scores
+                order = np.argsort(-scores[i], kind='stable')
+                populations[i], scores[i] = populations[i][order], scores[i][order]
+
+    GA_GENERATIONS.observe(done)
+    best_island = int(np.argmax([island_scores.max() for island_scores in scores]))
+    best = int(np.argmax(scores[best_island]))
+    return [int(count) for count in populations[best_island][best]], float(scores[best_island][best])
@@ -0,0 +1,106 @@
+# imports
+import time
+
+import db_client
+from decision_cache import fingerprint_problem, lookup_decision, store_decision
+from instrumentation import OPTIMIZER_PHASE_SECONDS, TRIGGER_TO_TRAFFIC_SECONDS
+from optimizer import (apply_traffic_distribution, load_service_problem, load_warm_start_seeds,
+                       optimize_replicas, publish_incumbent, store_last_solution)
+from solvers import select_strategy
+
+# Name used for joint jobs in the optimizer queue
+JOINT_JOB = '__joint__'
+
+
+def load_service_weights(redis_conn, service_names):
+    # per-service weights (importance of a service's throughput), defaults to 1.0
+    weights = db_client.retrieve_cached(redis_conn, ["service_weights"])["service_weights"] or {}
+    return {service_name: float(weights.get(service_name, 1.0)) for service_name in service_names}
+
+
+def build_joint_problem(problems, weights):
+    """
+    Concatenates the revisions of all services into one problem over the shared cluster capacity.
+    Each service's throughput is scaled by its weight and its own replica bound is folded into the
+    revision's max_count, so the combined problem can be solved like a single service.
+    """
+    services, service_index, slices = [], [], {}
+    start = 0
+    for problem in problems:
+        weight = weights[problem['service_name']]
+        for revision, service in zip(problem['service_index'], problem['services']):
+            joint_service = dict(service)
+            joint_service['normalized_throughput'] = service['normalized_throughput'] * weight
+            joint_service['max_count'] = min(service['max_count'], problem['max_rep_bound'])
+            services.append(joint_service)
+            service_index.append(revision)
+        slices[problem['service_name']] = (start, start + len(problem['services']))
+        start += len(problem['services'])
+
+    return {'service_name': JOINT_JOB,
+            'services': services,
+            'service_index': service_index,
+            # every service sees the same availability snapshot; the newest one is the shared capacity
+            'capacities': problems[-1]['capacities'],
+            'concurrent_requests': {problem['service_name']: problem['concurrent_requests'] for problem in problems},
+            'max_rep_bound': max(problem['max_rep_bound'] for problem in problems),
+            'slices': slices}
+
+
+def run_joint_optimization(redis_conn, service_names, time_budget=None, islands=None, strategy=None,
+                           triggered_at=None):
+    """
+    Solves replicas and traffic for all services in one problem with a shared capacity constraint,
+    then writes every service's traffic split from that single decision.
+    """
+    with OPTIMIZER_PHASE_SECONDS.labels('load_inputs').time():
+        problems = [problem for problem in (load_service_problem(redis_conn, name) for name in service_names)
+                    if problem]
+    if not problems:
+        return None
+
+    weights = load_service_weights(redis_conn, [problem['service_name'] for problem in problems])
+    joint_problem = build_joint_problem(problems, weights)
+
+    strategy = select_strategy(redis_conn, JOINT_JOB, strategy)
+    fingerprint = fingerprint_problem(joint_problem, strategy, time_budget)
+    cached = lookup_decision(redis_conn, JOINT_JOB, fingerprint, joint_problem['service_index'])
+    if cached:
+        print("Decision cache hit for the joint problem")
+        best_solution, best_fitness = cached
+    else:
+        # warm start from each service's own seeds, stitched together
+        stitched, all_warm = [], True
+        current_replicas = []
+        for problem in problems:
+            seeds, warm = load_warm_start_seeds(redis_conn, problem)
+            stitched.extend(seeds[0])
+            current_replicas.extend(seeds[-1])
+            all_warm = all_warm and warm
+
+        best_solution, best_fitness = optimize_replicas(joint_problem, seeds=[stitched, current_replicas],
+                                                        warm=all_warm, time_budget=time_budget, islands=islands,
+                                                        strategy=strategy,
+                                                        progress=publish_incumbent(redis_conn, joint_problem))
+        store_decision(redis_conn, JOINT_JOB, fingerprint, joint_problem['service_index'], best_solution,
+                       best_fitness)
+    print("Joint Best Solution:", best_solution)
+    print("Joint Best Fitness (Weighted Throughput - Penalties):", best_fitness)
+
+    decision = {}
+    applied = False
+    for problem in problems:
+        start, end = joint_problem['slices'][problem['service_name']]
+        solution = best_solution[start:end]
+        decision[problem['service_name']] = dict(zip(problem['service_index'], solution))
+        store_last_solution(redis_conn, problem, solution, best_fitness)
+        with OPTIMIZER_PHASE_SECONDS.labels('traffic_update').time():
+            applied = apply_traffic_distribution(problem['service_name'], problem['service_index'],
+                                                 problem['services'], solution) or applied
+    if applied and triggered_at is not None:
+        TRIGGER_TO_TRAFFIC_SECONDS.observe(time.time() - triggered_at)
+
+    db_client.store_json_data(redis_conn, "joint_optimizer_decision",
+                              {'weights': weights, 'replicas': decision, 'fitness': best_fitness,
+                               'computed_at': time.time()})
+    return decision
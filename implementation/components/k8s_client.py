@@ -0,0 +1,143 @@
+# imports
+import json
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# API server reached through `kubectl proxy` (started by setup_scalewave_3.sh), which takes care of
+# kubeconfig credentials; inside a pod the service account is used instead
+DEFAULT_API_SERVER = os.environ.get("SCALEWAVE_K8S_API", "http://127.0.0.1:8001")
+SERVICE_ACCOUNT_DIR = "/var/run/secrets/kubernetes.io/serviceaccount"
+
+KNATIVE_SERVING = "/apis/serving.knative.dev/v1"
+
+# Knative labels set on revisions and their pods
+SERVICE_LABEL = "serving.knative.dev/service"
+REVISION_LABEL = "serving.knative.dev/revision"
+
+
+class ClusterClient:
+    """
+    Kubernetes / Knative API access over one persistent HTTP session (keep-alive, pooled connections),
+    replacing the kubectl and kn subprocesses of the control loop.
+    """
+
+    def __init__(self, base_url=None, token=None, verify=True, timeout=10):
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Accept"] = "application/json"
+        self.timeout = timeout
+
+        if base_url is None and os.environ.get("KUBERNETES_SERVICE_HOST"):
+            # in-cluster configuration
+            base_url = f"https://{os.environ['KUBERNETES_SERVICE_HOST']}:{os.environ.get('KUBERNETES_SERVICE_PORT', 443)}"
+            with open(os.path.join(SERVICE_ACCOUNT_DIR, "token")) as f:
+                token = f.read().strip()
+            verify = os.path.join(SERVICE_ACCOUNT_DIR, "ca.crt")
+
+        self.base_url = (base_url or DEFAULT_API_SERVER).rstrip("/")
+        self.session.verify = verify
+        if token:
+            self.session.headers["Authorization"] = f"Bearer {token}"
+
+    def request(self, method, path, **kwargs):
+        response = self.session.request(method, f"{self.base_url}{path}", timeout=self.timeout, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def get(self, path, params=None):
+        return self.request("GET", path, params=params)
+
+    def list(self, path, label_selector=None, field_selector=None):
+        params = {}
+        if label_selector:
+            params["labelSelector"] = label_selector
+        if field_selector:
+            params["fieldSelector"] = field_selector
+        return self.get(path, params=params)
+
+    def watch(self, path, resource_version, label_selector=None, timeout_seconds=300):
+        """ Yields the watch events ({'type': ..., 'object': ...}) of a collection after `resource_version` """
+        params = {"watch": "true", "resourceVersion": resource_version, "allowWatchBookmarks": "true",
+                  "timeoutSeconds": timeout_seconds}
+        if label_selector:
+            params["labelSelector"] = label_selector
+        # the server closes the stream after timeout_seconds; the read timeout only catches dead connections
+        with self.session.get(f"{self.base_url}{path}", params=params, stream=True,
+                              timeout=(self.timeout, timeout_seconds + 30)) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if line:
+                    yield json.loads(line)
+
+    def list_knative_services(self, namespace="default"):
+        return self.list(f"{KNATIVE_SERVING}/namespaces/{namespace}/services").get("items", [])
+
+    def get_knative_service(self, name, namespace="default"):
+        return self.get(f"{KNATIVE_SERVING}/namespaces/{namespace}/services/{name}")
+
+    def list_revisions(self, namespace="default", service_name=None):
+        label_selector = f"{SERVICE_LABEL}={service_name}" if service_name else None
+        return self.list(f"{KNATIVE_SERVING}/namespaces/{namespace}/revisions",
+                         label_selector=label_selector).get("items", [])
+
+    def list_pods(self, namespace="default", label_selector=None):
+        return self.list(f"/api/v1/namespaces/{namespace}/pods", label_selector=label_selector).get("items", [])
+
+    def list_nodes(self):
+        return self.list("/api/v1/nodes").get("items", [])
+
+    def get_node(self, name):
+        return self.get(f"/api/v1/nodes/{name}")
+
+    def patch_traffic(self, service_name, traffic, namespace="default"):
+        """ Replaces spec.traffic of a Knative service with one JSON merge patch """
+        body = {"spec": {"traffic": traffic}}
+        return self.request("PATCH", f"{KNATIVE_SERVING}/namespaces/{namespace}/services/{service_name}",
+                            json=body, headers={"Content-Type": "application/merge-patch+json"})
+
+
+# Client shared by everything in this process (created on first use)
+cluster_client = None
+
+
+def get_cluster_client():
+    global cluster_client
+    if cluster_client is None:
+        cluster_client = ClusterClient()
+    return cluster_client
+
+
+def service_traffic(service):
+    # {revision: percent} from a Knative service's status.traffic
+    traffic = service.get('status', {}).get('traffic', [])
+    return {route.get('revisionName', 'Latest'): route.get('percent', 0) for route in traffic}
+
+
+def node_ready_status(node):
+    for condition in node.get('status', {}).get('conditions', []):
+        if condition['type'] == 'Ready':
+            return condition['status']
+    return None
+
+
+def pod_running(pod):
+    # what kubectl shows as Running: phase Running, Ready, and not being deleted (CrashLoopBackOff and
+    # Terminating pods keep phase Running)
+    if pod.get('metadata', {}).get('deletionTimestamp'):
+        return False
+    if pod.get('status', {}).get('phase') != 'Running':
+        return False
+    return any(condition['type'] == 'Ready' and condition['status'] == 'True'
+               for condition in pod['status'].get('conditions', []))
+
+
+if __name__ == "__main__":
+    client = get_cluster_client()
+    for service in client.list_knative_services():
+        print(service['metadata']['name'], service_traffic(service))
+    for node in client.list_nodes():
+        print(f"Node: {node['metadata']['name']}, Ready: {node_ready_status(node)}")
@@ -0,0 +1,249 @@
+# imports
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+import requests
+from prometheus_client.parser import text_string_to_metric_families
+
+from cluster_cache import get_cluster_cache
+from k8s_client import REVISION_LABEL, get_cluster_client
+
+# Metric endpoints: the queue-proxy sidecar of every revision pod and the activator pods
+QUEUE_PROXY_METRICS_PORT = 9091
+ACTIVATOR_METRICS_PORT = 9090
+ACTIVATOR_NAMESPACE = 'knative-serving'
+ACTIVATOR_SELECTOR = 'app=activator'
+
+# Scrape cadence and per-endpoint timeout in seconds, and endpoints scraped at once
+SCRAPE_INTERVAL = 1
+SCRAPE_TIMEOUT = 0.5
+SCRAPE_WORKERS = 16
+
+# How often the endpoints are re-listed (seconds; revision pods come from the cluster cache when it is synced)
+TARGET_REFRESH_INTERVAL = 5
+
+# Samples are kept for the longest window served; families are only served while every target of their
+# endpoint kind has a sample younger than STALE_AFTER (otherwise the observer asks Prometheus)
+MAX_WINDOW = 300
+STALE_AFTER = 3 * SCRAPE_INTERVAL
+
+# Families served in process, matching observer.throughput_queries:
+# name: (kind, endpoint kind, metric, only 2xx responses, scale)
+FAST_FAMILIES = {
+    'successful_requests': ('rate', 'queue-proxy', 'revision_request_count', True, 60),
+    'total_requests': ('rate', 'queue-proxy', 'revision_request_count', False, 60),
+    'request_latencies': ('rate', 'queue-proxy', 'revision_request_latencies_sum', True, 60 / 1000),
+    'activator_latencies': ('rate', 'activator', 'activator_request_latencies_sum', True, 60 / 1000),
+    'activator_concurrency': ('gauge', 'activator', 'activator_request_concurrency', False, 1),
+    'throughput': ('ratio', 'queue-proxy', ('revision_request_count', 'revision_request_latencies_sum'), True, 1),
+}
+SCRAPED_METRICS = {'revision_request_count', 'revision_request_latencies_sum', 'activator_request_latencies_sum',
+                   'activator_request_concurrency'}
+
+
+def window_seconds(window):
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    return int(window[:-1]) * units[window[-1]]
+
+
+def parse_metrics(text):
+    """ {(metric, revision, 2xx response): value} of the scraped families in Prometheus text format """
+    values = {}
+    for family in text_string_to_metric_families(text):
+        for sample in family.samples:
+            # the parser reports counter samples as '<name>_total' whether or not the endpoint did
+            name = sample.name[:-len('_total')] if sample.name.endswith('_total') else sample.name
+            revision = sample.labels.get('revision_name')
+            if name not in SCRAPED_METRICS or not revision:
+                continue
+            key = (name, revision, sample.labels.get('response_code_class') == '2xx')
+            values[key] = values.get(key, 0) + sample.value
+    return values
+
+
+def series_value(values, metric, revision, only_2xx):
+    if only_2xx:
+        return values.get((metric, revision, True))
+    ok, other = values.get((metric, revision, True)), values.get((metric, revision, False))
+    if ok is None and other is None:
+        return None
+    return (ok or 0) + (other or 0)
+
+
+def counter_rate(samples, metric, revision, only_2xx):
+    # per-second increase over the samples (oldest first), counter resets counted like PromQL's rate()
+    points = [(t, v) for t, v in ((t, series_value(values, metric, revision, only_2xx)) for t, values in samples)
+              if v is not None]
+    if len(points) < 2 or points[-1][0] <= points[0][0]:
+        return None
+    increase = 0
+    for (_, previous), (_, value) in zip(points, points[1:]):
+        increase += value - previous if value >= previous else value
+    return increase / (points[-1][0] - points[0][0])
+
+
+def cluster_targets(namespace="default"):
+    """ [(endpoint kind, metrics URL, revision or None)] of the revision pods and activators """
+    client = get_cluster_client()
+    cache = get_cluster_cache(namespace)
+    if cache:
+        pod_ips = cache.revision_pod_ips()
+    else:
+        pods = client.list_pods(namespace, label_selector=REVISION_LABEL)
+        pod_ips = {pod['status']['podIP']: pod['metadata']['labels'][REVISION_LABEL] for pod in pods
+                   if pod.get('status', {}).get('phase') == 'Running' and pod['status'].get('podIP')}
+    activators = [pod['status']['podIP'] for pod in client.list_pods(ACTIVATOR_NAMESPACE, ACTIVATOR_SELECTOR)
+                  if pod.get('status', {}).get('phase') == 'Running' and pod['status'].get('podIP')]
+    targets = [('queue-proxy', f"http://{ip}:{QUEUE_PROXY_METRICS_PORT}/metrics", revision)
+               for ip, revision in pod_ips.items()]
+    targets += [('activator', f"http://{ip}:{ACTIVATOR_METRICS_PORT}/metrics", None) for ip in activators]
+    return targets
+
+
+class FastPathScraper:
+    """
+    Scrapes the queue-proxy and activator metric endpoints every SCRAPE_INTERVAL in a background thread
+    and serves the request-rate families of observer.throughput_queries from the samples, seconds after
+    the requests instead of after a Prometheus scrape plus a rate window. results() only returns families
+    it can answer for the whole window; the rest is left to Prometheus.
+    `targets` returns [(endpoint kind, metrics URL, revision or None)] (cluster_targets by default).
+    """
+
+    def __init__(self, targets=None, interval=SCRAPE_INTERVAL):
+        self.targets = targets or cluster_targets
+        self.interval = interval
+        self.session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=SCRAPE_WORKERS, pool_maxsize=SCRAPE_WORKERS)
+        self.session.mount('http://', adapter)
+        self.executor = ThreadPoolExecutor(max_workers=SCRAPE_WORKERS, thread_name_prefix="scrape")
+        self.lock = threading.Lock()
+        self.samples = {}               # URL -> deque of (time, parsed values)
+        self.kinds = {}                 # URL -> (endpoint kind, revision or None)
+        self.started_at = None
+        self.current_targets = []
+        self.targets_listed_at = 0
+        self.thread = None
+
+    def scrape(self, url):
+        response = self.session.get(url, timeout=SCRAPE_TIMEOUT)
+        response.raise_for_status()
+        return parse_metrics(response.text)
+
+    def refresh_targets(self, now):
+        if now - self.targets_listed_at < TARGET_REFRESH_INTERVAL:
+            return self.current_targets
+        try:
+            self.current_targets = self.targets()
+            self.targets_listed_at = now
+        except requests.RequestException as e:
+            print(f"Failed to list metric endpoints: {e}")
+        return self.current_targets
+
+    def scrape_round(self):
+        now = time.time()
+        targets = self.refresh_targets(now)
+        futures = {url: self.executor.submit(self.scrape, url) for _, url, _ in targets}
+        wait(futures.values(), timeout=SCRAPE_TIMEOUT * 2)
+        scraped_at = time.time()
+        with self.lock:
+            for kind, url, revision in targets:
+                self.kinds[url] = (kind, revision)
+                future = futures[url]
+                if not future.done() or future.exception() is not None:
+                    continue
+                series = self.samples.setdefault(url, deque())
+                series.append((scraped_at, future.result()))
+                while series and series[0][0] < scraped_at - MAX_WINDOW - 2 * self.interval:
+                    series.popleft()
+            # endpoints that went away (pods deleted) stop counting
+            listed = {url for _, url, _ in targets}
+            for url in list(self.samples):
+                if url not in listed:
+                    del self.samples[url]
+                    self.kinds.pop(url, None)
+        if self.started_at is None:
+            self.started_at = scraped_at
+
+    def run(self):
+        while True:
+            started = time.monotonic()
+            try:
+                self.scrape_round()
+            except Exception as e:
+                print(f"Metric scrape failed: {e}")
+            time.sleep(max(self.interval - (time.monotonic() - started), 0))
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="fast-path-scraper", daemon=True)
+            self.thread.start()
+        return self
+
+    def fresh(self, kind, revisions, now):
+        # some endpoint of the kind (of the given revisions, for queue-proxies) is listed and all of them have a
+        # recent sample
+        urls = [url for url, (url_kind, revision) in self.kinds.items()
+                if url_kind == kind and (revision is None or revision in revisions)]
+        return bool(urls) and all(self.samples.get(url) and now - self.samples[url][-1][0] <= STALE_AFTER for url in urls)
+
+    def family(self, name, revisions, window, now):
+        kind, endpoint_kind, metric, only_2xx, scale = FAST_FAMILIES[name]
+        if not self.fresh(endpoint_kind, revisions, now):
+            return None
+        if kind == 'rate' and (self.started_at is None or now - self.started_at < window_seconds(window)):
+            return None
+
+        values = {}
+        for url, series in self.samples.items():
+            if self.kinds[url][0] != endpoint_kind:
+                continue
+            for revision in revisions:
+                if kind == 'rate':
+                    start = now - window_seconds(window)
+                    value = counter_rate([sample for sample in series if sample[0] >= start], metric, revision,
+                                         only_2xx)
+                elif kind == 'gauge':
+                    value = series_value(series[-1][1], metric, revision, only_2xx)
+                else:
+                    # cumulative ratio, summed over endpoints first (see below)
+                    count = series_value(series[-1][1], metric[0], revision, only_2xx)
+                    latency = series_value(series[-1][1], metric[1], revision, only_2xx)
+                    value = (count, latency) if count is not None and latency is not None else None
+                if value is None:
+                    continue
+                if kind == 'ratio':
+                    total = values.get(revision, (0, 0))
+                    values[revision] = (total[0] + value[0], total[1] + value[1])
+                else:
+                    values[revision] = values.get(revision, 0) + value * scale
+        if kind == 'ratio':
+            values = {revision: count / latency for revision, (count, latency) in values.items() if latency > 0}
+        return values
+
+    def results(self, revisions, names, decision_window):
+        """
+        {name: {revision: value}} for the query names ('family' over decision_window, or 'family@window')
+        the fast path can serve right now
+        """
+        now = time.time()
+        served = {}
+        with self.lock:
+            for name in names:
+                family, _, window = name.partition('@')
+                if family not in FAST_FAMILIES:
+                    continue
+                values = self.family(family, set(revisions), window or decision_window, now)
+                if values is not None:
+                    served[name] = values
+        return served
+
+
+if __name__ == "__main__":
+    # Scrape the cluster for a few seconds and print what the fast path serves
+    scraper = FastPathScraper().start()
+    time.sleep(5)
+    with scraper.lock:
+        revisions = {revision for _, revision in scraper.kinds.values() if revision}
+    print(scraper.results(revisions, list(FAST_FAMILIES), '30s'))
@@ -1,19 +1,28 @@
 # imports
 import argparse
-import os
+import asyncio
+import random
 import time
-import subprocess
-
-from prometheus_api_client import PrometheusConnect
 
 import db_client
+from change_point import CUSUM_THRESHOLD, ChangePointTrigger
+from cluster_cache import get_cluster_cache
+from instrumentation import OBSERVATION_CYCLE_SECONDS, OBSERVER_METRICS_PORT, start_metrics_server
+from joint_optimizer import JOINT_JOB
+from metric_scraper import FastPathScraper
+from optimizer_worker import enqueue_optimization
+from promql_fetcher import connect_to_prometheus, fetch_queries_async
+from query_planner import PrefixIndex, execute_plan_async, select_revisions
+from shard_leases import HEARTBEAT_INTERVAL, ShardMembership
+from timeseries import TS_FIELDS, append_samples, evict_stale
+from trigger_engine import DEBOUNCE_SAMPLES, MIN_DECISION_INTERVAL, TriggerEngine, queue_metric_event
 from utils import get_services_and_revisions
 
 # Prometheus URL
 prometheus_url = "http://localhost:9090"
 
 # Connect to Prometheus
-prometheus = PrometheusConnect(url=prometheus_url)
+prometheus = connect_to_prometheus(prometheus_url)
 
 # Connect to Redis
 redis_conn = db_client.connect_to_redis()
@@ -21,15 +30,87 @@ redis_conn = db_client.connect_to_redis()
 # Observer frequency (in seconds)
 observer_frequency = '1m'
 
-# Timer triggers in seconds
+# Rate windows observed side by side; panic-mode decisions use the short one, stable mode the long one
+# (the short window has to cover two scrapes: Prometheus scrapes every 15s)
+observer_windows = ['30s', '1m', '5m']
+panic_window = '30s'
+stable_window = '5m'
+
+# Request-rate families fetched for every window in observer_windows, not only the decision window
+windowed_families = ['successful_requests', 'total_requests', 'request_latencies', 'activator_latencies']
+
+# Timer triggers in seconds, per service (each service is observed by its own task at its own mode's cadence)
 panic_timer = 6
 stable_timer = 30
 
+# A service panics when its requests in flight grow by half since the last observation, and by at least
+# this many requests (so an idle service, 0 >= 1.5 * 0, does not)
+panic_min_increase = 1
+
+# Random spread (fraction) applied to every interval, so service tasks do not poll in lockstep
+interval_jitter = 0.1
+
+# Services that come due within one tick are observed through one PromQL plan per decision window (seconds)
+batch_tick = 1
+
+# How often the set of Knative services is refreshed to start and stop service tasks (seconds)
+discovery_interval = 10
+
+# Optimizer wall-clock budget in seconds (panic decisions have to land within panic_timer)
+panic_optimizer_budget = 1.5
+stable_optimizer_budget = 10
+
+# How often series of revisions that stopped reporting are evicted (seconds)
+stale_eviction_interval = 600
+
+# Revisions of every observed service, its current mode ('panic' / 'stable') and the latest cluster-level
+# resource availability, shared by the observer tasks
+service_revisions = {}
+service_modes = {}
+cluster_state = {'availability': None}
+
+# Services waiting for the next plan of their decision window: {window: {service_name: (revisions, future)}}
+pending_plans = {}
+
+# Observation task per service, and the lease membership of a sharded observer (--shard)
+service_tasks = {}
+membership = None
+
+# In-process scraper of the queue-proxy and activator endpoints (--fast-path); families it cannot serve
+# for the whole window are fetched from Prometheus
+fast_path = None
+
+# Label each per-revision metric family is demultiplexed by
+family_components = {
+    'replicas': 'deployment',
+    'pod_cpu': 'pod', 'pod_memory': 'pod', 'pod_disk_read': 'pod', 'pod_disk_write': 'pod',
+    'pod_network_receive': 'pod', 'pod_network_transmit': 'pod',
+    'throughput': 'revision_name', 'successful_requests': 'revision_name', 'total_requests': 'revision_name',
+    'request_latencies': 'revision_name', 'activator_latencies': 'revision_name',
+    'activator_concurrency': 'revision_name', 'autoscaler_concurrency_per_pod': 'revision_name',
+}
+
 
 def parse_args():
     p = argparse.ArgumentParser()
     p.add_argument("--manager_node_ip", help="IP of the manager node")
     p.add_argument("--c", help="Current concurrency per pod")
+    p.add_argument("--joint", action="store_true",
+                   help="Optimize all services together over the shared cluster capacity")
+    p.add_argument("--debounce", type=int, default=DEBOUNCE_SAMPLES,
+                   help="Consecutive throughput-drop samples before the optimizer is triggered")
+    p.add_argument("--min-interval", type=float, default=MIN_DECISION_INTERVAL,
+                   help="Minimum seconds between two optimizer triggers of a service")
+    p.add_argument("--trigger", choices=['threshold', 'cusum'], default='threshold',
+                   help="Throughput-drop threshold with debouncing, or CUSUM change-point detection per revision")
+    p.add_argument("--cusum-threshold", type=float, default=CUSUM_THRESHOLD,
+                   help="CUSUM decision threshold in standard deviations (lower is more sensitive)")
+    p.add_argument("--metrics-port", type=int, default=OBSERVER_METRICS_PORT,
+                   help="Port of the observer's /metrics endpoint (0 disables it)")
+    p.add_argument("--fast-path", action="store_true",
+                   help="Scrape request rates and activator concurrency from the pods directly (Prometheus as fallback)")
+    p.add_argument("--shard", action="store_true",
+                   help="Split the services with the other --shard observers through Redis leases")
     return p.parse_args()
 
 
@@ -40,54 +121,59 @@ def parse_promql_results_to_cluster_metrics(data):
         return 0
 
 
-def parse_promql_results_to_eqv_metrics(component, data, equivalent_services):
-    if not data:
-        return None
-    eqv_service_metrics = {equivalent_service: 0 for equivalent_service in equivalent_services}
-    for result in data:
-        for equivalent_service in equivalent_services:
-            if result['metric'][component].startswith(equivalent_service):
-                if component == 'deployment':
-                    eqv_service_metrics[equivalent_service] += int(result['value'][1])
-                else:
-                    eqv_service_metrics[equivalent_service] += float(result['value'][1])
-    return eqv_service_metrics
-
-
-def monitor_cluster_level_resource_availability(master_instance):
-    """ Fetches cluster level resource availability metrics """
+def cluster_level_queries(master_instance, window=observer_frequency):
+    """ PromQL queries for cluster level resource availability """
 
     # available cpu in millicores (m)
-    cpu_query = f'(sum(rate(node_cpu_seconds_total{{mode="idle", instance!="{master_instance}"}}[{observer_frequency}])) ) * 1000'
+    cpu_query = f'(sum(rate(node_cpu_seconds_total{{mode="idle", instance!="{master_instance}"}}[{window}])) ) * 1000'
     # available memory in Mebibytes (MiB)
     memory_query = f'sum(sum(node_memory_MemAvailable_bytes{{instance!="{master_instance}"}})/1048576)'
     # available disk capacity in Mebibytes (MiB)
     disk_query = f'sum(node_filesystem_avail_bytes{{instance!="{master_instance}"}}) / 1048576'
 
     # available disk read capacity in Mebibytes (MiB)
-    disk_read_query = f'sum(rate(node_disk_read_bytes_total{{instance!="{master_instance}"}}[{observer_frequency}])) / 1048576'
+    disk_read_query = f'sum(rate(node_disk_read_bytes_total{{instance!="{master_instance}"}}[{window}])) / 1048576'
     # available disk write capacity in Mebibytes (MiB)
-    disk_write_query = f'sum(rate(node_disk_written_bytes_total{{instance!="{master_instance}"}}[{observer_frequency}])) / 1048576'
+    disk_write_query = f'sum(rate(node_disk_written_bytes_total{{instance!="{master_instance}"}}[{window}])) / 1048576'
 
     # available network downlink bandwidth in Megabits/second (Mbps)
-    network_receive_query = f'sum(rate(node_network_receive_bytes_total{{instance!="{master_instance}", device!~"lo|veth.*|docker.*|flannel.*|cali.*|cbr.*"}}[{observer_frequency}])) * 8 / 1048576'
+    network_receive_query = f'sum(rate(node_network_receive_bytes_total{{instance!="{master_instance}", device!~"lo|veth.*|docker.*|flannel.*|cali.*|cbr.*"}}[{window}])) * 8 / 1048576'
     # available network uplink bandwidth in Megabits/second (Mbps)
-    network_transmit_query = f'sum(rate(node_network_transmit_bytes_total{{instance!="{master_instance}", device!~"lo|veth.*|docker.*|flannel.*|cali.*|cbr.*"}}[{observer_frequency}])) * 8 / 1048576'
+    network_transmit_query = f'sum(rate(node_network_transmit_bytes_total{{instance!="{master_instance}", device!~"lo|veth.*|docker.*|flannel.*|cali.*|cbr.*"}}[{window}])) * 8 / 1048576'
 
-    cpu_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(cpu_query))
-    memory_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(memory_query))
-    disk_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(disk_query))
-    disk_read_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(disk_read_query))
-    disk_write_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(disk_write_query))
-    network_receive_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(network_receive_query))
-    network_transmit_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(network_transmit_query))
+    return {
+        'cluster_cpu': cpu_query,
+        'cluster_memory': memory_query,
+        'cluster_disk': disk_query,
+        'cluster_disk_read': disk_read_query,
+        'cluster_disk_write': disk_write_query,
+        'cluster_network_receive': network_receive_query,
+        'cluster_network_transmit': network_transmit_query,
+    }
+
+
+def monitor_cluster_level_resource_availability(results, max_resource_capacity):
+    """
+    Cluster level resource availability metrics from the fetched cluster_level_queries, or None when one of
+    the queries failed (a missing value must not be taken for zero capacity)
+    """
+    failed = [name for name, result in results.items() if result is None]
+    if failed:
+        print(f"Cluster-level queries failed: {failed}")
+        return None
+
+    cpu_result = parse_promql_results_to_cluster_metrics(results['cluster_cpu'])
+    memory_result = parse_promql_results_to_cluster_metrics(results['cluster_memory'])
+    disk_result = parse_promql_results_to_cluster_metrics(results['cluster_disk'])
+    disk_read_result = parse_promql_results_to_cluster_metrics(results['cluster_disk_read'])
+    disk_write_result = parse_promql_results_to_cluster_metrics(results['cluster_disk_write'])
+    network_receive_result = parse_promql_results_to_cluster_metrics(results['cluster_network_receive'])
+    network_transmit_result = parse_promql_results_to_cluster_metrics(results['cluster_network_transmit'])
 
     # TODO: Run this as a separate process in certain time durations and report it in memcache
     # from network_benchmark import perform_speed_test
     # max_downlink, max_uplink = perform_speed_test()
 
-    max_resource_capacity = db_client.retrieve_json_data(redis_conn, "max_resource_benchmarks")
-
     if not max_resource_capacity:
         max_disk_read, max_disk_write = 2909.1, 556.9
         max_network_downlink, max_network_uplink = 300.59, 350.56
@@ -108,33 +194,47 @@ def monitor_cluster_level_resource_availability(master_instance):
     }
 
 
-def monitor_pod_level_resource_utilization(service_name, equivalent_services):
-    """ Fetches container level resource usage metrics """
+def pod_level_queries(service_names, window=observer_frequency):
+    """ PromQL queries for container level resource usage of all services' pods """
+    service_pattern = '(' + '|'.join(service_names) + ')'
 
     # cpu usage in millicores (m)
-    cpu_query = f'sum(rate(container_cpu_usage_seconds_total{{pod=~"{service_name}.*"}}[{observer_frequency}])) by (pod) * 1000'
+    cpu_query = f'sum(rate(container_cpu_usage_seconds_total{{pod=~"{service_pattern}.*"}}[{window}])) by (pod) * 1000'
     
     # memory usage in Mebibytes (MiB)
-    memory_query = f'sum(container_memory_usage_bytes{{pod=~"{service_name}.*"}}) by (pod) / 1048576'
+    memory_query = f'sum(container_memory_usage_bytes{{pod=~"{service_pattern}.*"}}) by (pod) / 1048576'
     
     # disk read in Mebibytes (MiB)
-    disk_read_query = f'sum(rate(container_fs_reads_bytes_total{{pod=~"{service_name}.*"}}[{observer_frequency}])) by (pod) / 1048576'
+    disk_read_query = f'sum(rate(container_fs_reads_bytes_total{{pod=~"{service_pattern}.*"}}[{window}])) by (pod) / 1048576'
     
     # disk write in Mebibytes (MiB)
-    disk_write_query = f'sum(rate(container_fs_writes_bytes_total{{pod=~"{service_name}.*"}}[{observer_frequency}])) by (pod) / 1048576'
+    disk_write_query = f'sum(rate(container_fs_writes_bytes_total{{pod=~"{service_pattern}.*"}}[{window}])) by (pod) / 1048576'
     
     # network downlink usage in Megabits/second (Mbps)
-    network_receive_query = f'sum(rate(container_network_receive_bytes_total{{pod=~"{service_name}.*"}}[{observer_frequency}])) by (pod) * 8 / 1048576'
+    network_receive_query = f'sum(rate(container_network_receive_bytes_total{{pod=~"{service_pattern}.*"}}[{window}])) by (pod) * 8 / 1048576'
     
     # network uplink usage in Megabits/second (Mbps)
-    network_transmit_query = f'sum(rate(container_network_transmit_bytes_total{{pod=~"{service_name}.*"}}[{observer_frequency}])) by (pod) * 8 / 1048576'
+    network_transmit_query = f'sum(rate(container_network_transmit_bytes_total{{pod=~"{service_pattern}.*"}}[{window}])) by (pod) * 8 / 1048576'
+
+    return {
+        'pod_cpu': cpu_query,
+        'pod_memory': memory_query,
+        'pod_disk_read': disk_read_query,
+        'pod_disk_write': disk_write_query,
+        'pod_network_receive': network_receive_query,
+        'pod_network_transmit': network_transmit_query,
+    }
+
+
+def monitor_pod_level_resource_utilization(service_name, equivalent_services, results):
+    """ Container level resource usage metrics of a service from the demultiplexed pod_level_queries """
 
-    cpu_result = parse_promql_results_to_eqv_metrics('pod', prometheus.custom_query(cpu_query), equivalent_services)
-    memory_result = parse_promql_results_to_eqv_metrics('pod', prometheus.custom_query(memory_query), equivalent_services)
-    disk_read_result = parse_promql_results_to_eqv_metrics('pod', prometheus.custom_query(disk_read_query), equivalent_services)
-    disk_write_result = parse_promql_results_to_eqv_metrics('pod', prometheus.custom_query(disk_write_query), equivalent_services)
-    network_receive_result = parse_promql_results_to_eqv_metrics('pod', prometheus.custom_query(network_receive_query), equivalent_services)
-    network_transmit_result = parse_promql_results_to_eqv_metrics('pod', prometheus.custom_query(network_transmit_query), equivalent_services)
+    cpu_result = select_revisions(results['pod_cpu'], equivalent_services)
+    memory_result = select_revisions(results['pod_memory'], equivalent_services)
+    disk_read_result = select_revisions(results['pod_disk_read'], equivalent_services)
+    disk_write_result = select_revisions(results['pod_disk_write'], equivalent_services)
+    network_receive_result = select_revisions(results['pod_network_receive'], equivalent_services)
+    network_transmit_result = select_revisions(results['pod_network_transmit'], equivalent_services)
 
     return {
         "service_name": service_name,
@@ -147,19 +247,27 @@ def monitor_pod_level_resource_utilization(service_name, equivalent_services):
     }
 
 
-def monitor_additional_accelerator_resources(service_name, equivalent_services):
+def accelerator_queries(equivalent_services, window=observer_frequency):
+    """ PromQL queries for accelerator utilization (only when a GPU revision is present) """
+    for equivalent_service in equivalent_services:
+        if 'oblique-00004' in equivalent_service:   # parse by gpu tag in equivalent service name (others as FPGA can be added as such)
+            gpu_util_query = f'max(max_over_time(jetson_gpu_utilization[{window}]))'
+            # gpu_mem_util_query = f'sum(rate(jetson_gpu_memory_utilization[{window}]))'
+            return {'gpu_util': gpu_util_query}
+    return {}
+
+
+def monitor_additional_accelerator_resources(service_name, equivalent_services, results):
     gpu_metrics = {}
     gpu_service_revision_number = 'oblique-00004'
 
     for equivalent_service in equivalent_services:
         if 'oblique-00004' in equivalent_service:   # parse by gpu tag in equivalent service name (others as FPGA can be added as such)
-            gpu_util_query = f'max(max_over_time(jetson_gpu_utilization[{observer_frequency}]))'
-            # gpu_mem_util_query = f'sum(rate(jetson_gpu_memory_utilization[{observer_frequency}]))'
             # gpu_util_query = 'jetson_gpu_utilization'
             # gpu_mem_util_query = 'jetson_gpu_memory_utilization'
 
-            gpu_util_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(gpu_util_query))
-            # gpu_mem_util_result = parse_promql_results_to_cluster_metrics(prometheus.custom_query(gpu_mem_util_query))
+            gpu_util_result = parse_promql_results_to_cluster_metrics(results.get('gpu_util'))
+            # gpu_mem_util_result = parse_promql_results_to_cluster_metrics(results.get('gpu_mem_util'))
             gpu_avail = 100 - gpu_util_result
             # gpu_mem_avail = 100 - gpu_mem_util_result
             # gpu_metrics['available_gpu_resource'] = {'gpu': gpu_avail, 'gpu_mem': gpu_mem_avail}
@@ -178,73 +286,86 @@ def monitor_additional_accelerator_resources(service_name, equivalent_services):
     return gpu_metrics
 
 
-def monitor_current_eqv_service_replicas(service_name, equivalent_services):
-    replica_count_query = f'''sum(kube_deployment_spec_replicas{{deployment=~"{service_name}.*", 
+def replica_queries(service_names):
+    # not needed while the cluster cache watches the revisions' deployments
+    if get_cluster_cache():
+        return {}
+    service_pattern = '(' + '|'.join(service_names) + ')'
+    replica_count_query = f'''sum(kube_deployment_spec_replicas{{deployment=~"{service_pattern}.*", 
                                     job="kube-state-metrics"}}) by (deployment)'''
+    return {'replicas': replica_count_query}
+
+
+def monitor_current_eqv_service_replicas(service_name, equivalent_services, results):
+    cache = get_cluster_cache()
+    if cache:
+        # desired replicas straight from the watched deployments (same value kube-state-metrics exports)
+        replicas = cache.revision_replicas(service_name)
+        current_replica_count = {equivalent_service: int(replicas.get(equivalent_service, 0))
+                                 for equivalent_service in equivalent_services}
+        print(f"Current replica for {service_name}: ", current_replica_count)
+        return current_replica_count
 
-    current_replica_count = parse_promql_results_to_eqv_metrics('deployment', 
-                                                                prometheus.custom_query(replica_count_query), 
-                                                                equivalent_services)
+    current_replica_count = select_revisions(results.get('replicas'), equivalent_services)
                                                          
     print(f"Current replica for {service_name}: ", current_replica_count)
     return current_replica_count
 
 
-def monitor_current_eqv_service_throughput(service_name):
-    throughput_query = f'''sum(revision_request_count{{configuration_name="{service_name}", response_code_class="2xx"}}) 
-                            by (revision_name) / sum(revision_request_latencies_sum{{configuration_name="{service_name}", 
+def throughput_queries(service_names, window=observer_frequency):
+    """ PromQL queries for per-revision throughput, latency and concurrency of all services """
+    service_pattern = '|'.join(service_names)
+    throughput_query = f'''sum(revision_request_count{{configuration_name=~"{service_pattern}", response_code_class="2xx"}}) 
+                            by (revision_name) / sum(revision_request_latencies_sum{{configuration_name=~"{service_pattern}", 
                             response_code_class="2xx"}}) by (revision_name)'''
 
-    successful_requests_query = f'''sum(rate(revision_request_count{{configuration_name="{service_name}", 
-                                    response_code_class="2xx"}}[{observer_frequency}])) by (revision_name) * 60'''
+    successful_requests_query = f'''sum(rate(revision_request_count{{configuration_name=~"{service_pattern}", 
+                                    response_code_class="2xx"}}[{window}])) by (revision_name) * 60'''
     
-    total_requests_query = f'''sum(rate(revision_request_count{{configuration_name="{service_name}"}}
-                                [{observer_frequency}])) by (revision_name) * 60'''
+    total_requests_query = f'''sum(rate(revision_request_count{{configuration_name=~"{service_pattern}"}}
+                                [{window}])) by (revision_name) * 60'''
     
-    request_latencies_query = f'''(sum(rate(revision_request_latencies_sum{{configuration_name="{service_name}", 
-                                    response_code_class="2xx"}}[{observer_frequency}])) by (revision_name) / 1000) * 60'''
+    request_latencies_query = f'''(sum(rate(revision_request_latencies_sum{{configuration_name=~"{service_pattern}", 
+                                    response_code_class="2xx"}}[{window}])) by (revision_name) / 1000) * 60'''
     # added activator latencies query
-    activator_latencies_query = f'''(sum(rate(activator_request_latencies_sum{{configuration_name="{service_name}", 
-                                    response_code_class="2xx"}}[{observer_frequency}])) by (revision_name) / 1000) * 60'''
+    activator_latencies_query = f'''(sum(rate(activator_request_latencies_sum{{configuration_name=~"{service_pattern}", 
+                                    response_code_class="2xx"}}[{window}])) by (revision_name) / 1000) * 60'''
     
     # queue depth
-    # queue_depth_query = f'''sum(revision_queue_depth{{configuration_name="{service_name}"}}) by (revision_name)'''
+    # queue_depth_query = f'''sum(revision_queue_depth{{configuration_name=~"{service_pattern}"}}) by (revision_name)'''
 
-    activator_concurrency_query = f'''sum(activator_request_concurrency{{configuration_name="{service_name}"}}) by (revision_name)'''
-    autoscaler_concurrency_per_pod_query = f'''sum(autoscaler_target_concurrency_per_pod{{configuration_name="{service_name}"}}) by (revision_name)'''
+    activator_concurrency_query = f'''sum(activator_request_concurrency{{configuration_name=~"{service_pattern}"}}) by (revision_name)'''
+    autoscaler_concurrency_per_pod_query = f'''sum(autoscaler_target_concurrency_per_pod{{configuration_name=~"{service_pattern}"}}) by (revision_name)'''
+
+    return {
+        'throughput': throughput_query,
+        'successful_requests': successful_requests_query,
+        'total_requests': total_requests_query,
+        'request_latencies': request_latencies_query,
+        'activator_latencies': activator_latencies_query,
+        # 'queue_depth': queue_depth_query,
+        'activator_concurrency': activator_concurrency_query,
+        'autoscaler_concurrency_per_pod': autoscaler_concurrency_per_pod_query,
+    }
 
-    current_throughput = parse_promql_results_to_eqv_metrics('revision_name', 
-                                                            prometheus.custom_query(throughput_query), 
-                                                            equivalent_services)
 
-    current_successful_requests = parse_promql_results_to_eqv_metrics('revision_name',
-                                                                    prometheus.custom_query(successful_requests_query), 
-                                                                    equivalent_services)
+def monitor_current_eqv_service_throughput(service_name, equivalent_services, results):
+    current_throughput = select_revisions(results['throughput'], equivalent_services)
 
-    current_total_requests = parse_promql_results_to_eqv_metrics('revision_name',
-                                                                prometheus.custom_query(total_requests_query), 
-                                                                equivalent_services)
+    current_successful_requests = select_revisions(results['successful_requests'], equivalent_services)
 
-    current_request_latencies = parse_promql_results_to_eqv_metrics('revision_name', 
-                                                                    prometheus.custom_query(request_latencies_query), 
-                                                                    equivalent_services)
+    current_total_requests = select_revisions(results['total_requests'], equivalent_services)
+
+    current_request_latencies = select_revisions(results['request_latencies'], equivalent_services)
 
     # get activator latencies (accounts the cold-start)
-    current_activator_latencies = parse_promql_results_to_eqv_metrics('revision_name', 
-                                                                    prometheus.custom_query(activator_latencies_query), 
-                                                                    equivalent_services)
+    current_activator_latencies = select_revisions(results['activator_latencies'], equivalent_services)
     # get queue depth
-    # current_queue_length = parse_promql_results_to_eqv_metrics('revision_name', 
-    #                                                             prometheus.custom_query(queue_depth_query), 
-    #                                                             equivalent_services)
+    # current_queue_length = select_revisions(results['queue_depth'], equivalent_services)
 
-    current_concurrent_request = parse_promql_results_to_eqv_metrics('revision_name', 
-                                                                prometheus.custom_query(activator_concurrency_query), 
-                                                                equivalent_services)
+    current_concurrent_request = select_revisions(results['activator_concurrency'], equivalent_services)
 
-    target_concurrency_per_pod = parse_promql_results_to_eqv_metrics('revision_name', 
-                                                                prometheus.custom_query(autoscaler_concurrency_per_pod_query), 
-                                                                equivalent_services)
+    target_concurrency_per_pod = select_revisions(results['autoscaler_concurrency_per_pod'], equivalent_services)
 
     print(f"Current throughput for {service_name}: ", current_throughput)
     
@@ -274,201 +395,398 @@ def monitor_current_eqv_service_throughput(service_name):
 
     return throughput_related_metrics
 
-HOME_DIR = os.environ.get("HOME")
-args = parse_args()
-manager_ip = str(args.manager_node_ip).strip()
-concurrency_setting = int(str(args.c).strip())
 
-while True:
-    try:
-        all_services = get_services_and_revisions()
-        mode = 'stable'
+def windowed_queries(service_names, decision_window):
+    # request-rate families for the windows other than the decision window, named '{family}@{window}'
+    queries = {}
+    for window in observer_windows:
+        if window == decision_window:
+            continue
+        for name, query in throughput_queries(service_names, window).items():
+            if name in windowed_families:
+                queries[f'{name}@{window}'] = query
+    return queries
 
-        for service in all_services:
-            # run in parallel
-            master_instance = f'{manager_ip}:9100'  # master node IP
-            service_name = service['service_name']
-            equivalent_services = []
 
-            for revision in service['revisions']:
-                equivalent_services.extend(revision.keys())
-            print(equivalent_services)
-            
-            eqv_services_current_replicas = monitor_current_eqv_service_replicas(service_name, equivalent_services)
-            print("Replica: ", eqv_services_current_replicas)
+def monitor_rate_windows(equivalent_services, replicas, results, decision_window):
+    """ Per-replica request rate and normalized throughput of each revision for every observed window """
+    windows = {}
+    for window in observer_windows:
+        suffix = '' if window == decision_window else f'@{window}'
+        requests = select_revisions(results.get(f'successful_requests{suffix}'), equivalent_services) or {}
+        latencies = select_revisions(results.get(f'request_latencies{suffix}'), equivalent_services) or {}
+        activator_latencies = select_revisions(results.get(f'activator_latencies{suffix}'), equivalent_services) or {}
+
+        for equivalent_service in equivalent_services:
+            replica_count = replicas.get(equivalent_service) or 0
+            if replica_count == 0:
+                continue
+            latency = latencies.get(equivalent_service, 0) + activator_latencies.get(equivalent_service, 0)
+            normalized_throughput = requests.get(equivalent_service, 0) / latency if latency > 0 else 0
+            windows.setdefault(equivalent_service, {})[window] = {
+                'successful_requests': requests.get(equivalent_service, 0) / replica_count,
+                'normalized_throughput': normalized_throughput / replica_count}
+    return windows
+
+
+def trigger_optimization(service_name, panic):
+    # optimize traffic distribution (picked up by the resident optimizer_worker.py)
+    print("---------------Trigerring Optimizer and Traffic Recomputations---------------")
+    time_budget = panic_optimizer_budget if panic else stable_optimizer_budget
+    if args.joint:
+        # one decision for every service so they do not claim the same free capacity
+        enqueue_optimization(redis_conn, JOINT_JOB, time_budget=time_budget,
+                             services=[s['service_name'] for s in get_services_and_revisions()])
+    else:
+        enqueue_optimization(redis_conn, service_name, time_budget=time_budget)
+
+
+def observe_service(service_name, equivalent_services, results, cluster_level_availability, decision_window):
+    """
+    One observation of a service from its fetched query results: stores its metrics snapshot, appends its
+    revisions' series and publishes its metric event. Returns True when the service is in panic mode.
+    """
+    # Redis state of the service in one round trip; writes are queued on `pipe` and sent together
+    state = db_client.retrieve_cached(redis_conn, [service_name, f'{service_name}_requests'])
+    pipe = db_client.pipeline(redis_conn)
+    service_in_panic = False
+
+    eqv_services_current_replicas = monitor_current_eqv_service_replicas(service_name, equivalent_services, results)
+    print("Replica: ", eqv_services_current_replicas)
+    
+    if list(eqv_services_current_replicas.values()) != [0] * len(eqv_services_current_replicas.keys()):
+        pod_level_eqv_service_metrics = monitor_pod_level_resource_utilization(service_name, equivalent_services, results)
+        print("Pod-level Eqv Services Resource Metrics", ":", pod_level_eqv_service_metrics)
+        
+        service_level_gpu_metrics = monitor_additional_accelerator_resources(service_name, equivalent_services, results)
+        print(f"GPU metrics for {service_name}: ", service_level_gpu_metrics)
+        
+        cluster_level_resource_availability_metrics = dict(cluster_level_availability)
+        cluster_level_resource_availability_metrics['gpu'] = service_level_gpu_metrics['available_gpu_resource']['gpu']
+        # cluster_level_resource_availability_metrics['gpu_mem'] = service_level_gpu_metrics['available_gpu_resource']['gpu_mem']
+        print("Cluster-level resource metrics: ", cluster_level_resource_availability_metrics)
+        
+        throughput_metrics = monitor_current_eqv_service_throughput(service_name, equivalent_services, results)
+        # if list(eqv_services_current_replicas.values()) != [0] * len(eqv_services_current_replicas.keys()):
+        print("------ Throughput Metrics----------", throughput_metrics, pod_level_eqv_service_metrics)
+        if None not in throughput_metrics.values() and None not in pod_level_eqv_service_metrics.values():
+            eqv_service_throughput = throughput_metrics['current_throughput']
+            eqv_service_requests = throughput_metrics['current_successful_requests']
+            eqv_service_total_requests = throughput_metrics['current_total_requests']
+            eqv_service_latencies = throughput_metrics['current_request_latencies']
+            eqv_service_activator_latencies = throughput_metrics['current_activator_latencies']
+            # eqv_service_queue_length = throughput_metrics['current_queue_length']
+            eqv_service_concurrent_requests = throughput_metrics['current_concurrent_request']
+            eqv_service_target_concurrency_per_pod = throughput_metrics['target_concurrency_per_pod']
+            print("Eqv services throughput: ", eqv_service_throughput, 
+                    eqv_service_requests, eqv_service_total_requests, 
+                    eqv_service_latencies, eqv_service_activator_latencies,
+                    # eqv_service_queue_length, 
+                    eqv_service_concurrent_requests, eqv_service_target_concurrency_per_pod)
             
-            if list(eqv_services_current_replicas.values()) != [0] * len(eqv_services_current_replicas.keys()):
-                pod_level_eqv_service_metrics = monitor_pod_level_resource_utilization(service_name, equivalent_services)
-                print("Pod-level Eqv Services Resource Metrics", ":", pod_level_eqv_service_metrics)
+            db_client.queue_json_data(pipe, "available_cluster_resources", 
+                                      cluster_level_resource_availability_metrics)
+            eqv_service_metrics = {}
+            throughput_now = 0
+            service_history = state[service_name]
+
+            current_requests = state[f'{service_name}_requests']
+            if current_requests is not None:
+                prev_requests = current_requests.copy()
+            else:
+                prev_requests = {'total': 0}
+
+            if not service_history:
+                service_history = dict()
+
+            # drop revisions that no longer exist in the cluster (scaled-to-zero ones are kept)
+            cache = get_cluster_cache()
+            if cache:
+                existing_revisions = {revision['metadata']['name'] for revision in cache.service_revisions(service_name)}
+                service_history = {revision: metrics for revision, metrics in service_history.items()
+                                   if revision in existing_revisions}
+
+            if not current_requests:
+                current_requests = {'total': 0}
+
+            rate_windows = monitor_rate_windows(equivalent_services, eqv_services_current_replicas,
+                                                results, decision_window)
+            total_concurrent_requests = 0
+            for equivalent_service in equivalent_services:
+                eq_replica_count = eqv_services_current_replicas[equivalent_service]
                 
-                service_level_gpu_metrics = monitor_additional_accelerator_resources(service_name, equivalent_services)
-                print(f"GPU metrics for {service_name}: ", service_level_gpu_metrics)
+                if eq_replica_count == 0:
+                    continue
                 
-                eqv_services_current_replicas = monitor_current_eqv_service_replicas(service_name, equivalent_services)
-                print("Replica: ", eqv_services_current_replicas)
+                eq_target_concurrency_per_pod = eqv_service_target_concurrency_per_pod[equivalent_service]
+
+                try:
+                    eq_success_rate = eqv_service_requests[equivalent_service] / eqv_service_total_requests[equivalent_service]
+                except ZeroDivisionError:
+                    eq_success_rate = 0
+                # eq_queue_length = eqv_service_queue_length[equivalent_service]
+                # if eq_queue_length == 0 or eq_queue_length == 0.0:
+                    # eq_queue_length = 1
                 
-                cluster_level_resource_availability_metrics = monitor_cluster_level_resource_availability(master_instance)
-                cluster_level_resource_availability_metrics['gpu'] = service_level_gpu_metrics['available_gpu_resource']['gpu']
-                # cluster_level_resource_availability_metrics['gpu_mem'] = service_level_gpu_metrics['available_gpu_resource']['gpu_mem']
-                print("Cluster-level resource metrics: ", cluster_level_resource_availability_metrics)
+                eq_concurrency = eqv_service_concurrent_requests[equivalent_service]
+                if eq_concurrency == 0 or eq_concurrency == 0.0:
+                    eq_concurrency = 1
+
+                try:
+                    eq_normalized_throughput = (eqv_service_requests[equivalent_service] / 
+                                            (eqv_service_latencies[equivalent_service] + 
+                                            eqv_service_activator_latencies[equivalent_service]))
+                    # eq_normalized_throughput /= eq_concurrency
+                    # eq_normalized_throughput /= eq_queue_length
+                    # eq_normalized_throughput /= (eq_concurrency/(eq_replica_count*49))
+                    # eq_normalized_throughput *= eq_success_rate
+                except ZeroDivisionError:
+                    eq_normalized_throughput = 0
                 
-                throughput_metrics = monitor_current_eqv_service_throughput(service_name)
-                # if list(eqv_services_current_replicas.values()) != [0] * len(eqv_services_current_replicas.keys()):
-                print("------ Throughput Metrics----------", throughput_metrics, pod_level_eqv_service_metrics)
-                if None not in throughput_metrics.values() and None not in pod_level_eqv_service_metrics.values():
-                    eqv_service_throughput = throughput_metrics['current_throughput']
-                    eqv_service_requests = throughput_metrics['current_successful_requests']
-                    eqv_service_total_requests = throughput_metrics['current_total_requests']
-                    eqv_service_latencies = throughput_metrics['current_request_latencies']
-                    eqv_service_activator_latencies = throughput_metrics['current_activator_latencies']
-                    # eqv_service_queue_length = throughput_metrics['current_queue_length']
-                    eqv_service_concurrent_requests = throughput_metrics['current_concurrent_request']
-                    eqv_service_target_concurrency_per_pod = throughput_metrics['target_concurrency_per_pod']
-                    print("Eqv services throughput: ", eqv_service_throughput, 
-                            eqv_service_requests, eqv_service_total_requests, 
-                            eqv_service_latencies, eqv_service_activator_latencies,
-                            # eqv_service_queue_length, 
-                            eqv_service_concurrent_requests, eqv_service_target_concurrency_per_pod)
-                    
-                    db_client.store_json_data(redis_conn, "available_cluster_resources", 
-                                            cluster_level_resource_availability_metrics)
-                    eqv_service_metrics = {}
-                    throughput_now = 0
-                    service_history = db_client.retrieve_json_data(redis_conn, service_name)
-
-                    current_requests = db_client.retrieve_json_data(redis_conn, f'{service_name}_requests')
-                    if current_requests is not None:
-                        prev_requests = current_requests.copy()
-                    else:
-                        prev_requests = {'total': 0}
-
-                    if not service_history:
-                        service_history = dict()
-
-                    if not current_requests:
-                        current_requests = {'total': 0}
-
-                    total_concurrent_requests = 0
-                    for equivalent_service in equivalent_services:
-                        eq_replica_count = eqv_services_current_replicas[equivalent_service]
-                        
-                        if eq_replica_count == 0:
-                            continue
-                        
-                        eq_target_concurrency_per_pod = eqv_service_target_concurrency_per_pod[equivalent_service]
-
-                        try:
-                            eq_success_rate = eqv_service_requests[equivalent_service] / eqv_service_total_requests[equivalent_service]
-                        except ZeroDivisionError:
-                            eq_success_rate = 0
-                        # eq_queue_length = eqv_service_queue_length[equivalent_service]
-                        # if eq_queue_length == 0 or eq_queue_length == 0.0:
-                            # eq_queue_length = 1
-                        
-                        eq_concurrency = eqv_service_concurrent_requests[equivalent_service]
-                        if eq_concurrency == 0 or eq_concurrency == 0.0:
-                            eq_concurrency = 1
-
-                        try:
-                            eq_normalized_throughput = (eqv_service_requests[equivalent_service] / 
-                                                    (eqv_service_latencies[equivalent_service] + 
-                                                    eqv_service_activator_latencies[equivalent_service]))
-                            # eq_normalized_throughput /= eq_concurrency
-                            # eq_normalized_throughput /= eq_queue_length
-                            # eq_normalized_throughput /= (eq_concurrency/(eq_replica_count*49))
-                            # eq_normalized_throughput *= eq_success_rate
-                        except ZeroDivisionError:
-                            eq_normalized_throughput = 0
-                        
-                        try:
-                            eq_latency_per_request = ((eqv_service_latencies[equivalent_service] + 
-                                                    eqv_service_activator_latencies[equivalent_service])/
-                                                    eqv_service_requests[equivalent_service])
-                        except ZeroDivisionError:
-                            eq_latency_per_request = 0
-                        
-                        # requests_in_flight = eqv_service_total_requests[equivalent_service] + eqv_service_queue_length[equivalent_service]
-                        requests_in_flight = eqv_service_concurrent_requests[equivalent_service]
-                        current_requests[equivalent_service] = requests_in_flight
-                        # current_requests['total'] += requests_in_flight
-                        total_concurrent_requests += requests_in_flight
-                        
-                        # not updating the cache if throughput is reported zero
-                        if eq_normalized_throughput <= 0:
-                            continue
-                        
-                        eq_normalized_throughput = max(eq_normalized_throughput, 0.00000000000001)/eq_replica_count
-                        eq_throughput = max(eqv_service_throughput[equivalent_service], 0.00000000000001)/eq_replica_count
-                        eq_successful_requests = eqv_service_requests[equivalent_service]/eq_replica_count
-                        eq_latency = (eqv_service_latencies[equivalent_service] + eqv_service_activator_latencies[equivalent_service])/eq_replica_count
-                        eq_latency_per_request_replica = max(eq_latency_per_request, 0.001)/eq_replica_count
-                        eq_queued_requests = eqv_service_concurrent_requests[equivalent_service]
-                        
-                        eqv_service_metrics[equivalent_service] = {'throughput': eq_throughput,
-                                                    'normalized_throughput': eq_normalized_throughput,
-                                                    'successful_requests': eq_successful_requests,
-                                                    'latency': eq_latency,
-                                                    'latency_per_request': eq_latency_per_request_replica,
-                                                    'queued_requests': eq_queued_requests,
-                                                    'target_concurrency_per_pod': eq_target_concurrency_per_pod,
-                                                    'cpu': pod_level_eqv_service_metrics['cpu_usage'][equivalent_service]/eq_replica_count,
-                                                    'memory': pod_level_eqv_service_metrics['memory_usage'][equivalent_service]/eq_replica_count,
-                                                    'disk_read': pod_level_eqv_service_metrics['disk_read'][equivalent_service]/eq_replica_count,
-                                                    'disk_write': pod_level_eqv_service_metrics['disk_write'][equivalent_service]/eq_replica_count,
-                                                    'network_downlink': pod_level_eqv_service_metrics['network_downlink'][equivalent_service]/eq_replica_count,
-                                                    'network_uplink': pod_level_eqv_service_metrics['network_uplink'][equivalent_service]/eq_replica_count,
-                                                    'gpu': service_level_gpu_metrics[equivalent_service]['gpu_util']/eq_replica_count,
-                                                    # 'gpu_mem': service_level_gpu_metrics[equivalent_service]['gpu_mem'],
-                                                    'current_replica': eq_replica_count}
-                        
-                        service_history[equivalent_service] = eqv_service_metrics[equivalent_service]
-                        # throughput_now += eq_throughput
-                        throughput_now += eq_normalized_throughput
-
-                    # eqv_service_metrics['throughput_now'] = throughput_now    ##### check if required later ########
-                    current_requests['total'] = total_concurrent_requests
-                    print("Current State: ", eqv_service_metrics)
-
-                    db_client.store_json_data(redis_conn, service_name, service_history)
-                    db_client.store_json_data(redis_conn, f'{service_name}_requests', current_requests)
-                    throughput_prev = redis_conn.get(f"{service_name}_throughput_prev")
-                    # print("thr..", throughput_now, throughput_prev)
-                    
-                    if not throughput_prev:
-                        throughput_prev = float(throughput_now)
-                    else:
-                        throughput_prev = float(throughput_prev)
-                    
-                    # if throughput_now > throughput_prev:
-                    redis_conn.set(f"{service_name}_throughput_prev", throughput_now)
-
-                    # add timer trigger
-                    print(f"Prev Perf: {throughput_now}; Current Perf: {throughput_prev}")
-                    #if throughput_now < throughput_prev:
-                    EPS = 1e-9
-                    if throughput_prev > EPS and throughput_now <= throughput_prev * 0.95:
-                        # optimize traffic distribution
-                        running_service_optimizers = db_client.retrieve_json_data(redis_conn, f"{service_name}_optimizer_process")
-                        if not running_service_optimizers:
-                            running_service_optimizers = []
-                        print("---------------Trigerring Optimizer and Traffic Recomputations---------------")
-                        process = subprocess.Popen([f'{HOME_DIR}/swenv/bin/python', f'{HOME_DIR}/ScaleWave/implementation/components/optimizer.py', service_name])
-                        # Set the PID of the process
-                        running_service_optimizers.append(process.pid)
-                        
-                        # store to cache
-                        db_client.store_json_data(redis_conn, f"{service_name}_optimizer_process", running_service_optimizers)
-                        time.sleep(4)
-                    
-                    if current_requests['total'] >= 1.5*prev_requests['total']:
-                        mode = 'panic'
-        
-        if mode == 'panic':
-            time.sleep(panic_timer)
-        else:
-            time.sleep(stable_timer)
-    except Exception:
-        continue
+                try:
+                    eq_latency_per_request = ((eqv_service_latencies[equivalent_service] + 
+                                            eqv_service_activator_latencies[equivalent_service])/
+                                            eqv_service_requests[equivalent_service])
+                except ZeroDivisionError:
+                    eq_latency_per_request = 0
+                
+                # requests_in_flight = eqv_service_total_requests[equivalent_service] + eqv_service_queue_length[equivalent_service]
+                requests_in_flight = eqv_service_concurrent_requests[equivalent_service]
+                current_requests[equivalent_service] = requests_in_flight
+                # current_requests['total'] += requests_in_flight
+                total_concurrent_requests += requests_in_flight
+                
+                # not updating the cache if throughput is reported zero
+                if eq_normalized_throughput <= 0:
+                    continue
+                
+                eq_normalized_throughput = max(eq_normalized_throughput, 0.00000000000001)/eq_replica_count
+                eq_throughput = max(eqv_service_throughput[equivalent_service], 0.00000000000001)/eq_replica_count
+                eq_successful_requests = eqv_service_requests[equivalent_service]/eq_replica_count
+                eq_latency = (eqv_service_latencies[equivalent_service] + eqv_service_activator_latencies[equivalent_service])/eq_replica_count
+                eq_latency_per_request_replica = max(eq_latency_per_request, 0.001)/eq_replica_count
+                eq_queued_requests = eqv_service_concurrent_requests[equivalent_service]
+                
+                eqv_service_metrics[equivalent_service] = {'throughput': eq_throughput,
+                                            'normalized_throughput': eq_normalized_throughput,
+                                            'successful_requests': eq_successful_requests,
+                                            'latency': eq_latency,
+                                            'latency_per_request': eq_latency_per_request_replica,
+                                            'queued_requests': eq_queued_requests,
+                                            'target_concurrency_per_pod': eq_target_concurrency_per_pod,
+                                            'cpu': pod_level_eqv_service_metrics['cpu_usage'][equivalent_service]/eq_replica_count,
+                                            'memory': pod_level_eqv_service_metrics['memory_usage'][equivalent_service]/eq_replica_count,
+                                            'disk_read': pod_level_eqv_service_metrics['disk_read'][equivalent_service]/eq_replica_count,
+                                            'disk_write': pod_level_eqv_service_metrics['disk_write'][equivalent_service]/eq_replica_count,
+                                            'network_downlink': pod_level_eqv_service_metrics['network_downlink'][equivalent_service]/eq_replica_count,
+                                            'network_uplink': pod_level_eqv_service_metrics['network_uplink'][equivalent_service]/eq_replica_count,
+                                            'gpu': service_level_gpu_metrics[equivalent_service]['gpu_util']/eq_replica_count,
+                                            # 'gpu_mem': service_level_gpu_metrics[equivalent_service]['gpu_mem'],
+                                            'current_replica': eq_replica_count,
+                                            # same signals over every rate window, to tell blips from shifts
+                                            'window': decision_window,
+                                            'windows': rate_windows.get(equivalent_service, {})}
+                
+                service_history[equivalent_service] = eqv_service_metrics[equivalent_service]
+                # throughput_now += eq_throughput
+                throughput_now += eq_normalized_throughput
+
+            # eqv_service_metrics['throughput_now'] = throughput_now    ##### check if required later ########
+            current_requests['total'] = total_concurrent_requests
+            print("Current State: ", eqv_service_metrics)
+
+            db_client.queue_json_data(pipe, service_name, service_history)
+            # rolling per-revision history (see timeseries.py)
+            sampled_at = time.time()
+            append_samples(redis_conn, eqv_service_metrics, timestamp=sampled_at, pipe=pipe)
+            db_client.queue_json_data(pipe, f'{service_name}_requests', current_requests)
+
+            service_in_panic = (current_requests['total'] >= 1.5*prev_requests['total'] and
+                                current_requests['total'] - prev_requests['total'] >= panic_min_increase)
+            # the trigger engine decides on it; published after the snapshot writes queued above
+            event = {'service': service_name, 'throughput': throughput_now,
+                     'concurrent_requests': current_requests['total'], 'panic': service_in_panic,
+                     'timestamp': sampled_at,
+                     'revisions': {revision: {field: metrics[field] for field in TS_FIELDS if field in metrics}
+                                   for revision, metrics in eqv_service_metrics.items()}}
+            print("Metric event: ", event)
+            queue_metric_event(pipe, event)
+
+    db_client.execute_pipeline(pipe)
+    return service_in_panic
+
+
+def plan_queries(service_names, revisions, decision_window):
+    """ PromQL queries of the due services' observations, demultiplexed per revision by family_components """
+    queries = replica_queries(service_names)
+    queries.update(pod_level_queries(service_names, decision_window))
+    queries.update(accelerator_queries(revisions, decision_window))
+    queries.update(throughput_queries(service_names, decision_window))
+    queries.update(windowed_queries(service_names, decision_window))
+    return queries
+
+
+async def execute_due_plan(decision_window):
+    """ Fetches the results of every service that came due within one tick, in one plan for all of them """
+    await asyncio.sleep(batch_tick)
+    due = pending_plans.pop(decision_window)
+    try:
+        revisions = [revision for equivalent_services, _ in due.values() for revision in equivalent_services]
+        queries = plan_queries(list(due), revisions, decision_window)
+        components = {name: family_components[name.split('@')[0]] for name in queries
+                      if name.split('@')[0] in family_components}
+        fast_results = fast_path.results(revisions, queries, decision_window) if fast_path else {}
+        queries = {name: query for name, query in queries.items() if name not in fast_results}
+        results = await execute_plan_async(prometheus, queries, components, PrefixIndex(revisions))
+        results.update(fast_results)
+        print(f"Observed {len(due)} services ({decision_window}) with {len(queries)} PromQL queries")
+        for _, future in due.values():
+            if not future.done():
+                future.set_result(results)
+    except Exception as e:
+        for _, future in due.values():
+            if not future.done():
+                future.set_exception(e)
+
+
+async def fetch_service_results(service_name, equivalent_services, decision_window):
+    # joins the plan of the services due in the current tick, and starts one if this service is the first
+    if decision_window not in pending_plans:
+        pending_plans[decision_window] = {}
+        asyncio.create_task(execute_due_plan(decision_window))
+    future = asyncio.get_running_loop().create_future()
+    pending_plans[decision_window][service_name] = (equivalent_services, future)
+    return await future
+
+
+def jittered(interval):
+    return interval * random.uniform(1 - interval_jitter, 1 + interval_jitter)
+
+
+async def cluster_loop(master_instance, cluster_ready):
+    """ Keeps cluster_state['availability'] fresh at the cadence of the most urgent service """
+    while True:
+        urgent = 'panic' in service_modes.values()
+        try:
+            window = panic_window if urgent else stable_window
+            results, state = await asyncio.gather(
+                fetch_queries_async(prometheus, cluster_level_queries(master_instance, window)),
+                asyncio.to_thread(db_client.retrieve_cached, redis_conn, ['max_resource_benchmarks']))
+            availability = monitor_cluster_level_resource_availability(results, state['max_resource_benchmarks'])
+            # on failed queries the services keep using the previous availability
+            if availability is not None:
+                cluster_state['availability'] = availability
+                cluster_ready.set()
+        except Exception as e:
+            print(f"Cluster-level observation failed: {e}")
+        await asyncio.sleep(jittered(panic_timer if urgent else stable_timer))
+
+
+async def service_loop(service_name, cluster_ready):
+    """
+    Observation loop of one service on its own panic/stable cadence; its queries go out in one plan with
+    those of the other services that come due in the same tick
+    """
+    await cluster_ready.wait()
+    # spread the first observations of the services over one stable interval
+    await asyncio.sleep(random.uniform(0, stable_timer * interval_jitter))
+    while True:
+        started = time.monotonic()
+        mode = service_modes.get(service_name, 'stable')
+        try:
+            # the previous observation's mode picks the rate window the decisions of this one are based on
+            decision_window = panic_window if mode == 'panic' else stable_window
+            equivalent_services = service_revisions[service_name]
+            print(equivalent_services)
+
+            results = await fetch_service_results(service_name, equivalent_services, decision_window)
+            service_in_panic = await asyncio.to_thread(observe_service, service_name, equivalent_services, results,
+                                                       cluster_state['availability'], decision_window)
+            mode = 'panic' if service_in_panic else 'stable'
+            service_modes[service_name] = mode
+            OBSERVATION_CYCLE_SECONDS.observe(time.monotonic() - started)
+        except Exception as e:
+            print(f"Observation of {service_name} failed: {e}")
+        await asyncio.sleep(jittered(panic_timer if mode == 'panic' else stable_timer))
+
+
+def reconcile_service_tasks(cluster_ready):
+    # one task per observed service: every service, or in sharded mode the ones this instance holds a lease for
+    wanted = set(service_revisions) if membership is None else membership.owned & set(service_revisions)
+    for service_name in wanted - set(service_tasks):
+        service_tasks[service_name] = asyncio.create_task(service_loop(service_name, cluster_ready))
+    for service_name in set(service_tasks) - wanted:
+        service_tasks.pop(service_name).cancel()
+        service_modes.pop(service_name, None)
+
+
+async def shard_loop(cluster_ready):
+    """ Lease heartbeats of a sharded observer; services move between instances as instances come and go """
+    while True:
+        try:
+            previous = set(membership.owned)
+            owned = await asyncio.to_thread(membership.heartbeat, list(service_revisions))
+            if owned != previous:
+                print(f"Observer {membership.member_id} observes: {sorted(owned)}")
+            reconcile_service_tasks(cluster_ready)
+        except Exception as e:
+            print(f"Shard heartbeat failed: {e}")
+        await asyncio.sleep(HEARTBEAT_INTERVAL)
+
+
+async def observe(master_instance):
+    """ Runs a service_loop per observed Knative service, started and cancelled as services come and go """
+    cluster_ready = asyncio.Event()
+    asyncio.create_task(cluster_loop(master_instance, cluster_ready))
+    if membership is not None:
+        asyncio.create_task(shard_loop(cluster_ready))
+    last_stale_eviction = 0
+    try:
+        while True:
+            try:
+                all_services = await asyncio.to_thread(get_services_and_revisions)
+                if all_services is not None:
+                    current = {service['service_name']: [name for revision in service['revisions'] for name in revision]
+                               for service in all_services}
+                    for service_name in set(service_revisions) - set(current):
+                        service_revisions.pop(service_name)
+                    service_revisions.update(current)
+                    reconcile_service_tasks(cluster_ready)
+
+                if time.time() - last_stale_eviction >= stale_eviction_interval:
+                    await asyncio.to_thread(evict_stale, redis_conn)
+                    last_stale_eviction = time.time()
+                print(f"Redis round trips in the last {discovery_interval}s: ", db_client.take_round_trips())
+                print("Redis read cache: ", db_client.cache_stats())
+            except Exception as e:
+                print(f"Service discovery failed: {e}")
+            await asyncio.sleep(discovery_interval)
+    finally:
+        if membership is not None:
+            membership.leave()
+
+
+args = parse_args()
+manager_ip = str(args.manager_node_ip).strip()
+concurrency_setting = int(str(args.c).strip())
+start_metrics_server(args.metrics_port)
+if args.shard:
+    membership = ShardMembership(redis_conn)
+if args.fast_path:
+    fast_path = FastPathScraper().start()
+
+# decisions are taken off the observation loop, from the metric events it publishes (a sharded observer
+# only decides for the services it observes)
+accept = membership.owns if membership is not None else None
+if args.trigger == 'cusum':
+    TriggerEngine(redis_conn, trigger_optimization, min_interval=args.min_interval, joint=args.joint, accept=accept,
+                  trigger_factory=lambda: ChangePointTrigger(redis_conn, threshold=args.cusum_threshold)).start()
+else:
+    TriggerEngine(redis_conn, trigger_optimization, min_interval=args.min_interval, joint=args.joint, accept=accept,
+                  debounce_samples=args.debounce).start()
+
+master_instance = f'{manager_ip}:9100'  # master node IP
+asyncio.run(observe(master_instance))
 
 # while True:
 #     try:
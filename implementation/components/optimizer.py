@@ -1,45 +1,17 @@
 # imports
-import json
 import math
-import random
 import sys
 import time
-import os
-import signal
-import subprocess
 
-from utils import check_pod_status, get_node_ready_status
-
-# Check if at least one argument is provided (first argument is the script name itself)
-if len(sys.argv) > 1:
-    service_name = sys.argv[1]
-else:
-    sys.exit()
-
-time.sleep(1.5)
+import requests
 
 import db_client
-# Connect to Redis
-redis_conn = db_client.connect_to_redis()
-
-current_pid = None
-running_service_optimizers = db_client.retrieve_json_data(redis_conn, f"{service_name}_optimizer_process")
-
-if running_service_optimizers is None:
-    running_service_optimizers = []
-else:
-    try:
-        current_pid = running_service_optimizers[-1]
-        for pid in running_service_optimizers[:-1]:
-            try:
-                os.kill(int(pid), signal.SIGTERM)  # Send the SIGTERM signal
-                running_service_optimizers.remove(pid)
-            except OSError as e:
-                pass
-    except Exception as e:
-        print('Exception: ', e)
-
-db_client.store_json_data(redis_conn, f"{service_name}_optimizer_process", running_service_optimizers)
+from cluster_cache import get_cluster_cache
+from decision_cache import fingerprint_problem, lookup_decision, store_decision
+from instrumentation import OPTIMIZER_PHASE_SECONDS, TRIGGER_TO_TRAFFIC_SECONDS
+from k8s_client import get_cluster_client, service_traffic
+from solvers import DEFAULT_STRATEGY, get_solver, select_strategy
+from utils import check_pod_status, get_node_ready_status
 
 # Example services: [throughput, {resource_consumption}, max_count]
 # services = [
@@ -51,30 +23,51 @@ db_client.store_json_data(redis_conn, f"{service_name}_optimizer_process", runni
 # Total resource capacities
 # capacities = {'cpu': 50, 'memory': 100, 'network': 30}
 
-# init.
-service_index = []
-services = []
-services_traffic_dist_factor = {}
-services_index_mapping = {}
-capacities = db_client.retrieve_json_data(redis_conn, "available_cluster_resources")
-# print(capacities)
-service_metrics = db_client.retrieve_json_data(redis_conn, f'{service_name}')
-concurrent_requests = db_client.retrieve_json_data(redis_conn, f"{service_name}_requests")
-# max_rep_bound = math.ceil((concurrent_requests['total'] / 49) + 1)
-total_replica_count_now = 0
-target_concurrency_per_pod = 0
-
-i = 0
-for k, v in service_metrics.items():
-    service_index.append(k)
-    services_index_mapping[k] = i
+
+def load_service_problem(redis_conn, service_name):
+    """ Reads the latest metrics snapshot of a service from Redis and builds the optimizer inputs """
+    # init.
+    service_index = []
+    services = []
+    services_traffic_dist_factor = {}
+    services_index_mapping = {}
+    # the whole snapshot in at most one round trip (keys unchanged since the last run come from the read cache)
+    snapshot = db_client.retrieve_cached(redis_conn, ["available_cluster_resources", f'{service_name}',
+                                                      f"{service_name}_requests"])
+    capacities = snapshot["available_cluster_resources"]
+    # print(capacities)
+    service_metrics = snapshot[f'{service_name}']
+    concurrent_requests = snapshot[f"{service_name}_requests"]
+    if not capacities or not service_metrics or not concurrent_requests:
+        print(f"No metrics snapshot available for {service_name}")
+        return None
+    # max_rep_bound = math.ceil((concurrent_requests['total'] / 49) + 1)
+    total_replica_count_now = 0
+    target_concurrency_per_pod = 0
+
+    i = 0
+    for k, v in service_metrics.items():
+        service_index.append(k)
+        services_index_mapping[k] = i
+    
+        # stop selecting services that do not report any metrics (meaning the service nodes have reached its max)
+        if "face-recognition-oblique-00004" in k:
+            node_ready_status = get_node_ready_status('nano-desktop')
+            pod_status = check_pod_status("default", "face-recognition-oblique-00004")
+            print("NODE AND POD STATUS: ", node_ready_status, pod_status)
+            if node_ready_status != "True" or pod_status != "Running":
+                v['cpu'] = capacities['cpu']
+                v['memory'] = capacities['memory']
+                v['disk_read'] = capacities['disk_read']
+                v['disk_write'] = capacities['disk_write']
+                v['network_uplink'] = capacities['network_uplink']
+                v['network_downlink'] = capacities['network_downlink']
+                v['gpu'] = capacities['gpu']
+                v['normalized_throughput'] = 0.000000001    # penalizing the throughput
     
-    # stop selecting services that do not report any metrics (meaning the service nodes have reached its max)
-    if "face-recognition-oblique-00004" in k:
-        node_ready_status = get_node_ready_status('nano-desktop')
-        pod_status = check_pod_status("default", "face-recognition-oblique-00004")
-        print("NODE AND POD STATUS: ", node_ready_status, pod_status)
-        if node_ready_status != "True" or pod_status != "Running":
+        if (v['cpu'] == 0.0 and v['memory'] == 0.0 and v['disk_read'] == 0.0 and 
+            v['disk_write'] == 0.0 and v['network_uplink'] == 0.0 and 
+            v['network_downlink'] == 0.0 and v['gpu'] == 0.0):
             v['cpu'] = capacities['cpu']
             v['memory'] = capacities['memory']
             v['disk_read'] = capacities['disk_read']
@@ -83,241 +76,188 @@ for k, v in service_metrics.items():
             v['network_downlink'] = capacities['network_downlink']
             v['gpu'] = capacities['gpu']
             v['normalized_throughput'] = 0.000000001    # penalizing the throughput
+
+        cpu_usage = v['cpu']
+        mem_usage = v['memory']
+        disk_read_usage = v['disk_read']
+        disk_write_usage = v['disk_write']
+        network_uplink_usage = v['network_uplink']
+        network_downlink_usage = v['network_downlink']
+        gpu_usage = v['gpu']
+
+        if cpu_usage <= 0:
+            cpu_required = 0
+        else:
+            cpu_required = capacities['cpu']/cpu_usage
     
-    if (v['cpu'] == 0.0 and v['memory'] == 0.0 and v['disk_read'] == 0.0 and 
-        v['disk_write'] == 0.0 and v['network_uplink'] == 0.0 and 
-        v['network_downlink'] == 0.0 and v['gpu'] == 0.0):
-        v['cpu'] = capacities['cpu']
-        v['memory'] = capacities['memory']
-        v['disk_read'] = capacities['disk_read']
-        v['disk_write'] = capacities['disk_write']
-        v['network_uplink'] = capacities['network_uplink']
-        v['network_downlink'] = capacities['network_downlink']
-        v['gpu'] = capacities['gpu']
-        v['normalized_throughput'] = 0.000000001    # penalizing the throughput
-
-    cpu_usage = v['cpu']
-    mem_usage = v['memory']
-    disk_read_usage = v['disk_read']
-    disk_write_usage = v['disk_write']
-    network_uplink_usage = v['network_uplink']
-    network_downlink_usage = v['network_downlink']
-    gpu_usage = v['gpu']
-
-    if cpu_usage <= 0:
-        cpu_required = 0
-    else:
-        cpu_required = capacities['cpu']/cpu_usage
-    
-    if mem_usage <= 0:
-        mem_required = 0
-    else:
-        mem_required = capacities['memory']/mem_usage
-    
-    if disk_read_usage <= 0:
-        disk_read_required = 0
-    else:
-        disk_read_required = capacities['disk_read']/disk_read_usage
+        if mem_usage <= 0:
+            mem_required = 0
+        else:
+            mem_required = capacities['memory']/mem_usage
     
-    if disk_write_usage <= 0:
-        disk_write_required = 0
-    else:
-        disk_write_required = capacities['disk_write']/disk_write_usage
+        if disk_read_usage <= 0:
+            disk_read_required = 0
+        else:
+            disk_read_required = capacities['disk_read']/disk_read_usage
     
-    if network_uplink_usage <= 0:
-        network_uplink_required = 0
-    else:
-        network_uplink_required = capacities['network_uplink']/network_uplink_usage
+        if disk_write_usage <= 0:
+            disk_write_required = 0
+        else:
+            disk_write_required = capacities['disk_write']/disk_write_usage
     
-    if network_downlink_usage <= 0:
-        network_downlink_required = 0
-    else:
-        network_downlink_required = capacities['network_downlink']/network_downlink_usage
+        if network_uplink_usage <= 0:
+            network_uplink_required = 0
+        else:
+            network_uplink_required = capacities['network_uplink']/network_uplink_usage
     
-    if gpu_usage <= 0:
-        gpu_required = 0
-    else:
-        gpu_required = capacities['gpu']/gpu_usage
+        if network_downlink_usage <= 0:
+            network_downlink_required = 0
+        else:
+            network_downlink_required = capacities['network_downlink']/network_downlink_usage
     
-    try:
-        if 'oblique-00003' in k:
-            # v['max_count'] = round(min(cpu_required, mem_required, disk_read_required, 
-            #                         disk_write_required, network_uplink_required, 
-            #                         network_downlink_required, gpu_required))
-            v['max_count'] = math.floor(min(cpu_required, 
-                                            mem_required, 
-                                            disk_read_required, 
-                                            disk_write_required, 
-                                            network_uplink_required, 
-                                            network_downlink_required, 
-                                            gpu_required))
+        if gpu_usage <= 0:
+            gpu_required = 0
         else:
-            # v['max_count'] = round(min(cpu_required, mem_required, disk_read_required, 
-            #                         disk_write_required, network_uplink_required, 
-            #                         network_downlink_required))
-            v['max_count'] = math.floor(min(cpu_required, 
-                                            mem_required, 
-                                            disk_read_required, 
-                                            disk_write_required, 
-                                            network_uplink_required, 
-                                            network_downlink_required))
+            gpu_required = capacities['gpu']/gpu_usage
+    
+        try:
+            if 'oblique-00003' in k:
+                # v['max_count'] = round(min(cpu_required, mem_required, disk_read_required, 
+                #                         disk_write_required, network_uplink_required, 
+                #                         network_downlink_required, gpu_required))
+                v['max_count'] = math.floor(min(cpu_required, 
+                                                mem_required, 
+                                                disk_read_required, 
+                                                disk_write_required, 
+                                                network_uplink_required, 
+                                                network_downlink_required, 
+                                                gpu_required))
+            else:
+                # v['max_count'] = round(min(cpu_required, mem_required, disk_read_required, 
+                #                         disk_write_required, network_uplink_required, 
+                #                         network_downlink_required))
+                v['max_count'] = math.floor(min(cpu_required, 
+                                                mem_required, 
+                                                disk_read_required, 
+                                                disk_write_required, 
+                                                network_uplink_required, 
+                                                network_downlink_required))
         
-        if v['max_count'] <= 0:
-            v['max_count'] = 1
-        else:
-            v['max_count'] += 1
+            if v['max_count'] <= 0:
+                v['max_count'] = 1
+            else:
+                v['max_count'] += 1
     
-    except Exception as e:
-        v['max_count'] = 1
+        except Exception as e:
+            v['max_count'] = 1
     
-    services.append(v)
+        services.append(v)
 
-    try:
-        # services_traffic_dist_factor[k] = concurrent_requests[k]/(v['current_replica']*49)
-        services_traffic_dist_factor[k] = concurrent_requests[k]/(v['current_replica']*v['target_concurrency_per_pod'])
-    except ZeroDivisionError:
-        services_traffic_dist_factor[k] = 15
-    
-    total_replica_count_now += v['current_replica']
-    target_concurrency_per_pod = v['target_concurrency_per_pod']
-
-    i += 1
-
-print("SERVICE METRICS: ", services, service_index, services_traffic_dist_factor)
-
-# max_rep_bound = math.ceil((concurrent_requests['total'] / (total_replica_count_now * 49)) + 1)
-# max_rep_bound = max(math.ceil((concurrent_requests['total'] / 49) - total_replica_count_now), 1)
-max_rep_bound = max(math.ceil((concurrent_requests['total'] / target_concurrency_per_pod) - total_replica_count_now), 0) + 1
-print(total_replica_count_now, max_rep_bound)
-
-
-# Initialize population
-def initialize_population(size):
-    # return [[random.randint(0, service['max_count']) for service in services] for _ in range(size)]
-    return [[random.randint(0, min(service['max_count'], 
-            max_rep_bound)) for service in services] for _ in range(size)]
-
-# Fitness function
-def fitness(solution):
-    # total_throughput = sum(service['throughput'] * count for service, count in zip(services, solution))
-    # if concurrent_requests['total'] < 300:
-    #     total_throughput = sum(-((service['latency_per_request'] * service['queued_requests']) / count) for service, count in zip(services, solution))
-    # else:
-    #     total_throughput = sum(service['normalized_throughput'] * count for service, count in zip(services, solution))
-    total_throughput = sum(
-        service['normalized_throughput'] * count for service, count in zip(services, solution))
-    resource_usage = {res: 0 for res in capacities.keys()}
-    total_rep_count = 0
-    
-    for service, count in zip(services, solution):
-        for res in capacities.keys():
-            resource_usage[res] += service[res] * count
-        total_rep_count += count
-            
-    # Penalty for exceeding capacities
-    penalty = sum(max(0, resource_usage[res] - capacities[res]) for res in capacities.keys())
-
-    # queue_penalty = max(0, ((concurrent_requests['total'])-((total_rep_count+total_replica_count_now)*49)))
-    return total_throughput - (penalty * 100)
-    # return total_throughput - (penalty * 100) - (queue_penalty*10)  # Penalty factor to ensure staying within capacity is prioritized
-
-# Selection
-def select(population, tournament_size=4):
-    best = random.choice(population)
-    for _ in range(tournament_size - 1):
-        cont = random.choice(population)
-        if fitness(cont) > fitness(best):
-            best = cont
-    return best
-
-# Crossover
-def crossover(parent1, parent2):
-    crossover_point = random.randint(1, len(parent1) - 1)
-    child1 = parent1[:crossover_point] + parent2[crossover_point:]
-    child2 = parent2[:crossover_point] + parent1[crossover_point:]
-    return child1, child2
-
-# Mutation
-def mutate(solution, mutation_rate=0.02):
-    for i in range(len(solution)):
-        if random.random() < mutation_rate:
-            # solution[i] = random.randint(0, services[i]['max_count'])
-            solution[i] = random.randint(0, min(services[i]['max_count'], max_rep_bound))
-    return solution
-
-# Genetic Algorithm
-def genetic_algorithm(population_size=100, generations=100):
-    population = initialize_population(population_size)
-    
-    for _ in range(generations):
-        new_population = []
-        for _ in range(len(population) // 2):
-            parent1 = select(population)
-            parent2 = select(population)
-            child1, child2 = crossover(parent1, parent2)
-            new_population.append(mutate(child1))
-            new_population.append(mutate(child2))
-            
-        population = new_population + population  # Combine new population with previous to maintain diversity
-        population = sorted(population, key=lambda x: fitness(x), reverse=True)[:population_size]  # Keep best
+        try:
+            # services_traffic_dist_factor[k] = concurrent_requests[k]/(v['current_replica']*49)
+            services_traffic_dist_factor[k] = concurrent_requests[k]/(v['current_replica']*v['target_concurrency_per_pod'])
+        except ZeroDivisionError:
+            services_traffic_dist_factor[k] = 15
     
-    # print("POPULATION......", population)
+        total_replica_count_now += v['current_replica']
+        target_concurrency_per_pod = v['target_concurrency_per_pod']
 
-    best_solution = max(population, key=fitness)
-    return best_solution, fitness(best_solution)
+        i += 1
 
-# Execute the GA
-best_solution, best_fitness = genetic_algorithm()
-print("Best Solution:", best_solution)
-print("Best Fitness (Throughput - Penalties):", best_fitness)
+    print("SERVICE METRICS: ", services, service_index, services_traffic_dist_factor)
 
+    # max_rep_bound = math.ceil((concurrent_requests['total'] / (total_replica_count_now * 49)) + 1)
+    # max_rep_bound = max(math.ceil((concurrent_requests['total'] / 49) - total_replica_count_now), 1)
+    max_rep_bound = max(math.ceil((concurrent_requests['total'] / target_concurrency_per_pod) - total_replica_count_now), 0) + 1
+    print(total_replica_count_now, max_rep_bound)
 
-def run_command(command):
-    result = subprocess.run(command, capture_output=True, text=True, shell=True)
-    if result.returncode != 0:
-        #print(f"Error running command '{' '.join(command)}': {result.stderr}")
-        return None
-    return result.stdout
+    return {'service_name': service_name,
+            'services': services,
+            'service_index': service_index,
+            'services_traffic_dist_factor': services_traffic_dist_factor,
+            'capacities': capacities,
+            'concurrent_requests': concurrent_requests,
+            'max_rep_bound': max_rep_bound}
 
 
-def get_revisions_with_traffic_split(service_name):
-    # List all revisions with their traffic split percentages for a given service
-    services_output = run_command("kn service list -o json")
-
-    if services_output:
-        services = json.loads(services_output)
-        revisions_traffic = dict()
-
-        for service in services.get('items', []):
-            if service['metadata'].get('name') == service_name:
-                # Get the traffic split information
-                traffic = service.get('status', {}).get('traffic', [])
-                for route in traffic:
-                    #print(f"Revision: {route.get('revisionName', 'Latest')}, Percent: {route.get('percent', 0)}%")
-                    revisions_traffic[route.get('revisionName', 'Latest')] = route.get('percent', 0)
-        
-        return revisions_traffic
-
+def load_warm_start_seeds(redis_conn, problem):
+    """
+    Seeds for the GA: the last solution applied for the service and the current replica counts.
+    Returns (seeds, warm) where `warm` tells whether a previous solution was found.
+    """
+    seeds = [[service['current_replica'] for service in problem['services']]]
+
+    last = db_client.retrieve_json_data(redis_conn, f"{problem['service_name']}_last_solution")
+    if not last:
+        return seeds, False
+
+    # align by revision name, revisions that appeared since then start at 0
+    previous = dict(zip(last['service_index'], last['solution']))
+    seeds.insert(0, [previous.get(revision, 0) for revision in problem['service_index']])
+    return seeds, True
+
+
+def store_last_solution(redis_conn, problem, solution, fitness):
+    # keep the applied solution together with the snapshot it was computed from
+    db_client.store_json_data(redis_conn, f"{problem['service_name']}_last_solution", {
+        'service_index': problem['service_index'],
+        'solution': solution,
+        'fitness': fitness,
+        'snapshot': {'services': dict(zip(problem['service_index'], problem['services'])),
+                     'capacities': problem['capacities'],
+                     'concurrent_requests': problem['concurrent_requests']},
+        'computed_at': time.time()})
+
+
+def publish_incumbent(redis_conn, problem):
+    """ Solver progress callback keeping {service}_best_so_far at the best solution of the running job """
+    def progress(solution, fitness):
+        db_client.store_json_data(redis_conn, f"{problem['service_name']}_best_so_far", {
+            'service_index': problem['service_index'],
+            'solution': [int(count) for count in solution],
+            'fitness': float(fitness),
+            'updated_at': time.time()})
+    return progress
+
+
+def optimize_replicas(problem, seeds=None, warm=False, time_budget=None, islands=None, strategy=None,
+                      progress=None):
+    """
+    Solves the replica problem with the chosen strategy (see solvers.SOLVERS) within `time_budget` seconds;
+    `progress(solution, score)` receives the incumbents of solvers that report them
+    """
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    strategy = strategy or DEFAULT_STRATEGY
+    started = time.monotonic()
+    with OPTIMIZER_PHASE_SECONDS.labels('solve').time():
+        solution, score = get_solver(strategy)(problem, seeds=seeds, warm=warm, deadline=deadline, islands=islands,
+                                               progress=progress)
+    print(f"Solver '{strategy}' finished in {time.monotonic() - started:.3f}s")
+    return solution, score
 
-def get_revisions(service_name: str | None = None, namespace: str | None = None) -> list[str]:
-    cmd = ["kn", "revision", "list", "-o", "json"]
-    if namespace:
-        cmd += ["-n", namespace]
 
-    out = subprocess.check_output(cmd, text=True)
+def get_revisions_with_traffic_split(service_name, namespace="default"):
+    # List all revisions with their traffic split percentages for a given service
+    cache = get_cluster_cache(namespace)
+    service = cache.knative_service(service_name) if cache else None
+    if service:
+        return service_traffic(service)
+    try:
+        return service_traffic(get_cluster_client().get_knative_service(service_name, namespace))
+    except requests.RequestException as e:
+        print(f"Failed to get traffic split of {service_name}: {e}")
+        return None
 
-    import json
-    data = json.loads(out)
 
-    names = []
-    for item in data.get("items", []):
-        name = item.get("metadata", {}).get("name", "")
-        if not name:
-            continue
-        # Optional filter: only revisions belonging to a service
-        if service_name and not name.startswith(f"{service_name}-"):
-            continue
-        names.append(name)
+def get_revisions(service_name: str | None = None, namespace: str | None = None) -> list[str]:
+    # revisions of a service, from the cluster cache or selected on the server by the Knative service label
+    cache = get_cluster_cache(namespace or "default")
+    if cache and service_name:
+        items = cache.service_revisions(service_name)
+    else:
+        items = get_cluster_client().list_revisions(namespace or "default", service_name=service_name)
+    names = [item.get("metadata", {}).get("name", "") for item in items]
+    names = [name for name in names if name]
 
     # Sort by revision suffix number if present (…-00001, …-00002, ...)
     def rev_key(n: str):
@@ -329,28 +269,27 @@ def get_revisions(service_name: str | None = None, namespace: str | None = None)
     return sorted(names, key=rev_key)
 
 
-def set_traffic_split(service_name, revision_traffic_list):
+def set_traffic_split(service_name, revision_traffic_list, namespace="default"):
     """
     Sets traffic split for a Knative service.
 
     :param service_name: Name of the Knative service.
     :param revision_traffic_list: List of tuples with revision name and traffic percentage.
     """
+    # same spec.traffic that `kn service update --traffic rev=percent ...` writes, as one merge patch
+    traffic = [{'revisionName': revision, 'percent': int(percentage), 'latestRevision': False}
+               for revision, percentage in revision_traffic_list]
+    print("traffic: ", traffic)
     try:
-        # Construct the `kn service update` command with traffic split
-        command = ['kn', 'service', 'update', service_name]
-        for revision, percentage in revision_traffic_list:
-            command.extend(['--traffic', f'{revision}={int(percentage)}'])
-        print("command: ", command)
-
-        # Execute the command
-        subprocess.run(command, check=True)
+        get_cluster_client().patch_traffic(service_name, traffic, namespace)
         print(f"Traffic split successfully updated for service: {service_name}")
-    except subprocess.CalledProcessError as e:
+        return True
+    except requests.RequestException as e:
         print(f"Failed to update traffic split: {e}")
+        return False
 
 
-def scale_to_100_integers(values):
+def scale_to_100_integers(values, services):
     # Calculate the total of the original list
     # total = sum(values)
     
@@ -554,58 +493,121 @@ def get_small_traffic_adjustments(prev_traffic, new_traffic, adjustment_factor=0
 
     return floored
 
-# Calculate and display proportions post-solution
-total = sum(best_solution)
-# print(total)
 
-if total > 0:
-    # Calculate the percentage of each number
-    percentages = scale_to_100_integers(best_solution)
-    # print(percentages)
-
-    optimized_traffic_distribution = dict(zip(service_index, percentages))
-    print(optimized_traffic_distribution)
-
-    current_traffic_distribution = get_revisions_with_traffic_split(service_name)
+def apply_traffic_distribution(service_name, service_index, services, best_solution):
+    """
+    Turns the replica solution into a traffic split and applies it gradually through the Knative API.
+    Returns True when a new split was applied.
+    """
+    # Calculate and display proportions post-solution
+    total = sum(best_solution)
+    # print(total)
 
-    # remove later with dynamic
-    # revisions = ['face-recognition-oblique-00001', 'face-recognition-oblique-00002', 
-    #             'face-recognition-oblique-00003', 'face-recognition-oblique-00004']
-    revisions = get_revisions(service_name="face-recognition-oblique", namespace="default")
+    if total > 0:
+        # Calculate the percentage of each number
+        percentages = scale_to_100_integers(best_solution, services)
+        # print(percentages)
 
-    for revision in revisions:
-        if revision not in current_traffic_distribution.keys():
-            current_traffic_distribution[revision] = 0
+        optimized_traffic_distribution = dict(zip(service_index, percentages))
+        print(optimized_traffic_distribution)
 
-        if revision not in optimized_traffic_distribution.keys():
-            optimized_traffic_distribution[revision] = 0
+        current_traffic_distribution = get_revisions_with_traffic_split(service_name)
+        if current_traffic_distribution is None:
+            return False
 
-    if current_traffic_distribution != optimized_traffic_distribution:
-        # Filter out items with a value of 0
-        optimized_traffic_distribution = get_small_traffic_adjustments(current_traffic_distribution, 
-                                                                        optimized_traffic_distribution)
+        # remove later with dynamic
+        # revisions = ['face-recognition-oblique-00001', 'face-recognition-oblique-00002', 
+        #             'face-recognition-oblique-00003', 'face-recognition-oblique-00004']
+        try:
+            revisions = get_revisions(service_name=service_name, namespace="default")
+        except requests.RequestException as e:
+            print(f"Failed to list revisions: {e}")
+            return False
+
+        for revision in revisions:
+            if revision not in current_traffic_distribution.keys():
+                current_traffic_distribution[revision] = 0
+
+            if revision not in optimized_traffic_distribution.keys():
+                optimized_traffic_distribution[revision] = 0
+
+        if current_traffic_distribution != optimized_traffic_distribution:
+            # Filter out items with a value of 0
+            optimized_traffic_distribution = get_small_traffic_adjustments(current_traffic_distribution, 
+                                                                            optimized_traffic_distribution)
+
+            filtered_dict = {key: value for key, value in optimized_traffic_distribution.items() if value != 0}
+            print("Gradual Traffic Change: ", optimized_traffic_distribution)
+
+            if 'face-recognition-oblique-00004' in filtered_dict.keys():
+                allocated_value = filtered_dict['face-recognition-oblique-00004']
+                filtered_dict['face-recognition-oblique-00004'] = round(allocated_value / 8)
+                no_of_services = len(filtered_dict.keys())
+
+                if no_of_services > 1:
+                    equal_halves = round(allocated_value / no_of_services)
+                    for service, percent in filtered_dict.items():
+                        if service != 'face-recognition-oblique-00004':
+                            filtered_dict[service] = percent + equal_halves
+                    filtered_dict = scale_dict_values_to_100_integers(filtered_dict)
+                
+            for service, percent in filtered_dict.items():
+                optimized_traffic_distribution[service] = percent
 
-        filtered_dict = {key: value for key, value in optimized_traffic_distribution.items() if value != 0}
-        print("Gradual Traffic Change: ", optimized_traffic_distribution)
+            # no traffic patch (and no route churn) when the gradual step lands on the current split
+            if optimized_traffic_distribution == current_traffic_distribution:
+                print(f"Traffic split for {service_name} unchanged, skipping update")
+                return False
+            return set_traffic_split(service_name, optimized_traffic_distribution.items())
+    return False
 
-        if 'face-recognition-oblique-00004' in filtered_dict.keys():
-            allocated_value = filtered_dict['face-recognition-oblique-00004']
-            filtered_dict['face-recognition-oblique-00004'] = round(allocated_value / 8)
-            no_of_services = len(filtered_dict.keys())
 
-            if no_of_services > 1:
-                equal_halves = round(allocated_value / no_of_services)
-                for service, percent in filtered_dict.items():
-                    if service != 'face-recognition-oblique-00004':
-                        filtered_dict[service] = percent + equal_halves
-                filtered_dict = scale_dict_values_to_100_integers(filtered_dict)
-                
-        for service, percent in filtered_dict.items():
-            optimized_traffic_distribution[service] = percent
-        set_traffic_split(service_name, optimized_traffic_distribution.items())
+def run_optimization(redis_conn, service_name, time_budget=None, islands=None, strategy=None, triggered_at=None):
+    """
+    One optimization job: load the newest snapshot, solve, update the traffic split.
+    `time_budget` (seconds) bounds the solver's wall-clock time; the best solution found by then is used.
+    `islands` > 1 runs the GA fallback as a parallel island model. The solver strategy comes from
+    the {service}_solver_strategy / optimizer_solver_strategy Redis keys, then `strategy`.
+    `triggered_at` (unix time of the trigger) is used to report the trigger-to-traffic latency.
+    """
+    with OPTIMIZER_PHASE_SECONDS.labels('load_inputs').time():
+        problem = load_service_problem(redis_conn, service_name)
+    if problem is None:
+        return None
 
-if current_pid is not None:
-    running_service_optimizers.remove(current_pid)
-    db_client.store_json_data(redis_conn, f"{service_name}_optimizer_process", running_service_optimizers)
+    strategy = select_strategy(redis_conn, service_name, strategy)
+    fingerprint = fingerprint_problem(problem, strategy, time_budget)
+    cached = lookup_decision(redis_conn, service_name, fingerprint, problem['service_index'])
+    if cached:
+        # an equivalent snapshot was already solved, reuse its decision
+        print(f"Decision cache hit for {service_name}")
+        best_solution, best_fitness = cached
+    else:
+        seeds, warm = load_warm_start_seeds(redis_conn, problem)
+        best_solution, best_fitness = optimize_replicas(problem, seeds=seeds, warm=warm, time_budget=time_budget,
+                                                        islands=islands, strategy=strategy,
+                                                        progress=publish_incumbent(redis_conn, problem))
+        store_decision(redis_conn, service_name, fingerprint, problem['service_index'], best_solution,
+                       best_fitness)
+    print("Best Solution:", best_solution)
+    print("Best Fitness (Throughput - Penalties):", best_fitness)
+    store_last_solution(redis_conn, problem, best_solution, best_fitness)
+
+    with OPTIMIZER_PHASE_SECONDS.labels('traffic_update').time():
+        applied = apply_traffic_distribution(service_name, problem['service_index'], problem['services'],
+                                             best_solution)
+    if applied and triggered_at is not None:
+        TRIGGER_TO_TRAFFIC_SECONDS.observe(time.time() - triggered_at)
+    return best_solution
+
+
+if __name__ == "__main__":
+    # one-shot run for a single service (the resident worker lives in optimizer_worker.py)
+    if len(sys.argv) > 1:
+        service_name = sys.argv[1]
+    else:
+        sys.exit()
 
-time.sleep(1)
+    # Connect to Redis
+    redis_conn = db_client.connect_to_redis()
+    run_optimization(redis_conn, service_name)
@@ -0,0 +1,129 @@
+# imports
+import argparse
+import json
+import time
+
+import redis
+
+import db_client
+from instrumentation import OPTIMIZER_METRICS_PORT, start_metrics_server
+from island_ga import spare_cores
+from joint_optimizer import JOINT_JOB, run_joint_optimization
+from optimizer import run_optimization
+from solvers import SOLVERS
+
+# Redis keys for the optimization job queue
+OPTIMIZER_QUEUE = 'optimizer_jobs'                 # list of service names waiting to be optimized
+OPTIMIZER_PENDING = 'optimizer_jobs_pending'       # set of services currently sitting in the queue
+OPTIMIZER_JOB_PREFIX = 'optimizer_job:'            # newest job payload per service
+
+# Merges a job into the one still waiting for the service (tightest time budget, earliest trigger) and queues
+# the service unless it is already waiting
+ENQUEUE_SCRIPT = """
+local job = cjson.decode(ARGV[1])
+local waiting = redis.call('get', KEYS[1])
+if waiting then
+    local previous = cjson.decode(waiting)
+    if previous.enqueued_at < job.enqueued_at then
+        job.enqueued_at = previous.enqueued_at
+    end
+    local budget = previous.time_budget
+    if budget ~= nil and budget ~= cjson.null and
+            (job.time_budget == nil or job.time_budget == cjson.null or budget < job.time_budget) then
+        job.time_budget = budget
+    end
+end
+redis.call('set', KEYS[1], cjson.encode(job))
+if redis.call('sadd', KEYS[2], ARGV[2]) == 1 then
+    redis.call('rpush', KEYS[3], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+
+def parse_args():
+    p = argparse.ArgumentParser()
+    p.add_argument("--islands", default="0",
+                   help="Run the GA as an island model with this many processes ('auto' uses the spare cores)")
+    p.add_argument("--solver", choices=sorted(SOLVERS), default=None,
+                   help="Default solver strategy (Redis keys {service}_solver_strategy / optimizer_solver_strategy win)")
+    p.add_argument("--metrics-port", type=int, default=OPTIMIZER_METRICS_PORT,
+                   help="Port of the worker's /metrics endpoint (0 disables it)")
+    return p.parse_args()
+
+
+def enqueue_optimization(redis_conn, service_name, **params):
+    """
+    Queues an optimization job for a service.
+
+    Jobs for the same service are coalesced atomically: the newest payload is kept, but with the smallest
+    time budget and the earliest enqueued_at of the jobs merged into it (a panic trigger followed by a
+    stable one still runs with the panic budget), and the service is only pushed to the queue if it is not
+    already waiting in it.
+    """
+    job = {'service_name': service_name, 'enqueued_at': time.time()}
+    job.update(params)
+
+    added = redis_conn.eval(ENQUEUE_SCRIPT, 3, f"{OPTIMIZER_JOB_PREFIX}{service_name}", OPTIMIZER_PENDING,
+                            OPTIMIZER_QUEUE, json.dumps(job), service_name)
+    return bool(added)
+
+
+def take_job(redis_conn, service_name):
+    # remove the service from the pending set first, so jobs arriving while it runs are queued again
+    pipe = redis_conn.pipeline()
+    pipe.srem(OPTIMIZER_PENDING, service_name)
+    pipe.get(f"{OPTIMIZER_JOB_PREFIX}{service_name}")
+    pipe.delete(f"{OPTIMIZER_JOB_PREFIX}{service_name}")
+    _, payload, _ = pipe.execute()
+    if not payload:
+        return None
+    return json.loads(payload)
+
+
+def run_worker(redis_conn, poll_timeout=5, islands=None, strategy=None):
+    """ Resident optimizer: blocks on the job queue and optimizes one service at a time """
+    print("Optimizer worker waiting for jobs on", OPTIMIZER_QUEUE)
+    while True:
+        try:
+            item = redis_conn.blpop(OPTIMIZER_QUEUE, timeout=poll_timeout)
+            if not item:
+                continue
+            _, service_name = item
+
+            job = take_job(redis_conn, service_name)
+            if job is None:
+                continue
+
+            started_at = time.time()
+            if service_name == JOINT_JOB:
+                run_joint_optimization(redis_conn, job['services'], time_budget=job.get('time_budget'),
+                                       islands=islands, strategy=strategy, triggered_at=job['enqueued_at'])
+            else:
+                run_optimization(redis_conn, service_name, time_budget=job.get('time_budget'), islands=islands,
+                                 strategy=strategy, triggered_at=job['enqueued_at'])
+            finished_at = time.time()
+
+            latency = {'queue_wait': started_at - job['enqueued_at'],
+                       'run_time': finished_at - started_at,
+                       'total': finished_at - job['enqueued_at'],
+                       'finished_at': finished_at}
+            db_client.store_json_data(redis_conn, f"{service_name}_optimizer_latency", latency)
+            print(f"Optimization job for {service_name}: ", latency)
+            print("Redis read cache: ", db_client.cache_stats())
+        except redis.RedisError as e:
+            print(f"Redis error in optimizer worker: {e}")
+            time.sleep(1)
+        except Exception as e:
+            print('Exception: ', e)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    islands = spare_cores() if args.islands == 'auto' else int(args.islands)
+    start_metrics_server(args.metrics_port)
+
+    # Connect to Redis
+    redis_conn = db_client.connect_to_redis()
+    run_worker(redis_conn, islands=islands, strategy=args.solver)
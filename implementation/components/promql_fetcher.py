@@ -0,0 +1,80 @@
+# imports
+import asyncio
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+from prometheus_api_client import PrometheusConnect
+from urllib3.util.retry import Retry
+
+from instrumentation import PROMQL_QUERY_SECONDS
+
+# Queries in flight at once (stays below the default connection pool size of PrometheusConnect's session)
+PROMQL_WORKERS = 8
+
+# Per-query timeout in seconds: the HTTP client gives up on the connection after it (so no worker thread
+# hangs on a dead connection), and Prometheus stops evaluating the query
+PROMQL_TIMEOUT = 5
+
+# Retries of failed connections (timed-out reads are not retried, the next cycle asks again)
+PROMQL_CONNECT_RETRIES = 2
+
+# Shared by all observation cycles of the process (created on first use)
+promql_executor = None
+
+# Limits the queries of all per-service observer tasks to PROMQL_WORKERS in flight (one per event loop)
+promql_semaphores = weakref.WeakKeyDictionary()
+
+
+def connect_to_prometheus(url, timeout=PROMQL_TIMEOUT):
+    retry = Retry(total=PROMQL_CONNECT_RETRIES, connect=PROMQL_CONNECT_RETRIES, read=0, status=0,
+                  backoff_factor=0.1)
+    return PrometheusConnect(url=url, timeout=timeout, retry=retry)
+
+
+def get_promql_executor():
+    global promql_executor
+    if promql_executor is None:
+        promql_executor = ThreadPoolExecutor(max_workers=PROMQL_WORKERS, thread_name_prefix="promql")
+    return promql_executor
+
+
+def get_promql_semaphore():
+    loop = asyncio.get_running_loop()
+    if loop not in promql_semaphores:
+        promql_semaphores[loop] = asyncio.Semaphore(PROMQL_WORKERS)
+    return promql_semaphores[loop]
+
+
+def run_query(prometheus, name, query, timeout):
+    try:
+        with PROMQL_QUERY_SECONDS.labels(name).time():
+            return prometheus.custom_query(query, params={'timeout': f'{timeout}s'}, timeout=timeout)
+    except Exception as e:
+        print(f"PromQL query '{name}' failed: {e}")
+        return None
+
+
+async def fetch_queries_async(prometheus, queries, timeout=PROMQL_TIMEOUT):
+    """
+    Runs {name: query} concurrently and returns {name: result}; failed or timed-out queries come back as
+    None. The queries of every asyncio task share the PROMQL_WORKERS slots, and a query's timeout only
+    starts once it holds one, so waiting behind other queries does not time it out.
+    A slot is held until the query's thread is done, also after its caller gave up on it (the HTTP client
+    gives up after `timeout` too), so a slot always comes with a free executor thread.
+    """
+    loop = asyncio.get_running_loop()
+    semaphore = get_promql_semaphore()
+
+    async def fetch(name, query):
+        await semaphore.acquire()
+        future = loop.run_in_executor(get_promql_executor(), run_query, prometheus, name, query, timeout)
+        future.add_done_callback(lambda _: semaphore.release())
+        try:
+            # shielded: cancelling the wait must not mark the future done while its thread still runs
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            print(f"PromQL query '{name}' timed out after {timeout}s")
+            return None
+
+    results = await asyncio.gather(*(fetch(name, query) for name, query in queries.items()))
+    return dict(zip(queries, results))
@@ -0,0 +1,70 @@
+# imports
+from promql_fetcher import fetch_queries_async
+
+
+class PrefixIndex:
+    """
+    Maps a label value (pod, deployment or revision name) to the revision it belongs to: the longest known
+    revision name that equals the value or prefixes it up to a '-' (fr-00001 <- fr-00001-deployment-7f9c-x2).
+    A lookup costs one dict probe per '-' in the value instead of a scan over every revision.
+    """
+
+    def __init__(self, revisions):
+        self.revisions = set(revisions)
+
+    def lookup(self, value):
+        if value in self.revisions:
+            return value
+        end = value.rfind('-')
+        while end > 0:
+            if value[:end] in self.revisions:
+                return value[:end]
+            end = value.rfind('-', 0, end)
+        return None
+
+
+def demultiplex(component, data, index):
+    """ {revision: summed value} of a query batched over all services, series attributed by `component` """
+    if data is None:
+        return None
+    values = {}
+    for result in data:
+        revision = index.lookup(result['metric'].get(component, ''))
+        if revision is None:
+            continue
+        value = int(result['value'][1]) if component == 'deployment' else float(result['value'][1])
+        values[revision] = values.get(revision, 0) + value
+    return values
+
+
+def select_revisions(values, equivalent_services):
+    # one service's share of a demultiplexed family; None when none of its revisions reported
+    if not values or not any(equivalent_service in values for equivalent_service in equivalent_services):
+        return None
+    return {equivalent_service: values.get(equivalent_service, 0) for equivalent_service in equivalent_services}
+
+
+def deduplicate(queries):
+    # {query: name of its first occurrence}
+    unique = {}
+    for name, query in queries.items():
+        unique.setdefault(query, name)
+    return unique
+
+
+def assemble(queries, unique, fetched, components, index):
+    results = {}
+    for name, query in queries.items():
+        data = fetched[unique[query]]
+        results[name] = demultiplex(components[name], data, index) if name in components else data
+    return results
+
+
+async def execute_plan_async(prometheus, queries, components, index):
+    """
+    Fetches one observation plan: identical query strings are sent once, and every family named in
+    `components` ({name: label}) is demultiplexed per revision; the other results are returned as fetched.
+    """
+    unique = deduplicate(queries)
+    fetched = await fetch_queries_async(prometheus, {name: query for query, name in unique.items()})
+    return assemble(queries, unique, fetched, components, index)
@@ -0,0 +1,157 @@
+# imports
+import hashlib
+import math
+import os
+import socket
+import time
+import uuid
+
+import redis
+
+import db_client
+
+# Redis keys
+SHARD_MEMBERS_KEY = 'observer_members'          # sorted set: observer instance -> time of its last heartbeat
+SHARD_LEASE_PREFIX = 'observer_lease:'          # observer_lease:{service} -> instance observing the service
+
+# Seconds a lease survives without renewal: the services of a crashed instance move on after this
+LEASE_TTL = 30
+HEARTBEAT_INTERVAL = 5
+
+# Instances without a heartbeat for this long no longer count when services are balanced
+MEMBER_TTL = LEASE_TTL
+
+# Lease renewal and release, only by the instance holding the lease
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def lease_key(service_name):
+    return f"{SHARD_LEASE_PREFIX}{service_name}"
+
+
+def new_member_id():
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+def rendezvous_weight(member, service_name):
+    return hashlib.sha1(f"{member}/{service_name}".encode()).digest()
+
+
+def assign_services(services, members):
+    """
+    {service: instance} by rendezvous hashing with bounded load: every service goes to the highest-weighted
+    instance that has fewer than ceil(services / instances) of them. Deterministic, so every instance
+    computes the same assignment, and mostly stable when instances join or leave.
+    """
+    if not members:
+        return {}
+    capacity = math.ceil(len(services) / len(members))
+    load = {member: 0 for member in members}
+    owners = {}
+    for service_name in sorted(services):
+        for member in sorted(members, key=lambda member: rendezvous_weight(member, service_name), reverse=True):
+            if load[member] < capacity:
+                owners[service_name] = member
+                load[member] += 1
+                break
+    return owners
+
+
+class ShardMembership:
+    """
+    Lease-based service ownership of one observer instance. Every heartbeat registers the instance, renews
+    its leases, releases the services another live instance should own (see assign_services) and acquires
+    the free ones it should own. An instance observes only the services it holds a lease for.
+    """
+
+    def __init__(self, redis_conn, member_id=None, lease_ttl=LEASE_TTL):
+        self.redis_conn = redis_conn
+        self.member_id = member_id or new_member_id()
+        self.lease_ttl = lease_ttl
+        self.renew_script = redis_conn.register_script(RENEW_SCRIPT)
+        self.release_script = redis_conn.register_script(RELEASE_SCRIPT)
+        self.owned = set()
+        self.renewed_at = 0
+
+    def owns(self, service_name):
+        return service_name in self.owned
+
+    def live_members(self, now):
+        pipe = self.redis_conn.pipeline(transaction=False)
+        pipe.zadd(SHARD_MEMBERS_KEY, {self.member_id: now})
+        pipe.zremrangebyscore(SHARD_MEMBERS_KEY, '-inf', now - MEMBER_TTL)
+        pipe.zrange(SHARD_MEMBERS_KEY, 0, -1)
+        with db_client.round_trip('pipeline'):
+            return pipe.execute()[-1]
+
+    def heartbeat(self, services, now=None):
+        """ One heartbeat over the current service list; returns the services owned afterwards """
+        now = time.time() if now is None else now
+        try:
+            members = self.live_members(now)
+            desired = {service_name for service_name, owner in assign_services(services, members).items()
+                       if owner == self.member_id}
+            keep, release, acquire = (sorted(self.owned & desired), sorted(self.owned - desired),
+                                      sorted(desired - self.owned))
+
+            ttl_ms = int(self.lease_ttl * 1000)
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for service_name in keep:
+                self.renew_script(keys=[lease_key(service_name)], args=[self.member_id, ttl_ms], client=pipe)
+            for service_name in release:
+                self.release_script(keys=[lease_key(service_name)], args=[self.member_id], client=pipe)
+            for service_name in acquire:
+                pipe.set(lease_key(service_name), self.member_id, nx=True, px=ttl_ms)
+            with db_client.round_trip('pipeline'):
+                results = pipe.execute() if len(pipe) else []
+
+            renewed = {service_name for service_name, ok in zip(keep, results) if ok}
+            acquired = {service_name for service_name, ok in zip(acquire, results[len(keep) + len(release):]) if ok}
+            if renewed != set(keep):
+                print(f"Lost the leases of {sorted(set(keep) - renewed)}")
+            self.owned = renewed | acquired
+            self.renewed_at = now
+        except redis.RedisError as e:
+            print(f"Shard heartbeat failed: {e}")
+            if now - self.renewed_at >= self.lease_ttl:
+                # our leases have expired by now, other instances may have taken the services over
+                self.owned = set()
+        return set(self.owned)
+
+    def leave(self):
+        """ Hands every service over right away (instead of after LEASE_TTL) """
+        try:
+            pipe = self.redis_conn.pipeline(transaction=False)
+            for service_name in self.owned:
+                self.release_script(keys=[lease_key(service_name)], args=[self.member_id], client=pipe)
+            pipe.zrem(SHARD_MEMBERS_KEY, self.member_id)
+            pipe.execute()
+        except redis.RedisError as e:
+            print(f"Error releasing shard leases: {e}")
+        self.owned = set()
+
+
+def lease_owners(redis_conn, services):
+    """ {service: instance holding its lease, or None} """
+    owners = redis_conn.mget([lease_key(service_name) for service_name in services]) if services else []
+    return dict(zip(services, owners))
+
+
+if __name__ == "__main__":
+    # Print the observer instances and which one observes which service
+    r = db_client.connect_to_redis()
+    print("Instances: ", r.zrange(SHARD_MEMBERS_KEY, 0, -1, withscores=True))
+    services = [key[len(SHARD_LEASE_PREFIX):] for key in r.scan_iter(f"{SHARD_LEASE_PREFIX}*")]
+    for service_name, owner in sorted(lease_owners(r, services).items()):
+        print(service_name, owner)
@@ -0,0 +1,228 @@
+# imports
+import math
+import time
+
+import numpy as np
+
+from exact_solver import optimality_gap, penalized_score, search_space_size, solve_exact
+from ga_engine import PopulationEngine, build_problem_matrices
+from instrumentation import GA_GENERATIONS
+from island_ga import island_genetic_algorithm
+
+# Solver interface: solver(problem, seeds=None, warm=False, deadline=None, islands=None, progress=None)
+#                   -> (solution, score)
+#   problem  - snapshot built by optimizer.load_service_problem (per-revision metrics, capacities, max_rep_bound)
+#   seeds    - candidate replica vectors to start from (previous solution, current replicas)
+#   deadline - time.monotonic() value at which the solver has to return its best solution so far
+#   progress - progress(solution, score) is called with the incumbents of long-running solvers (GA)
+SOLVERS = {}
+
+# Strategy used when neither the worker nor Redis selects one
+DEFAULT_STRATEGY = 'auto'
+
+# Generations without improvement before the GA stops early (warm-started runs converge faster)
+GA_PATIENCE = 15
+GA_COLD_PATIENCE = 40
+
+# How the GA handles capacity overruns: 'repair' (children are projected into the feasible
+# region before evaluation) or 'penalty' (infeasible children are only penalized in fitness)
+GA_CONSTRAINT_MODE = 'repair'
+
+
+def register_solver(name):
+    def decorator(solver):
+        SOLVERS[name] = solver
+        return solver
+    return decorator
+
+
+def get_solver(name):
+    if name not in SOLVERS:
+        raise ValueError(f"Unknown solver strategy '{name}', available: {sorted(SOLVERS)}")
+    return SOLVERS[name]
+
+
+def select_strategy(redis_conn, service_name, default=None):
+    # per-service Redis key first, then the global one, then the caller's default
+    for key in (f"{service_name}_solver_strategy", "optimizer_solver_strategy"):
+        strategy = redis_conn.get(key)
+        if strategy in SOLVERS:
+            return strategy
+        if strategy:
+            print(f"Ignoring unknown solver strategy '{strategy}' in {key}")
+    return default or DEFAULT_STRATEGY
+
+
+def problem_matrices(problem):
+    return build_problem_matrices(problem['services'], problem['capacities'], problem['max_rep_bound'])
+
+
+def best_seed(seeds, throughput, usage, capacity, upper_bounds):
+    # best of the given seeds (clipped to the bounds), or all zeros
+    if not seeds:
+        return np.zeros(len(throughput), dtype=np.int64)
+    candidates = np.clip(np.asarray(seeds, dtype=np.int64), 0, upper_bounds)
+    return candidates[int(np.argmax(penalized_score(candidates, throughput, usage, capacity)))]
+
+
+def out_of_time(deadline):
+    return deadline is not None and time.monotonic() >= deadline
+
+
+# Genetic Algorithm (population kept as a 2-D array, see ga_engine.PopulationEngine)
+def genetic_algorithm(problem, population_size=100, generations=100, seeds=None, patience=None, deadline=None,
+                      islands=None, progress=None):
+    throughput, usage, capacity, upper_bounds = problem_matrices(problem)
+    if islands and islands > 1:
+        # opt-in island model across a process pool (see island_ga.py)
+        print(f"Island GA with {islands} islands")
+        return island_genetic_algorithm(throughput, usage, capacity, upper_bounds, islands=islands,
+                                        population_size=population_size, generations=generations,
+                                        seeds=seeds, deadline=deadline, constraint_mode=GA_CONSTRAINT_MODE,
+                                        progress=progress)
+
+    engine = PopulationEngine(throughput, usage, capacity, upper_bounds, constraint_mode=GA_CONSTRAINT_MODE)
+    result = engine.run(population_size=population_size, generations=generations, seeds=seeds, patience=patience,
+                        deadline=deadline, on_improvement=progress)
+    GA_GENERATIONS.observe(engine.generations_run)
+    print(f"GA generations: {engine.generations_run}/{generations} (stopped: {engine.stop_reason})")
+    return result
+
+
+@register_solver('ga')
+def solve_ga(problem, seeds=None, warm=False, deadline=None, islands=None, progress=None):
+    # a warm-started re-optimization stops as soon as it converges
+    return genetic_algorithm(problem, seeds=seeds, patience=GA_PATIENCE if warm else GA_COLD_PATIENCE,
+                             deadline=deadline, islands=islands, progress=progress)
+
+
+@register_solver('exact')
+def solve_exact_strategy(problem, seeds=None, warm=False, deadline=None, islands=None, progress=None):
+    throughput, usage, capacity, upper_bounds = problem_matrices(problem)
+    solution, score, upper_bound, optimal = solve_exact(throughput, usage, capacity, upper_bounds, deadline=deadline)
+    if not optimal:
+        print(f"Exact solver stopped early: optimality gap {optimality_gap(score, upper_bound):.2%}")
+    return solution, score
+
+
+@register_solver('auto')
+def solve_auto(problem, seeds=None, warm=False, deadline=None, islands=None, progress=None):
+    # exact solver when the search space is small enough, GA otherwise; both stop at the deadline
+    throughput, usage, capacity, upper_bounds = problem_matrices(problem)
+    exact_deadline = None
+    if deadline is not None:
+        # the exact solver gets at most half of the budget so the GA fallback still has time
+        exact_deadline = time.monotonic() + (deadline - time.monotonic()) / 2
+    solution, score, upper_bound, optimal = solve_exact(throughput, usage, capacity, upper_bounds,
+                                                        deadline=exact_deadline)
+    if optimal:
+        print(f"Exact solver (search space {search_space_size(upper_bounds)}): optimal")
+        return solution, score
+
+    if progress is not None:
+        progress(solution, score)
+    ga_solution, ga_score = solve_ga(problem, seeds=seeds, warm=warm, deadline=deadline, islands=islands,
+                                     progress=progress)
+    if score > ga_score:
+        ga_solution, ga_score = solution, score
+    print(f"GA fallback (search space {search_space_size(upper_bounds)}): "
+          f"optimality gap {optimality_gap(ga_score, upper_bound):.2%} (upper bound {upper_bound})")
+    return ga_solution, ga_score
+
+
+def greedy_fill(throughput, usage, capacity, upper_bounds, start=None):
+    """ Adds replicas in order of throughput per unit of (capacity-normalized) resource while they fit """
+    solution = np.zeros(len(throughput), dtype=np.int64) if start is None else np.array(start, dtype=np.int64)
+    scale = np.maximum(np.abs(capacity), 1e-9)
+    cost = (usage / scale).sum(axis=1)
+    ratio = np.where(cost > 0, throughput / np.maximum(cost, 1e-12), np.inf)
+
+    for i in np.argsort(-ratio, kind='stable'):
+        if throughput[i] <= 0:
+            continue
+        residual = capacity - solution @ usage
+        room = upper_bounds[i] - solution[i]
+        uses = usage[i] > 0
+        if uses.any():
+            room = min(room, int(np.floor(np.min(np.clip(residual[uses], 0, None) / usage[i][uses]))))
+        solution[i] += max(room, 0)
+    return solution
+
+
+@register_solver('greedy')
+def solve_greedy(problem, seeds=None, warm=False, deadline=None, islands=None, progress=None):
+    throughput, usage, capacity, upper_bounds = problem_matrices(problem)
+    solution = greedy_fill(throughput, usage, capacity, upper_bounds)
+    return [int(count) for count in solution], float(penalized_score(solution, throughput, usage, capacity)[0])
+
+
+def neighbours(solution, upper_bounds):
+    # every +1 / -1 move and every move of one replica from one revision to another
+    n = len(solution)
+    eye = np.eye(n, dtype=np.int64)
+    moves = [eye, -eye]
+    if n > 1:
+        moves.append((eye[:, None, :] - eye[None, :, :]).reshape(n * n, n))
+    candidates = solution + np.concatenate(moves)
+    valid = (candidates >= 0).all(axis=1) & (candidates <= upper_bounds).all(axis=1)
+    return candidates[valid]
+
+
+@register_solver('local_search')
+def solve_local_search(problem, seeds=None, warm=False, deadline=None, islands=None, progress=None,
+                       max_iterations=1000):
+    """ Steepest-ascent hill climbing from the better of the greedy solution and the seeds """
+    throughput, usage, capacity, upper_bounds = problem_matrices(problem)
+    starts = [greedy_fill(throughput, usage, capacity, upper_bounds)] + list(seeds or [])
+    current = best_seed(starts, throughput, usage, capacity, upper_bounds)
+    current_score = float(penalized_score(current, throughput, usage, capacity)[0])
+
+    for _ in range(max_iterations):
+        if out_of_time(deadline):
+            break
+        candidates = neighbours(current, upper_bounds)
+        if len(candidates) == 0:
+            break
+        scores = penalized_score(candidates, throughput, usage, capacity)
+        best = int(np.argmax(scores))
+        if scores[best] <= current_score + 1e-12:
+            break
+        current, current_score = candidates[best], float(scores[best])
+
+    return [int(count) for count in current], current_score
+
+
+@register_solver('simulated_annealing')
+def solve_simulated_annealing(problem, seeds=None, warm=False, deadline=None, islands=None, progress=None,
+                              iterations=5000, initial_temperature=1.0, cooling=0.999, seed=None):
+    """ Single-replica random moves accepted with the Metropolis rule under geometric cooling """
+    throughput, usage, capacity, upper_bounds = problem_matrices(problem)
+    rng = np.random.default_rng(seed)
+    starts = [greedy_fill(throughput, usage, capacity, upper_bounds)] + list(seeds or [])
+    current = best_seed(starts, throughput, usage, capacity, upper_bounds).copy()
+    current_score = float(penalized_score(current, throughput, usage, capacity)[0])
+    best, best_score = current.copy(), current_score
+
+    # temperature relative to the scale of the objective
+    temperature = initial_temperature * max(abs(current_score), float(throughput.max(initial=0)), 1e-6)
+    n = len(current)
+    for iteration in range(iterations):
+        if n == 0 or (iteration % 64 == 0 and out_of_time(deadline)):
+            break
+        i = int(rng.integers(n))
+        step = 1 if rng.random() < 0.5 else -1
+        if not 0 <= current[i] + step <= upper_bounds[i]:
+            continue
+
+        current[i] += step
+        score = float(penalized_score(current, throughput, usage, capacity)[0])
+        delta = score - current_score
+        if delta >= 0 or rng.random() < math.exp(delta / max(temperature, 1e-12)):
+            current_score = score
+            if score > best_score:
+                best, best_score = current.copy(), score
+        else:
+            current[i] -= step
+        temperature *= cooling
+
+    return [int(count) for count in best], best_score
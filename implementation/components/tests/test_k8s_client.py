@@ -0,0 +1,95 @@
+# imports
+import json
+
+import pytest
+import requests
+
+import k8s_client
+from k8s_client import REVISION_LABEL, SERVICE_LABEL, ClusterClient, pod_running
+
+
+def ok(body):
+    return 200, 'application/json', body
+
+
+def test_list_pods_selects_on_the_server(stub_server):
+    server = stub_server(lambda request: ok({'items': [{'metadata': {'name': 'rev-1-pod'}}]}))
+    client = ClusterClient(base_url=server.url)
+
+    pods = client.list_pods('default', label_selector=f"{REVISION_LABEL}=rev-1")
+
+    assert [pod['metadata']['name'] for pod in pods] == ['rev-1-pod']
+    request = server.requests[-1]
+    assert request['path'] == '/api/v1/namespaces/default/pods'
+    assert request['query']['labelSelector'] == [f"{REVISION_LABEL}=rev-1"]
+
+
+def test_list_revisions_of_one_service(stub_server):
+    server = stub_server(lambda request: ok({'items': []}))
+    client = ClusterClient(base_url=server.url)
+
+    assert client.list_revisions('default', service_name='face') == []
+    assert client.list_revisions('default') == []
+
+    by_service, everything = server.requests
+    assert by_service['path'] == f"{k8s_client.KNATIVE_SERVING}/namespaces/default/revisions"
+    assert by_service['query']['labelSelector'] == [f"{SERVICE_LABEL}=face"]
+    assert 'labelSelector' not in everything['query']
+
+
+def test_patch_traffic_sends_one_merge_patch(stub_server):
+    server = stub_server(lambda request: ok({'metadata': {'name': 'face'}}))
+    client = ClusterClient(base_url=server.url)
+    traffic = [{'revisionName': 'face-00001', 'percent': 70, 'latestRevision': False},
+               {'revisionName': 'face-00002', 'percent': 30, 'latestRevision': False}]
+
+    client.patch_traffic('face', traffic)
+
+    request = server.requests[-1]
+    assert request['method'] == 'PATCH'
+    assert request['path'] == f"{k8s_client.KNATIVE_SERVING}/namespaces/default/services/face"
+    assert request['headers']['Content-Type'] == 'application/merge-patch+json'
+    assert json.loads(request['body']) == {'spec': {'traffic': traffic}}
+
+
+def test_error_responses_raise(stub_server):
+    server = stub_server(lambda request: (404, 'application/json', {'kind': 'Status', 'reason': 'NotFound'}))
+    client = ClusterClient(base_url=server.url)
+
+    with pytest.raises(requests.HTTPError):
+        client.get_knative_service('missing')
+
+
+def test_unreachable_api_server_raises_request_exception(stub_server):
+    server = stub_server(lambda request: ok({}))
+    url = server.url
+    server.close()
+    client = ClusterClient(base_url=url, timeout=1)
+
+    with pytest.raises(requests.RequestException):
+        client.list_nodes()
+
+
+def test_set_traffic_split_reports_failures(stub_server, monkeypatch):
+    import optimizer
+
+    responses = iter([ok({}), (409, 'application/json', {'reason': 'Conflict'})])
+    server = stub_server(lambda request: next(responses))
+    monkeypatch.setattr(k8s_client, 'cluster_client', ClusterClient(base_url=server.url))
+
+    assert optimizer.set_traffic_split('face', [('face-00001', 100)]) is True
+    assert optimizer.set_traffic_split('face', [('face-00001', 100)]) is False
+    assert json.loads(server.requests[0]['body'])['spec']['traffic'] == [
+        {'revisionName': 'face-00001', 'percent': 100, 'latestRevision': False}]
+
+
+@pytest.mark.parametrize('pod, running', [
+    ({'metadata': {}, 'status': {'phase': 'Running', 'conditions': [{'type': 'Ready', 'status': 'True'}]}}, True),
+    # CrashLoopBackOff: the phase stays Running, the pod is not ready
+    ({'metadata': {}, 'status': {'phase': 'Running', 'conditions': [{'type': 'Ready', 'status': 'False'}]}}, False),
+    ({'metadata': {'deletionTimestamp': '2026-10-17T00:00:00Z'},
+      'status': {'phase': 'Running', 'conditions': [{'type': 'Ready', 'status': 'True'}]}}, False),
+    ({'metadata': {}, 'status': {'phase': 'Pending'}}, False),
+])
+def test_pod_running(pod, running):
+    assert pod_running(pod) is running
@@ -0,0 +1,130 @@
+# imports
+import pytest
+
+import metric_scraper
+from metric_scraper import FastPathScraper, counter_rate
+
+REVISION = 'face-00001'
+
+
+class Clock:
+    """ Stands in for the time module of metric_scraper, so every scrape round happens at a chosen time """
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def queue_proxy_metrics(ok, errors, latency_ms):
+    return f"""# TYPE revision_request_count counter
+revision_request_count{{configuration_name="face",revision_name="{REVISION}",response_code_class="2xx"}} {ok}
+revision_request_count{{configuration_name="face",revision_name="{REVISION}",response_code_class="5xx"}} {errors}
+# TYPE revision_request_latencies histogram
+revision_request_latencies_sum{{configuration_name="face",revision_name="{REVISION}",response_code_class="2xx"}} {latency_ms}
+revision_request_latencies_count{{configuration_name="face",revision_name="{REVISION}",response_code_class="2xx"}} {ok}
+"""
+
+
+@pytest.fixture
+def queue_proxy(stub_server, monkeypatch):
+    """ A queue-proxy stub whose counters the test sets, and a scraper on a fake clock scraping it """
+    clock = Clock()
+    monkeypatch.setattr(metric_scraper, 'time', clock)
+    state = {'ok': 0, 'errors': 0, 'latency_ms': 0, 'status': 200}
+
+    def respond(request):
+        if state['status'] != 200:
+            return state['status'], 'text/plain', 'unavailable'
+        body = queue_proxy_metrics(state['ok'], state['errors'], state['latency_ms'])
+        return 200, 'text/plain; version=0.0.4', body
+
+    server = stub_server(respond)
+    scraper = FastPathScraper(targets=lambda: [('queue-proxy', f"{server.url}/metrics", REVISION)])
+    return clock, state, scraper
+
+
+def scrape_for(clock, state, scraper, seconds, ok_per_second=10, errors_per_second=1, latency_per_request=50):
+    # one scrape round per second while requests keep arriving
+    for _ in range(seconds):
+        scraper.scrape_round()
+        clock.sleep(1)
+        state['ok'] += ok_per_second
+        state['errors'] += errors_per_second
+        state['latency_ms'] += ok_per_second * latency_per_request
+
+
+def test_rates_once_the_window_is_covered(queue_proxy):
+    clock, state, scraper = queue_proxy
+    scrape_for(clock, state, scraper, 31)
+    scraper.scrape_round()
+
+    served = scraper.results([REVISION], ['successful_requests', 'total_requests', 'request_latencies',
+                                          'throughput'], '30s')
+
+    assert served['successful_requests'][REVISION] == pytest.approx(10 * 60)
+    assert served['total_requests'][REVISION] == pytest.approx(11 * 60)
+    assert served['request_latencies'][REVISION] == pytest.approx(10 * 50 / 1000 * 60)
+    assert served['throughput'][REVISION] == pytest.approx(1 / 50)
+
+
+def test_window_not_yet_filled_falls_back(queue_proxy):
+    clock, state, scraper = queue_proxy
+    scrape_for(clock, state, scraper, 10)
+    scraper.scrape_round()
+
+    served = scraper.results([REVISION], ['successful_requests', 'successful_requests@5m', 'throughput'], '30s')
+
+    # rates over windows longer than the scraper has been running are left to Prometheus
+    assert 'successful_requests' not in served
+    assert 'successful_requests@5m' not in served
+    assert REVISION in served['throughput']
+
+
+def test_counter_reset_is_not_a_negative_rate(queue_proxy):
+    clock, state, scraper = queue_proxy
+    scrape_for(clock, state, scraper, 15)
+    # the queue-proxy restarted: its counters start over
+    state.update(ok=0, errors=0, latency_ms=0)
+    scrape_for(clock, state, scraper, 16)
+    scraper.scrape_round()
+
+    served = scraper.results([REVISION], ['successful_requests'], '30s')
+
+    assert served['successful_requests'][REVISION] == pytest.approx(10 * 60, rel=0.05)
+
+
+def test_stale_targets_fall_back(queue_proxy):
+    clock, state, scraper = queue_proxy
+    scrape_for(clock, state, scraper, 31)
+    state['status'] = 503
+    clock.sleep(metric_scraper.STALE_AFTER + 1)
+    scraper.scrape_round()
+
+    assert scraper.results([REVISION], ['successful_requests', 'throughput'], '30s') == {}
+
+
+def test_families_without_targets_are_not_served(queue_proxy):
+    clock, state, scraper = queue_proxy
+    scrape_for(clock, state, scraper, 31)
+
+    # no activator is scraped, and autoscaler metrics are never served in process
+    served = scraper.results([REVISION], ['activator_concurrency', 'activator_latencies',
+                                          'autoscaler_concurrency_per_pod'], '30s')
+
+    assert served == {}
+
+
+def test_counter_rate_counts_resets_like_prometheus():
+    key = ('revision_request_count', REVISION, True)
+    samples = [(0, {key: 100}), (1, {key: 110}), (2, {key: 5}), (3, {key: 15})]
+
+    # 10 + 5 (after the reset) + 10 over 3 seconds
+    assert counter_rate(samples, 'revision_request_count', REVISION, True) == pytest.approx(25 / 3)
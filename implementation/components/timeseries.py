@@ -0,0 +1,166 @@
+# imports
+import sys
+import time
+
+import redis
+
+import db_client
+
+# One Redis stream per revision: raw samples (entry id = sample time in ms) and a downsampled copy
+TS_KEY_PREFIX = 'ts:'
+TS_REVISIONS_KEY = 'ts_revisions'           # sorted set: revision -> time of its last sample (ms)
+TS_LAST_BUCKET_KEY = 'ts_last_bucket'       # hash: revision -> last downsampling bucket seen
+
+# Retention (seconds) of the raw and the downsampled series (trimmed approximately, a stream node of up
+# to 100 entries at a time); revisions without samples for DOWNSAMPLED_RETENTION are evicted completely
+RAW_RETENTION = 3600
+DOWNSAMPLE_INTERVAL = 60
+DOWNSAMPLED_RETENTION = 7 * 24 * 3600
+
+# Per-revision metrics (as stored by observer.py) kept in the series
+TS_FIELDS = ['throughput', 'normalized_throughput', 'successful_requests', 'latency', 'latency_per_request',
+             'queued_requests', 'cpu', 'memory', 'disk_read', 'disk_write', 'network_downlink', 'network_uplink',
+             'gpu', 'current_replica']
+
+# Last downsampling bucket per revision written by this process (loaded from TS_LAST_BUCKET_KEY on first use)
+last_buckets = {}
+
+
+def series_key(revision, resolution='raw'):
+    if resolution == 'raw':
+        return f"{TS_KEY_PREFIX}{revision}"
+    return f"{TS_KEY_PREFIX}{revision}:{DOWNSAMPLE_INTERVAL}s"
+
+
+def to_ms(timestamp):
+    return int(timestamp * 1000)
+
+
+def parse_entries(entries):
+    # [(sample time in seconds, {field: float}), ...]
+    return [(int(entry_id.split('-')[0]) / 1000, {field: float(value) for field, value in fields.items()})
+            for entry_id, fields in entries]
+
+
+def downsample(redis_conn, revision, bucket):
+    """ Mean of every field over one closed bucket of the raw series, appended to the downsampled series """
+    start, end = bucket * DOWNSAMPLE_INTERVAL, (bucket + 1) * DOWNSAMPLE_INTERVAL
+    with db_client.round_trip('xrange'):
+        entries = redis_conn.xrange(series_key(revision), min=to_ms(start), max=to_ms(end) - 1)
+    samples = parse_entries(entries)
+    if not samples:
+        return
+    totals = {}
+    for _, fields in samples:
+        for field, value in fields.items():
+            totals[field] = totals.get(field, 0) + value
+    aggregate = {field: total / len(samples) for field, total in totals.items()}
+    aggregate['samples'] = len(samples)
+    with db_client.round_trip('xadd'):
+        redis_conn.xadd(series_key(revision, 'downsampled'), aggregate, id=f"{to_ms(start)}-*",
+                        minid=to_ms(end - DOWNSAMPLED_RETENTION))
+
+
+def append_samples(redis_conn, samples, timestamp=None, pipe=None):
+    """
+    Appends one sample per revision ({revision: metrics}), queued on `pipe` when given (the caller executes
+    it) or sent in a pipeline of its own. Raw entries older than RAW_RETENTION are trimmed on write; when a
+    revision crosses into a new DOWNSAMPLE_INTERVAL bucket, the closed bucket is aggregated into the
+    downsampled series.
+    """
+    timestamp = time.time() if timestamp is None else timestamp
+    bucket = int(timestamp // DOWNSAMPLE_INTERVAL)
+    try:
+        unknown = [revision for revision in samples if revision not in last_buckets]
+        if unknown:
+            with db_client.round_trip('hmget'):
+                stored = redis_conn.hmget(TS_LAST_BUCKET_KEY, unknown)
+            last_buckets.update({revision: int(value) if value is not None else None
+                                 for revision, value in zip(unknown, stored)})
+
+        own_pipe = pipe is None
+        if own_pipe:
+            pipe = redis_conn.pipeline(transaction=False)
+        closed = []
+        for revision, metrics in samples.items():
+            fields = {field: float(metrics[field]) for field in TS_FIELDS if metrics.get(field) is not None}
+            if not fields:
+                continue
+            pipe.xadd(series_key(revision), fields, id=f"{to_ms(timestamp)}-*",
+                      minid=to_ms(timestamp - RAW_RETENTION))
+            pipe.zadd(TS_REVISIONS_KEY, {revision: to_ms(timestamp)})
+            last_bucket = last_buckets.get(revision)
+            if last_bucket != bucket:
+                pipe.hset(TS_LAST_BUCKET_KEY, revision, bucket)
+                last_buckets[revision] = bucket
+                if last_bucket is not None and last_bucket < bucket:
+                    closed.append((revision, last_bucket))
+        if own_pipe:
+            with db_client.round_trip('pipeline'):
+                pipe.execute()
+
+        # the closed buckets only hold samples of earlier calls, so they can be read before `pipe` runs
+        for revision, last_bucket in closed:
+            downsample(redis_conn, revision, last_bucket)
+    except redis.RedisError as e:
+        print(f"Error appending metric samples: {e}")
+
+
+def read_range(redis_conn, revision, start=None, end=None, resolution='raw'):
+    """ Samples of a revision between two unix times (seconds) as [(time, {field: value})], oldest first """
+    try:
+        entries = redis_conn.xrange(series_key(revision, resolution),
+                                    min='-' if start is None else to_ms(start),
+                                    max='+' if end is None else to_ms(end))
+    except redis.RedisError as e:
+        print(f"Error reading metric samples: {e}")
+        return []
+    return parse_entries(entries)
+
+
+def read_latest(redis_conn, revision, count=1, resolution='raw', end=None):
+    """ Newest `count` samples of a revision (taken before `end` when given), oldest first """
+    try:
+        entries = redis_conn.xrevrange(series_key(revision, resolution),
+                                       max='+' if end is None else to_ms(end) - 1, count=count)
+    except redis.RedisError as e:
+        print(f"Error reading metric samples: {e}")
+        return []
+    return parse_entries(entries)[::-1]
+
+
+def read_field(redis_conn, revision, field, start=None, end=None, resolution='raw'):
+    """ (times, values) of one field, e.g. for smoothing or forecasting """
+    samples = [(sample_time, fields[field]) for sample_time, fields in
+               read_range(redis_conn, revision, start, end, resolution) if field in fields]
+    return [sample_time for sample_time, _ in samples], [value for _, value in samples]
+
+
+def evict_stale(redis_conn, max_age=DOWNSAMPLED_RETENTION, now=None):
+    """ Deletes the series of revisions without samples for `max_age` seconds; returns the evicted revisions """
+    now = time.time() if now is None else now
+    try:
+        with db_client.round_trip('zrangebyscore'):
+            stale = redis_conn.zrangebyscore(TS_REVISIONS_KEY, '-inf', to_ms(now - max_age))
+        if stale:
+            pipe = redis_conn.pipeline(transaction=False)
+            for revision in stale:
+                pipe.delete(series_key(revision), series_key(revision, 'downsampled'))
+            pipe.zrem(TS_REVISIONS_KEY, *stale)
+            pipe.hdel(TS_LAST_BUCKET_KEY, *stale)
+            with db_client.round_trip('pipeline'):
+                pipe.execute()
+            for revision in stale:
+                last_buckets.pop(revision, None)
+        return stale
+    except redis.RedisError as e:
+        print(f"Error evicting stale series: {e}")
+        return []
+
+
+if __name__ == "__main__":
+    # Connect to Redis
+    r = db_client.connect_to_redis()
+    revisions = sys.argv[1:] or r.zrange(TS_REVISIONS_KEY, 0, -1)
+    for revision in revisions:
+        print(revision, read_latest(r, revision, count=5))
@@ -0,0 +1,189 @@
+# imports
+import json
+import sys
+import threading
+import time
+
+import redis
+
+import db_client
+
+# Channel the observer publishes one metric event per service and cycle on
+METRIC_EVENTS_CHANNEL = 'scalewave_metric_events'
+
+# Channel the engine publishes every detected shift on (service, revision, field, direction, magnitude)
+SHIFT_EVENTS_CHANNEL = 'scalewave_shift_events'
+
+# A drop of the service's throughput below its baseline by DROP_THRESHOLD arms the trigger; it only disarms
+# again once the throughput is back within CLEAR_THRESHOLD of the baseline (hysteresis band in between)
+DROP_THRESHOLD = 0.05
+CLEAR_THRESHOLD = 0.02
+
+# Consecutive armed samples needed before a decision (panic samples decide on the first one)
+DEBOUNCE_SAMPLES = 2
+PANIC_DEBOUNCE_SAMPLES = 1
+
+# Minimum seconds between two decisions for the same service (or for all services in joint mode)
+MIN_DECISION_INTERVAL = 30
+PANIC_MIN_DECISION_INTERVAL = 10
+
+# Weight of the newest sample in the baseline (exponential moving average) while the trigger is disarmed
+BASELINE_SMOOTHING = 0.5
+
+# Seconds before re-subscribing after a lost Redis connection
+RESUBSCRIBE_DELAY = 1
+
+EPS = 1e-9
+
+
+def queue_metric_event(pipe, event):
+    """ Queues a metric event on the observer's pipeline; it is published after the snapshot writes queued before it """
+    pipe.publish(METRIC_EVENTS_CHANNEL, json.dumps(event))
+
+
+class ServiceTrigger:
+    """
+    Debounced throughput-drop detector of one service. Triggers take metric events in update() and return
+    the shifts they detected (see also change_point.ChangePointTrigger); decided() is called when one of
+    them led to a decision.
+    """
+
+    def __init__(self, drop_threshold=DROP_THRESHOLD, clear_threshold=CLEAR_THRESHOLD,
+                 debounce_samples=DEBOUNCE_SAMPLES, panic_debounce_samples=PANIC_DEBOUNCE_SAMPLES,
+                 smoothing=BASELINE_SMOOTHING):
+        self.drop_threshold = drop_threshold
+        self.clear_threshold = clear_threshold
+        self.debounce_samples = debounce_samples
+        self.panic_debounce_samples = panic_debounce_samples
+        self.smoothing = smoothing
+        self.baseline = None
+        self.armed_samples = 0
+
+    def update(self, event):
+        throughput, panic = event['throughput'], event.get('panic', False)
+        if self.baseline is None or self.baseline <= EPS:
+            self.baseline = throughput
+            return []
+
+        drop = 1 - throughput / self.baseline
+        if drop >= self.drop_threshold:
+            self.armed_samples += 1
+        elif drop <= self.clear_threshold:
+            self.armed_samples = 0
+            self.baseline = self.smoothing * throughput + (1 - self.smoothing) * self.baseline
+
+        required = self.panic_debounce_samples if panic else self.debounce_samples
+        if self.armed_samples < required:
+            return []
+        return [{'service': event['service'], 'revision': None, 'field': 'throughput', 'direction': 'down',
+                 'magnitude': throughput - self.baseline, 'relative': -drop, 'actionable': True, 'panic': panic,
+                 'timestamp': event.get('timestamp')}]
+
+    def decided(self, event):
+        # the level the decision was taken at is the reference for the next drop
+        self.baseline = event['throughput']
+        self.armed_samples = 0
+
+
+class TriggerEngine:
+    """
+    Subscribes to METRIC_EVENTS_CHANNEL in a background thread, feeds every event to its service's trigger
+    (made by `trigger_factory`, ServiceTrigger by default) and calls decide(service_name, panic) when an
+    actionable shift is detected, at most once per minimum interval. Shifts held back by the interval stay
+    pending until it has passed. With `joint` every service shares one interval, since each decision then
+    covers all of them. Events of services for which `accept(service_name)` is False are ignored.
+    """
+
+    def __init__(self, redis_conn, decide, min_interval=MIN_DECISION_INTERVAL,
+                 panic_min_interval=PANIC_MIN_DECISION_INTERVAL, joint=False, trigger_factory=None, accept=None,
+                 **trigger_params):
+        self.redis_conn = redis_conn
+        self.decide = decide
+        self.min_interval = min_interval
+        self.panic_min_interval = panic_min_interval
+        self.joint = joint
+        self.trigger_factory = trigger_factory or (lambda: ServiceTrigger(**trigger_params))
+        self.accept = accept
+        self.triggers = {}
+        self.pending = {}
+        self.last_decisions = {}
+        self.thread = None
+
+    def publish_shifts(self, shifts):
+        for shift in shifts:
+            print("Shift detected: ", shift)
+            try:
+                self.redis_conn.publish(SHIFT_EVENTS_CHANNEL, json.dumps(shift))
+            except redis.RedisError as e:
+                print(f"Error publishing shift event: {e}")
+
+    def handle(self, event, now=None):
+        """ Applies one metric event; returns True when it led to a decision """
+        now = time.time() if now is None else now
+        service_name = event['service']
+        if self.accept is not None and not self.accept(service_name):
+            # another observer instance decides for it; its trigger state starts over if the service comes back
+            self.triggers.pop(service_name, None)
+            self.pending.pop(service_name, None)
+            return False
+        trigger = self.triggers.get(service_name)
+        if trigger is None:
+            trigger = self.triggers[service_name] = self.trigger_factory()
+        shifts = trigger.update(event)
+        self.publish_shifts(shifts)
+
+        actionable = [shift for shift in shifts if shift['actionable']]
+        if actionable:
+            self.pending[service_name] = self.pending.get(service_name, False) or any(
+                shift['panic'] for shift in actionable)
+        if service_name not in self.pending:
+            return False
+
+        panic = self.pending[service_name]
+        interval_key = None if self.joint else service_name
+        interval = self.panic_min_interval if panic else self.min_interval
+        since_last = now - self.last_decisions.get(interval_key, 0)
+        if since_last < interval:
+            print(f"Trigger for {service_name} held back: last decision {since_last:.1f}s ago")
+            return False
+
+        del self.pending[service_name]
+        trigger.decided(event)
+        self.last_decisions[interval_key] = now
+        try:
+            self.decide(service_name, panic)
+        except Exception as e:
+            print(f"Decision for {service_name} failed: {e}")
+        return True
+
+    def run(self):
+        while True:
+            try:
+                pubsub = self.redis_conn.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(METRIC_EVENTS_CHANNEL)
+                for message in pubsub.listen():
+                    try:
+                        self.handle(json.loads(message['data']))
+                    except (ValueError, KeyError, TypeError) as e:
+                        print(f"Malformed metric event: {e}")
+            except redis.RedisError as e:
+                print(f"Metric event subscription lost: {e}")
+                time.sleep(RESUBSCRIBE_DELAY)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="trigger-engine", daemon=True)
+            self.thread.start()
+        return self
+
+
+if __name__ == "__main__":
+    # Print the metric and shift events (optionally of some services only)
+    r = db_client.connect_to_redis()
+    services = set(sys.argv[1:])
+    pubsub = r.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(METRIC_EVENTS_CHANNEL, SHIFT_EVENTS_CHANNEL)
+    for message in pubsub.listen():
+        event = json.loads(message['data'])
+        if not services or event['service'] in services:
+            print(event)
@@ -1,82 +1,59 @@
-import subprocess
-import json
+import requests
 
-
-def run_command(command):
-    result = subprocess.run(command, capture_output=True, text=True, shell=True)
-    if result.returncode != 0:
-        #print(f"Error running command '{' '.join(command)}': {result.stderr}")
-        return None
-    return result.stdout
+from cluster_cache import get_cluster_cache
+from k8s_client import REVISION_LABEL, get_cluster_client, node_ready_status, pod_running, service_traffic
 
 
-def get_services_and_revisions():
+def get_services_and_revisions(namespace="default"):
     # List all revisions with their traffic split percentages for a given service
-    services_output = run_command("kn service list -o json")
-    if services_output:
-        services = json.loads(services_output)
-        service_list = []
-        for service in services.get('items', []):
-            service_revisions = {'service': None, 'revisions': []}
-            # Get the service name
-            service_name = service.get('metadata').get('name')
-            if service_name:
-                # Get the traffic split information
-                service_revisions['service_name'] = service_name
-                traffic = service.get('status', {}).get('traffic', [])
-                for route in traffic:
-                    service_revisions['revisions'].append({route.get('revisionName'): route.get('percent')})
-            service_list.append(service_revisions)
-        return service_list
+    cache = get_cluster_cache(namespace)
+    try:
+        services = cache.knative_services() if cache else get_cluster_client().list_knative_services(namespace)
+    except requests.RequestException as e:
+        print(f"Failed to list Knative services: {e}")
+        return None
 
+    service_list = []
+    for service in services:
+        service_revisions = {'service': None, 'revisions': []}
+        # Get the service name
+        service_name = service.get('metadata').get('name')
+        if service_name:
+            # Get the traffic split information
+            service_revisions['service_name'] = service_name
+            for revision, percent in service_traffic(service).items():
+                service_revisions['revisions'].append({revision: percent})
+        service_list.append(service_revisions)
+    return service_list
 
-def get_node_ready_status(node_name):
-    # Command to get the list of nodes in JSON format
-    cmd = ['kubectl', 'get', 'nodes', '-o', 'json']
 
+def get_node_ready_status(node_name):
+    cache = get_cluster_cache()
+    if cache:
+        return cache.node_ready(node_name)
     try:
-        # Execute the command
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        nodes_info = json.loads(result.stdout)
-
-        # Parse the status of each node
-        for node in nodes_info['items']:
-            name = node['metadata']['name']
-            if name == node_name:
-                for condition in node['status']['conditions']:
-                    # Check if the condition type is 'Ready'
-                    if condition['type'] == 'Ready':
-                        status = condition['status']
-                        return status
-    except subprocess.CalledProcessError as e:
+        return node_ready_status(get_cluster_client().get_node(node_name))
+    except requests.RequestException:
         return
 
 
 def check_pod_status(namespace, service):
-    cmd = [
-        'kubectl', 'get', 'pods',
-        '--namespace', namespace,
-    ]
+    # pods of a revision, selected on the server by the Knative revision label
+    cache = get_cluster_cache(namespace)
+    if cache:
+        pods = cache.revision_pods(service)
+    else:
+        try:
+            pods = get_cluster_client().list_pods(namespace, label_selector=f"{REVISION_LABEL}={service}")
+        except requests.RequestException as e:
+            print(f"Failed to get pods status: {e}")
+            return
 
-    try:
-        # Execute the kubectl command
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=True)
-        all_service_statuses = []
-        # Process and print the output
-        lines = result.stdout.splitlines()
-        for line in lines[1:]:  # Skip the header row
-            if service in line:
-                columns = line.split()
-                name = columns[0]
-                status = columns[2]  # Assuming standard output; this index might need adjustment
-                all_service_statuses.append(status)
-        if "Running" in all_service_statuses:
-            return "Running"
-    except subprocess.CalledProcessError as e:
-        print(f"Failed to get pods status: {e.stderr}")
+    if any(pod_running(pod) for pod in pods):
+        return "Running"
 
 
 if __name__ == "__main__":
-    
+
     print("\nListing all services with traffic split:")
     print(get_services_and_revisions())
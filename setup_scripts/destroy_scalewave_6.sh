@@ -3,8 +3,8 @@ set -euo pipefail
 IFS=$'\n\t'
 
 # ScaleWave destroy script
-# - Stops Prometheus port-forward (kubectl)
-# - Stops observer.py and its optimizer.py child process
+# - Stops Prometheus port-forward and kubectl proxy
+# - Stops observer.py and the resident optimizer_worker.py
 # - Optionally flushes Redis (off by default)
 
 LOG_DIR="${XDG_STATE_HOME:-$HOME/.local/state}/scalewave"
@@ -193,15 +193,24 @@ kill_from_pidfile "/tmp/prometheus-portforward.pid" "prometheus-portforward" ||
 # Fallback pattern (very specific command)
 kill_by_pattern "kubectl port-forward -n observability svc/prometheus-operated 9090:9090" "prometheus-portforward" || true
 
-# 2) Stop observer (and thus optimizer child)
-echo "Stopping observer (and optimizer child)..."
+# Stop the kubectl proxy used by the Kubernetes API client
+echo "Stopping kubectl proxy..."
+kill_from_pidfile "$STATE_DIR/kubectl-proxy.pid" "kubectl-proxy" || true
+kill_by_pattern "kubectl proxy --port" "kubectl-proxy" || true
+
+# 2) Stop observer
+echo "Stopping observer..."
 kill_from_pidfile "$STATE_DIR/observer.pid" "observer" || true
 kill_from_pidfile "/tmp/observer.pid" "observer" || true
 
 # Fallback patterns (still fairly specific)
 kill_by_pattern "python(3)? .*observer\.py" "observer" || true
 
-# 3) Cleanup any leftover optimizer if it survived (rare, but possible)
+# 3) Stop the resident optimizer worker, then any leftover one-shot optimizer run
+echo "Stopping optimizer worker..."
+kill_from_pidfile "$STATE_DIR/optimizer-worker.pid" "optimizer-worker" || true
+kill_by_pattern "python(3)? .*optimizer_worker\.py" "optimizer-worker" || true
+
 # This is intentionally specific to optimizer.py; if you run other optimizer.py scripts elsewhere,
 # consider tightening the pattern or relying on PID files.
 kill_by_pattern "python(3)? .*optimizer\.py" "optimizer" || true
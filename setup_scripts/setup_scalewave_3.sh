@@ -1,5 +1,5 @@
 #!/usr/bin/env bash
-# ScaleWave run script (starts Prometheus port-forward + observer in background)
+# ScaleWave run script (starts Prometheus port-forward, kubectl proxy + optimizer worker in background, observer in foreground)
 # - Robust logging
 # - PID files + log files
 # - No destroy/cleanup logic (we will add a separate stop script later)
@@ -27,6 +27,9 @@ PF_SERVICE="${PF_SERVICE:-prometheus-operated}"
 PF_LOCAL_PORT="${PF_LOCAL_PORT:-9090}"
 PF_REMOTE_PORT="${PF_REMOTE_PORT:-9090}"
 
+# Local Kubernetes API endpoint used by k8s_client.py (kubectl proxy handles kubeconfig auth)
+K8S_PROXY_PORT="${K8S_PROXY_PORT:-8001}"
+
 # -----------------------------
 # Usage
 # -----------------------------
@@ -48,12 +51,13 @@ Optional:
   --pf-service <name>       Port-forward service name (default: $PF_SERVICE)
   --pf-local <port>         Local port (default: $PF_LOCAL_PORT)
   --pf-remote <port>        Remote port (default: $PF_REMOTE_PORT)
+  --k8s-proxy-port <port>   kubectl proxy port for the Kubernetes API client (default: $K8S_PROXY_PORT)
 
   -h, --help                Show help
 
 Environment overrides:
   MANAGER_NODE_IP, WORKING_DIR, PYTHON_BIN, ENV_FILE, STATE_DIR,
-  PF_NAMESPACE, PF_SERVICE, PF_LOCAL_PORT, PF_REMOTE_PORT
+  PF_NAMESPACE, PF_SERVICE, PF_LOCAL_PORT, PF_REMOTE_PORT, K8S_PROXY_PORT
 
 Outputs:
   Logs and PID files are written under:
@@ -79,6 +83,7 @@ while [[ $# -gt 0 ]]; do
     --pf-service) PF_SERVICE="${2:-}"; shift 2;;
     --pf-local) PF_LOCAL_PORT="${2:-}"; shift 2;;
     --pf-remote) PF_REMOTE_PORT="${2:-}"; shift 2;;
+    --k8s-proxy-port) K8S_PROXY_PORT="${2:-}"; shift 2;;
     -h|--help) usage; exit 0;;
     *) die "Unknown option: $1 (run with --help)";;
   esac
@@ -132,6 +137,8 @@ if [[ ! -d "$WORKING_DIR" ]]; then
 fi
 OBSERVER_PY="$HOME/ScaleWave/implementation/components/observer.py"
 [[ -f "$OBSERVER_PY" ]] || die "observer.py not found at: $OBSERVER_PY"
+OPTIMIZER_WORKER_PY="$HOME/ScaleWave/implementation/components/optimizer_worker.py"
+[[ -f "$OPTIMIZER_WORKER_PY" ]] || die "optimizer_worker.py not found at: $OPTIMIZER_WORKER_PY"
 
 # Determine python if not provided
 if [[ -z "${PYTHON_BIN:-}" ]]; then
@@ -205,16 +212,37 @@ PF_PID="$STATE_DIR/prometheus-portforward.pid"
 start_bg "prometheus port-forward" "$PF_PID" "$PF_LOG" \
   kubectl port-forward -n "$PF_NAMESPACE" "svc/$PF_SERVICE" "${PF_LOCAL_PORT}:${PF_REMOTE_PORT}"
 
+# -----------------------------
+# Start kubectl proxy (Kubernetes/Knative API for the observer and optimizer)
+# -----------------------------
+K8S_PROXY_LOG="$STATE_DIR/kubectl-proxy.log"
+K8S_PROXY_PID="$STATE_DIR/kubectl-proxy.pid"
+
+start_bg "kubectl proxy" "$K8S_PROXY_PID" "$K8S_PROXY_LOG" \
+  kubectl proxy --port "$K8S_PROXY_PORT"
+export SCALEWAVE_K8S_API="http://127.0.0.1:${K8S_PROXY_PORT}"
+
+# -----------------------------
+# Start resident optimizer worker (consumes jobs queued by the observer)
+# -----------------------------
+OPT_LOG="$STATE_DIR/optimizer-worker.log"
+OPT_PID="$STATE_DIR/optimizer-worker.pid"
+
+start_bg "optimizer worker" "$OPT_PID" "$OPT_LOG" \
+  "$PYTHON_BIN" "$OPTIMIZER_WORKER_PY"
+
 cleanup() {
-  # Best-effort: stop port-forward when you exit (prevents orphaned background process).
-  if [[ -f "$PF_PID" ]]; then
-    local ppid
-    ppid="$(cat "$PF_PID" 2>/dev/null || true)"
-    if [[ -n "$ppid" ]] && kill -0 "$ppid" >/dev/null 2>&1; then
-      warn "Stopping prometheus port-forward (pid=$ppid)"
-      kill "$ppid" >/dev/null 2>&1 || true
+  # Best-effort: stop port-forward, kubectl proxy and optimizer worker when you exit (prevents orphaned background processes).
+  local pidfile ppid
+  for pidfile in "$PF_PID" "$K8S_PROXY_PID" "$OPT_PID"; do
+    if [[ -f "$pidfile" ]]; then
+      ppid="$(cat "$pidfile" 2>/dev/null || true)"
+      if [[ -n "$ppid" ]] && kill -0 "$ppid" >/dev/null 2>&1; then
+        warn "Stopping $(basename "$pidfile" .pid) (pid=$ppid)"
+        kill "$ppid" >/dev/null 2>&1 || true
+      fi
     fi
-  fi
+  done
   warn "Exiting."
 }
 trap cleanup INT TERM
@@ -234,9 +262,13 @@ log "  Command: $PYTHON_BIN $OBSERVER_PY --manager_node_ip $MANAGER_NODE_IP --c
 log "All requested processes have been started (or were already running)."
 log "PID files:"
 log "  $PF_PID"
+log "  $K8S_PROXY_PID"
+log "  $OPT_PID"
 log "  $OBS_PID"
 log "Log files:"
 log "  $PF_LOG"
+log "  $K8S_PROXY_LOG"
+log "  $OPT_LOG"
 log "  $OBS_LOG"
 log "Run log:"
 log "  $RUN_LOG"